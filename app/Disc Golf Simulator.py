@@ -5,10 +5,20 @@ import numpy as np
 import streamlit as st
 
 from shotshaper.projectile import DiscGolfDisc
-from visualize import get_plot, get_stl, get_subplots, visualize_disc
+from extrema import turn_points
+from timing import StageTimer
+from visualize import get_lods, get_plot, get_stl, get_subplots, visualize_disc
 
 proj_dir = Path(__file__).parents[1]
 
+# Entries kept by each data cache, shared by all sessions of the server
+cache_entries = 256
+# Reruns kept in the debug panel
+debug_history = 20
+# Levels of detail of the disc mesh, indices into get_lods
+disc_details = {'Full': 0, 'High': 1, 'Medium': 2, 'Low': 3}
+default_detail = 'High'
+
 # Define the default values
 default_U = 24.2
 default_omega = 116.8
@@ -18,7 +28,92 @@ default_nose = 0.0
 default_roll = 14.7
 
 
+@st.cache_resource(show_spinner=False)
+def load_disc(disc_name):
+    """
+    Disc model, parsed once per server process and shared by all sessions
+    """
+    return DiscGolfDisc(disc_name)
+
+
+@st.cache_resource(show_spinner=False)
+def load_mesh(disc_name):
+    """
+    Vertices and faces of the disc at each level of detail, found once per
+    server process
+    """
+    return get_lods(get_stl(proj_dir / 'shotshaper' / 'discs' / (disc_name + '.stl')))
+
+
+@st.cache_data(max_entries=cache_entries, show_spinner=False)
+def disc_figure(disc_name, nose, roll, detail=disc_details[default_detail]):
+    """
+    Serialized figure of the disc orientation
+    """
+    return visualize_disc(load_mesh(disc_name)[detail], nose=nose, roll=roll).to_dict()
+
+
+@st.cache_data(max_entries=cache_entries, show_spinner=False)
+def simulate(disc_name, U, omega, pitch, nose, roll):
+    """
+    Trajectory, summary and forces of a throw, as plain arrays
+    """
+    disc = load_disc(disc_name)
+    pos = np.array((0, 0, default_z0))
+    shot = disc.shoot(speed=U, omega=omega, pitch=pitch,
+                      position=pos, nose_angle=nose, roll_angle=roll)
+    arc, alphas, betas, lifts, drags, moms, rolls = disc.post_process(shot, omega)
+    return dict(position=shot.position, velocity=shot.velocity, summary=shot.summary,
+                forces=(arc, alphas, lifts, drags, moms, rolls))
+
+
+@st.cache_data(max_entries=cache_entries, show_spinner=False)
+def flight_figure(disc_name, U, omega, pitch, nose, roll):
+    """
+    Serialized animated figure of the flight path
+    """
+    throw = simulate(disc_name, U, omega, pitch, nose, roll)
+    x, y, z = throw['position']
+    # Reversed x and y to mimic a throw
+    x_new, y_new = -1 * y, x
+    return get_plot(x_new, y_new, z, extrema=turn_points(throw['summary'])).to_dict()
+
+
+@st.cache_data(max_entries=cache_entries, show_spinner=False)
+def forces_figure(disc_name, U, omega, pitch, nose, roll):
+    """
+    Serialized figure of the forces along the flight
+    """
+    throw = simulate(disc_name, U, omega, pitch, nose, roll)
+    arc, alphas, lifts, drags, moms, rolls = throw['forces']
+    return get_subplots(arc, alphas, lifts, drags, moms, rolls, throw['velocity']).to_dict()
+
+
+def debug_enabled():
+    """
+    Whether the stage timings are shown, with ?debug=1 in the address
+    """
+    try:
+        value = st.query_params.get('debug', '')
+    except AttributeError:
+        value = st.experimental_get_query_params().get('debug', [''])[0]
+    return value not in ('', '0', 'false')
+
+
+def show_timings(timer):
+    """
+    Debug panel with the stage timings of this rerun and the previous ones
+    """
+    history = st.session_state.setdefault('timings', [])
+    history.append(timer.as_dict())
+    del history[:-debug_history]
+    with st.sidebar.expander('Debug: rerun timings (ms)', expanded=True):
+        st.table(history[::-1])
+        st.caption('Last rerun first. Cached stages take well under a millisecond.')
+
+
 def main():
+    timer = StageTimer()
     tab1, tab2 = st.tabs(['Simulator', 'FAQ'])
     with tab1:
         disc_names = {
@@ -42,25 +137,25 @@ def main():
         roll = st.sidebar.slider("Roll Angle (deg) | Tilt Left/Right", min_value=-90.0, max_value=90.0, value=default_roll,
                                  step=0.1)
 
-        pos = np.array((0, 0, default_z0))
-        disc_dict = DiscGolfDisc(disc_name)
+        detail = st.sidebar.select_slider("Disc Detail", options=list(disc_details), value=default_detail,
+                                          help='Lower detail loads faster on slow connections')
 
-        stl_mesh = get_stl(proj_dir / 'shotshaper' / 'discs' / (disc_name + '.stl'))
-        fig = visualize_disc(stl_mesh, nose=nose, roll=roll)
+        throw = (disc_name, U, omega, pitch, nose, roll)
 
+        with timer('disc figure'):
+            fig = disc_figure(disc_name, nose, roll, disc_details[detail])
         st.markdown("""## Disc orientation""")
-        st.plotly_chart(fig)
+        with timer('render disc'):
+            st.plotly_chart(fig)
         st.markdown("""## Flight Path""")
-        shot = disc_dict.shoot(speed=U, omega=omega, pitch=pitch,
-                               position=pos, nose_angle=nose, roll_angle=roll)
+        with timer('simulate'):
+            summary = simulate(*throw)['summary']
 
         # Plot trajectory
-        x, y, z = shot.position
-        x_new, y_new = -1 * y, x
-
-        # Reversed x and y to mimic a throw
-        fig = get_plot(x_new, y_new, z)
-        st.plotly_chart(fig, True)
+        with timer('flight figure'):
+            fig = flight_figure(*throw)
+        with timer('render flight'):
+            st.plotly_chart(fig, True)
 
         st.markdown(
                 f"""
@@ -72,17 +167,18 @@ def main():
 
         | Metric       | Value  |
         |--------------|--------|
-        | Drift Left   | {round(min(x_new), 2)} |
-        | Drift Right  | {round(max(x_new), 2)} |
-        | Max Height   | {round(max(z), 2)}    |
-        | Distance     | {round(max(y_new), 2)} |
+        | Drift Left   | {round(-summary.max_drift, 2)} |
+        | Drift Right  | {round(-summary.min_drift, 2)} |
+        | Max Height   | {round(summary.max_height, 2)}    |
+        | Distance     | {round(summary.distance, 2)} |
 
         """
                 )
 
-        arc, alphas, betas, lifts, drags, moms, rolls = disc_dict.post_process(shot, omega)
-        fig = get_subplots(arc, alphas, lifts, drags, moms, rolls, shot.velocity)
-        st.plotly_chart(fig, True)
+        with timer('forces figure'):
+            fig = forces_figure(*throw)
+        with timer('render forces'):
+            st.plotly_chart(fig, True)
 
     with tab2:
         st.markdown("""
@@ -103,6 +199,9 @@ def main():
             - If you have any ideas, just let me know in a discussion or in a pull request
         """)
 
+    if debug_enabled():
+        show_timings(timer)
+
 
 if __name__ == "__main__":
     # Setting up Logger and proj_dir
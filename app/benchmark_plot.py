@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the build time and JSON payload of the flight path figure with
+full animation frames, light frames and decimated light frames.
+Run from the app directory.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from extrema import turn_points
+from visualize import get_plot
+import numpy as np
+import time
+
+d = DiscGolfDisc('dd2')
+shot = d.shoot(speed=24.2, omega=116.8, pitch=15.5, position=np.array((0, 0, 1.3)),
+               nose_angle=0.0, roll_angle=14.7)
+x, y, z = shot.position
+extrema = turn_points(shot.summary)
+
+
+def measure(label, n=3, **kwargs):
+    t_build = t_json = np.inf
+    for i in range(n):
+        t0 = time.perf_counter()
+        fig = get_plot(-y, x, z, extrema=extrema, **kwargs)
+        t1 = time.perf_counter()
+        payload = fig.to_json()
+        t2 = time.perf_counter()
+        t_build, t_json = min(t_build, t1 - t0), min(t_json, t2 - t1)
+    print('%-22s %4d frames  %8.1f kB  build %6.3f s  to_json %6.3f s' % (
+        label, len(fig.frames), len(payload)/1e3, t_build, t_json))
+
+
+print('Samples: %d' % len(x))
+measure('Full frames', animation='full')
+measure('Light frames', animation='light')
+for step in (2, 4):
+    measure('Light frames, step %d' % step, animation='light', frame_step=step)
@@ -30,3 +30,17 @@ def find_extrema(x, y):
     extrema_type = ["arrow-left" if is_max else "arrow-right" for is_max in is_maxima]
 
     return extrema_x, extrema_y, extrema_type
+
+
+def turn_points(summary):
+    """
+    S-turn points of a FlightSummary, in the plot axes of the app where
+    the lateral axis is -y and the distance axis is x
+    """
+    position = summary.turns['position']
+    extrema_x = -position[:, 1]
+    extrema_y = position[:, 0]
+    # A minimum of y is a maximum of the plotted lateral coordinate
+    extrema_type = ["arrow-left" if kind < 0 else "arrow-right" for kind in summary.turns['kind']]
+
+    return extrema_x, extrema_y, extrema_type
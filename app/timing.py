@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class StageTimer:
+    """
+    Wall clock time of the stages of one rerun of the app, e.g.
+
+        timer = StageTimer()
+        with timer('shoot'):
+            ...
+    """
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def __call__(self, name):
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + perf_counter() - t0
+
+    @property
+    def total(self):
+        return perf_counter() - self.start
+
+    def as_dict(self):
+        """
+        Stage times in milliseconds, with the total of the rerun so far
+        """
+        times = {name: round(1e3 * t, 2) for name, t in self.stages.items()}
+        times['total'] = round(1e3 * self.total, 2)
+        return times
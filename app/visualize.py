@@ -16,21 +16,74 @@ def get_stl(stl_file):
     return stl_mesh
 
 
-def visualize_disc(stl_mesh, nose, roll):
-    """
-    Taken from https://community.plotly.com/t/view-3d-cad-data/16920/9
+def get_topology(stl_mesh):
     """
-    stl_mesh.rotate([1, 0, 0], math.radians(-1*nose))
-    stl_mesh.rotate([0, 1, 0], math.radians(roll))
-    # stl_mesh.rotate([0, 0, 1], math.radians(z_angle))
+    Unique vertices and triangles of a mesh, computed once per disc since
+    the triangles of an STL file repeat every shared vertex.
 
+    Returns (vertices, faces), the faces as indices into the vertices with
+    the I, J and K columns of a Mesh3d trace.
+    """
     p, q, r = stl_mesh.vectors.shape  # (p, 3, 3)
-    # the array stl_mesh.vectors.reshape(p*q, r) can contain multiple copies of the same vertex;
-    # extract unique vertices from all mesh triangles
     vertices, ixr = np.unique(stl_mesh.vectors.reshape(p * q, r), return_inverse=True, axis=0)
-    I = np.take(ixr, [3 * k for k in range(p)])
-    J = np.take(ixr, [3 * k + 1 for k in range(p)])
-    K = np.take(ixr, [3 * k + 2 for k in range(p)])
+    return vertices, ixr.reshape(p, q)
+
+
+def decimate(vertices, faces, cell):
+    """
+    Coarser mesh by vertex clustering, merging the vertices within each
+    cube of side cell into their mean and dropping the triangles that
+    collapse.
+
+    Returns (vertices, faces) like get_topology.
+    """
+    keys = np.floor((vertices - vertices.min(axis=0)) / cell).astype(np.int64)
+    _, cluster, count = np.unique(keys, return_inverse=True, return_counts=True, axis=0)
+    cluster = cluster.reshape(-1)
+    merged = np.zeros((len(count), 3))
+    np.add.at(merged, cluster, vertices)
+    merged /= count[:, None]
+
+    faces = cluster[faces]
+    I, J, K = faces.T
+    faces = faces[(I != J) & (J != K) & (K != I)]
+    # Triangles merged onto the same corners are kept once
+    _, first = np.unique(np.sort(faces, axis=1), return_index=True, axis=0)
+    return merged.astype(vertices.dtype), faces[np.sort(first)]
+
+
+def get_lods(stl_mesh, cells=(0.002, 0.004, 0.008)):
+    """
+    Levels of detail of a mesh, the full mesh first followed by one
+    decimated mesh per cell size, each as (vertices, faces).
+    """
+    lods = [get_topology(stl_mesh)]
+    for cell in cells:
+        lods.append(decimate(*lods[0], cell))
+    return lods
+
+
+def orientation(nose, roll):
+    """
+    Rotation of the disc for the nose and roll angles in degrees, acting
+    on row vectors as stl_mesh.rotate does
+    """
+    return (Mesh.rotation_matrix([1, 0, 0], math.radians(-1*nose))
+            @ Mesh.rotation_matrix([0, 1, 0], math.radians(roll)))
+
+
+def visualize_disc(stl_mesh, nose, roll):
+    """
+    Taken from https://community.plotly.com/t/view-3d-cad-data/16920/9
+
+    stl_mesh: the mesh, or (vertices, faces) from get_topology or get_lods
+    to skip finding the unique vertices. The mesh is not modified.
+    """
+    if isinstance(stl_mesh, Mesh):
+        stl_mesh = get_topology(stl_mesh)
+    vertices, faces = stl_mesh
+    vertices = vertices @ orientation(nose, roll)
+    I, J, K = faces.T
 
     x, y, z = vertices.T
     trace = go.Mesh3d(x=x, y=y, z=z, i=I, j=J, k=K)
@@ -57,7 +110,15 @@ def visualize_disc(stl_mesh, nose, roll):
 import plotly.subplots as sp
 
 
-def get_plot(x, y, z):
+def get_plot(x, y, z, extrema=None, animation='light', frame_step=1):
+    """
+    extrema: optional (x, y, type) of the s-turn points, e.g. from turn_points.
+    Found from the samples with find_extrema if not given.
+    animation: 'light' for frames holding only the moving marker and the two
+    bar values, or 'full' for frames repeating every trace, which grow the
+    figure as the square of the number of samples.
+    frame_step: animate every frame_step-th sample, always ending at the landing.
+    """
     xm = np.min(x) - 1.5
     xM = np.max(x) + 1.5
     ym = -5
@@ -66,7 +127,9 @@ def get_plot(x, y, z):
     zM = np.max(z)
     N = len(x)
     category = 'Height'
-    x_extrema, y_extrema, extrema_type = find_extrema(x, y)
+    if extrema is None:
+        extrema = find_extrema(x, y)
+    x_extrema, y_extrema, extrema_type = extrema
 
     xM_abs = max(abs(xm), abs(xM))
     xm_abs = -1 * xM_abs
@@ -179,40 +242,64 @@ def get_plot(x, y, z):
             )
 
     # Create frames for the main plot and subplot
-    all_frames = [
-        go.Frame(data=[
-            go.Scatter(
-                    x=[x[k]],
-                    y=[y[k]],
-                    mode="markers",
-                    showlegend=False,
-                    marker=dict(color="red", size=10)),
-            go.Scatter(x=x, y=y,
-                       mode="markers", marker_colorscale=sequential.Peach,
-                       marker=dict(color=z, size=3, showscale=True)),
-            extrema,
-            carats_v,
-            go.Bar(
-                    x=['Height'],
-                    y=[z[k]],
-                    showlegend=False,
-                    name='Value',
-                    marker=dict(color='orange', line=dict(width=1))
-                    # Set color of value bar to orange and line width to 1
-                    ),
-            carats_h,
-            go.Bar(
-                    x=[x[k]],
-                    y=[''],
-                    showlegend=False,
-                    name='Value',
-                    orientation='h',
-                    marker=dict(color='orange', line=dict(width=1))
-                    # Set color of value bar to orange and line width to 1
-                    )
-            ])
-        for k in range(N)
-        ]
+    steps = np.r_[0:N - 1:frame_step, N - 1]
+    if animation == 'light':
+        # Moving marker, updated together with the bars by trace index
+        fig.add_trace(
+                go.Scatter(x=[x[0]], y=[y[0]],
+                           mode="markers",
+                           showlegend=False,
+                           marker=dict(color="red", size=10)),
+                row=1, col=1
+                )
+        bar_style = dict(marker=dict(color='orange', line=dict(width=1)), name='Value')
+        fig.update_traces(bar_style, selector=dict(type='bar'))
+        marker, bar_v, bar_h = len(fig.data) - 1, 4, 6
+        all_frames = [
+            go.Frame(data=[
+                dict(type='scatter', x=[x[k]], y=[y[k]]),
+                dict(type='bar', x=['Height'], y=[z[k]]),
+                dict(type='bar', x=[x[k]], y=['']),
+                ], traces=[marker, bar_v, bar_h])
+            for k in steps
+            ]
+    elif animation == 'full':
+        all_frames = [
+            go.Frame(data=[
+                go.Scatter(
+                        x=[x[k]],
+                        y=[y[k]],
+                        mode="markers",
+                        showlegend=False,
+                        marker=dict(color="red", size=10)),
+                go.Scatter(x=x, y=y,
+                           mode="markers", marker_colorscale=sequential.Peach,
+                           marker=dict(color=z, size=3, showscale=True)),
+                extrema,
+                carats_v,
+                go.Bar(
+                        x=['Height'],
+                        y=[z[k]],
+                        showlegend=False,
+                        name='Value',
+                        marker=dict(color='orange', line=dict(width=1))
+                        # Set color of value bar to orange and line width to 1
+                        ),
+                carats_h,
+                go.Bar(
+                        x=[x[k]],
+                        y=[''],
+                        showlegend=False,
+                        name='Value',
+                        orientation='h',
+                        marker=dict(color='orange', line=dict(width=1))
+                        # Set color of value bar to orange and line width to 1
+                        )
+                ])
+            for k in steps
+            ]
+    else:
+        raise ValueError("animation must be 'light' or 'full', got %r" % (animation,))
 
     # Combine frames for the main plot and subplot
     fig.frames = all_frames
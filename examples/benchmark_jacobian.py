@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of the implicit solvers with finite difference and analytic
+Jacobians, for shots where drag dominates: a table tennis ball and
+a slow disc golf throw. The right hand side and Jacobian calls are
+counted by wrapping the functions, and the calls saved by the analytic
+Jacobian are the difference to the finite difference run.
+"""
+
+from shotshaper.projectile import TableTennisBall, DiscGolfDisc, hit_ground, stopped
+from shotshaper.integrate import T_END
+from scipy.integrate import solve_ivp
+import numpy as np
+import time
+
+ball = TableTennisBall()
+disc = DiscGolfDisc('dd2')
+
+y0, omega = disc.initialize_shot(speed=8, omega=40, pitch=10, position=(0,0,1.3),
+                                 nose_angle=0, roll_angle=10)
+cases = [('Table tennis ball', ball, ball.initialize_shot(speed=30, pitch=5, position=(0,0,0.3)),
+          (np.array((0,-150.,0)),)),
+         ('Slow disc throw', disc, y0, (omega,))]
+
+
+
+class Counted:
+    # Counts the calls of a function. scipy leaves the right hand side
+    # calls of finite difference Jacobians out of nfev, and LSODA does
+    # not report its Jacobian evaluations at all.
+    def __init__(self, f):
+        self.f = f
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        return self.f(*args)
+
+
+repeat = 20
+print('%-18s %-6s %-9s %6s %9s %6s %6s %9s %10s' % ('Case', 'Method', 'Jacobian', 'RHS',
+                                                   'RHS saved', 'jac', 'nlu', 'time (ms)',
+                                                   'landing x'))
+for label, projectile, y0, args in cases:
+    for method in ('Radau', 'BDF', 'LSODA'):
+        rhs_numeric = None
+        for name, jac in (('numeric', None), ('analytic', projectile.jacobian)):
+            options = dict(method=method, rtol=1e-6, atol=1e-8, args=args,
+                           events=(hit_ground, stopped))
+            if jac is not None:
+                options['jac'] = jac
+            t0 = time.perf_counter()
+            for i in range(repeat):
+                sol = solve_ivp(projectile.advance, [0, T_END], y0, **options)
+            dt = (time.perf_counter() - t0)/repeat
+
+            # Counted separately, outside the timing
+            rhs = Counted(projectile.advance)
+            if jac is not None:
+                options['jac'] = Counted(jac)
+            sol = solve_ivp(rhs, [0, T_END], y0, **options)
+            if jac is not None:
+                n_jac = '%d' % options['jac'].calls
+                saved = '%d' % (rhs_numeric - rhs.calls)
+            else:
+                # Finite difference Jacobians of LSODA are computed internally
+                n_jac = '-' if method == 'LSODA' else '%d' % sol.njev
+                saved = ''
+                rhs_numeric = rhs.calls
+            print('%-18s %-6s %-9s %6d %9s %6s %6d %9.1f %10.4f' % (label, method, name, rhs.calls,
+                                                                    saved, n_jac, sol.nlu, 1e3*dt,
+                                                                    sol.y[0,-1]))
+
+# A finite difference Jacobian costs one right hand side evaluation per state
+print()
+print('%-18s %16s %16s' % ('Case', 'RHS x (n+1) (us)', 'analytic (us)'))
+for label, projectile, y0, args in cases:
+    n = 2000
+    t0 = time.perf_counter()
+    for i in range(n):
+        for j in range(len(y0) + 1):
+            projectile.advance(0, y0, *args)
+    t_fd = (time.perf_counter() - t0)/n
+    t0 = time.perf_counter()
+    for i in range(n):
+        projectile.jacobian(0, y0, *args)
+    t_jac = (time.perf_counter() - t0)/n
+    print('%-18s %16.1f %16.1f' % (label, 1e6*t_fd, 1e6*t_jac))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the cost of one right hand side evaluation, and of a full
+throw, for the different disc engines.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from shotshaper.kernels import get_disc_rhs, numba
+import numpy as np
+import timeit
+
+d = DiscGolfDisc('dd2')
+kwargs = dict(speed=24.2, omega=116.8, pitch=15.5,
+              position=np.array((0,0,1.3)), nose_angle=0.0, roll_angle=14.7)
+y0, omega = d.initialize_shot(**kwargs)
+ref = d.shoot(**kwargs)
+
+engines = ['default', 'fast']
+if numba is not None:
+    engines.append('numba')
+
+n = 20000
+for engine in engines:
+    if engine == 'default':
+        f = lambda: d.advance(0, y0, omega)
+    else:
+        rhs = get_disc_rhs(engine)
+        args = d._kernel_args(engine)
+        f = lambda: rhs(0, y0, omega, *args)
+    f()
+    t_rhs = timeit.timeit(f, number=n)/n
+
+    d.shoot(engine=engine, **kwargs)
+    t_shot = min(timeit.repeat(lambda: d.shoot(engine=engine, **kwargs), number=10, repeat=3))/10
+    s = d.shoot(engine=engine, **kwargs)
+    diff = np.abs(s.position - ref.position).max()
+
+    print('%-8s rhs: %7.2f us   shoot: %6.2f ms   max diff: %.1e m' %
+          (engine, 1e6*t_rhs, 1e3*t_shot, diff))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the throughput of shoot_many with a loop of shoot calls
+for sets of randomized disc and ball throws.
+"""
+
+from shotshaper.projectile import DiscGolfDisc, SoccerBall, ShotPutBall
+import numpy as np
+import time
+
+n = 500
+rng = np.random.default_rng(1)
+pos = np.array((0,0,1.3))
+
+def compare(label, projectile, params):
+    t0 = time.perf_counter()
+    shots = [projectile.shoot(**p) for p in params]
+    t_loop = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = projectile.shoot_many(params)
+    t_batch = time.perf_counter() - t0
+
+    landing = np.array([s.position[:,-1] for s in shots])
+    diff = np.abs(landing - batch.position[:,:,-1]).max()
+
+    print(label)
+    print('  Throws:            %d' % len(params))
+    print('  Loop of shoot:     %.3f s (%.0f throws/s)' % (t_loop, len(params)/t_loop))
+    print('  shoot_many:        %.3f s (%.0f throws/s)' % (t_batch, len(params)/t_batch))
+    print('  Speedup:           %.1fx' % (t_loop/t_batch))
+    print('  Max landing diff:  %.2e m' % diff)
+
+params = [dict(speed=rng.uniform(15,30), omega=rng.uniform(60,150),
+               pitch=rng.uniform(0,20), position=pos,
+               nose_angle=rng.uniform(-3,3), roll_angle=rng.uniform(-30,30))
+          for i in range(n)]
+compare('Disc golf disc', DiscGolfDisc('dd2'), params)
+
+params = [dict(speed=rng.uniform(15,30), pitch=rng.uniform(10,40),
+               yaw=rng.uniform(-10,10), spin=(0,0,rng.uniform(-10,10)))
+          for i in range(n)]
+compare('Soccer ball', SoccerBall(), params)
+
+params = [dict(speed=rng.uniform(10,14), pitch=rng.uniform(30,45), position=(0,0,2))
+          for i in range(n)]
+compare('Shot put', ShotPutBall('M'), params)
@@ -4,7 +4,7 @@ import sys
 from shotshaper.projectile import DiscGolfDisc
 import matplotlib.pyplot as pl
 import numpy as np
-import shotshaper.environment as env
+from shotshaper.environment import Environment
 from shotshaper.transforms import T_12
 from random import uniform
 
@@ -44,20 +44,18 @@ for i in range(nthrow):
     nose = p[2]
     roll = p[1]
     
-    env.Uref = p[6]
-    env.winddir = np.array((1,0,0))
-
     # Currently handle yaw by rotating the position after the throw, hence
     # also need to rotate the wind vector accordingly
-    env.winddir = rotz(env.winddir, -yaw)
+    env = Environment(Uref=p[6], winddir=rotz(np.array((1,0,0)), -yaw))
 
-    s = d.shoot(speed=U, omega=omega, pitch=pitch, position=pos, nose_angle=nose, roll_angle=roll)
+    s = d.shoot(speed=U, omega=omega, pitch=pitch, position=pos, nose_angle=nose, roll_angle=roll,
+                environment=env)
 
     pos = s.position
     for j in range(len(pos[0,:])):
         pos[:,j] = rotz(pos[:,j], yaw)
     x,y,z = pos
-    arc,alphas,betas,lifts,drags,moms,rolls = d.post_process(s, omega)
+    arc,alphas,betas,lifts,drags,moms,rolls = d.post_process(s, omega, env)
     
     # Plot trajectory
     ax1.plot(x,y,f'C{i}-')
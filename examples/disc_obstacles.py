@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+A fan of drives through a wooded fairway, with trunks, canopies, a
+basket and an out of bounds fence, reporting which obstacle stops each
+throw. The cost of the collision checks is compared for forests of
+growing size.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from shotshaper.environment import Environment
+from shotshaper.obstacles import Obstacles, cylinder, ellipsoid, box
+import matplotlib.pyplot as pl
+import numpy as np
+import time
+
+d = DiscGolfDisc('dd2')
+params = dict(speed=24, omega=116.8, pitch=6.0, position=(0, 0, 1.5), nose_angle=2.0)
+throws = [dict(params, roll_angle=r, yaw=y) for r in (-20, -10, 0, 10) for y in np.linspace(-15, 15, 7)]
+
+
+def forest(n, length, rng):
+    # Trees with a trunk and a canopy, ids 1000 and up for trunks and
+    # 2000 and up for canopies
+    xy = rng.uniform((10, -length/4), (length, length/4), (n, 2))
+    shapes = [cylinder(x, y, 0.2, 5) for x, y in xy]
+    shapes += [ellipsoid((x, y, 7), (2.5, 2.5, 2.5)) for x, y in xy]
+    ids = list(1000 + np.arange(n)) + list(2000 + np.arange(n))
+    return shapes, ids
+
+
+rng = np.random.default_rng(3)
+shapes, ids = forest(20, 80, rng)
+shapes += [cylinder(70, 0, 0.05, 1.4), box((0, 25, 0), (100, 25.5, 1.5))]
+ids += [1, 2]
+obstacles = Obstacles(shapes, ids)
+print(obstacles)
+
+shots = d.shoot_many(throws, environment=Environment(obstacles=obstacles))
+for kind, lo, hi in (('trunks', 1000, 2000), ('canopies', 2000, 3000)):
+    print('Stopped by %s: %d' % (kind, ((shots.obstacle >= lo) & (shots.obstacle < hi)).sum()))
+print('Hit the basket: %d, the fence: %d, clear: %d' % (
+    (shots.obstacle == 1).sum(), (shots.obstacle == 2).sum(), (shots.obstacle < 0).sum()))
+
+# Collision cost as the course grows at the same density of trees
+params_many = [dict(params, roll_angle=r, yaw=y) for r in np.linspace(-20, 20, 20)
+               for y in np.linspace(-15, 15, 25)]
+t0 = time.perf_counter()
+d.shoot_many(params_many)
+print('No obstacles: %.3f s' % (time.perf_counter() - t0))
+for n in (10, 100, 1000, 10000):
+    length = 80*np.sqrt(n/20)
+    layer = Obstacles(*forest(n, length, rng))
+    env = Environment(obstacles=layer)
+    t0 = time.perf_counter()
+    d.shoot_many(params_many, environment=env)
+    print('%5d trees: %.3f s' % (n, time.perf_counter() - t0))
+
+fig, ax = pl.subplots()
+for s, hit in zip(shots, shots.obstacle):
+    ax.plot(s.position[0], s.position[1], 'C3-' if hit >= 0 else 'C0-', lw=0.8)
+trees = obstacles.kind == 1
+for (x, y, _), (r, _, _) in zip(obstacles.center[trees], obstacles.size[trees]):
+    ax.add_patch(pl.Circle((x, y), r, color='g', alpha=0.3))
+ax.plot(70, 0, 'ko')
+ax.axhline(25, color='r')
+ax.set_xlabel('Distance (m)')
+ax.set_ylabel('Drift (m)')
+ax.axis('equal')
+pl.tight_layout()
+pl.show()
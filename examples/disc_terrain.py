@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+The same drive on flat ground, down a slope and up onto a plateau.
+The heightmaps are saved and memory mapped, as a surveyed raster of a
+hole would be.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from shotshaper.environment import Environment
+from shotshaper.terrain import Terrain
+import matplotlib.pyplot as pl
+import numpy as np
+import tempfile
+
+d = DiscGolfDisc('dd2')
+params = dict(speed=24, omega=116.8, pitch=6.0, nose_angle=2.0, roll_angle=-10.0)
+
+x = np.linspace(-20, 150, 171)
+y = np.linspace(-50, 50, 101)
+X, Y = np.meshgrid(x, y, indexing='ij')
+holes = {'Flat': np.zeros_like(X),
+         'Downhill': -0.2*X,
+         'Plateau': 4.0/(1 + np.exp(-(X - 35)/2))}
+
+fig, ax = pl.subplots()
+for i, (name, height) in enumerate(holes.items()):
+    directory = tempfile.mkdtemp()
+    Terrain(x, y, height).save(directory)
+    terrain = Terrain.load(directory)
+    env = Environment(terrain=terrain)
+    # Release 1.5 m above the tee
+    s = d.shoot(**params, position=(0, 0, terrain(0, 0) + 1.5), environment=env)
+    x1, y1, z1 = s.landing
+    print('%-8s landing at (%.2f, %.2f, %.2f), ground %.2f' % (name, x1, y1, z1, terrain(x1, y1)))
+    ax.plot(s.position[0], s.position[2], f'C{i}-', label=name)
+    ax.plot(x, height[:, len(y)//2], f'C{i}:')
+
+ax.set_xlabel('Distance (m)')
+ax.set_ylabel('Height (m)')
+ax.set_xlim(-5, 80)
+ax.legend()
+pl.tight_layout()
+pl.show()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Estimate the release parameters and the wind of the tracked throws 1, 6
+and 15 by least squares, instead of tuning them by hand as in
+disc_experimental_trajectory_comparison.py. The tracks are planar, so
+the spin and nose angle are held fixed and the pitch, roll and wind are
+tied to the initial guess, see shotshaper.fitting.PRIOR.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from shotshaper.fitting import ThrowData, fit_throws
+import matplotlib.pyplot as pl
+import time
+
+throws = [1, 6, 15]
+
+d = DiscGolfDisc('dd2')
+data = [ThrowData.load(f'data/throw{t}') for t in throws]
+
+t0 = time.perf_counter()
+results = fit_throws(d, data)
+print('%d throws fitted in %.1f s' % (len(data), time.perf_counter() - t0))
+
+fig, ax = pl.subplots()
+fig.set_figheight(4)
+fig.set_figwidth(6)
+for i, (t, e, r) in enumerate(zip(throws, data, results)):
+    print(f'Throw {t}:', r)
+    print('    std: ' + ', '.join('%s=%.2f' % (k, e) for k, e in r.std.items()))
+    x, y, z = r.position
+    ax.plot(x, y, f'C{i}-', label=f'Throw {t}, rms {r.rms:.2f} m')
+    ax.plot(*e.position, f'C{i}--')
+
+ax.set_xlabel('Distance (m)')
+ax.set_ylabel('Drift (m)')
+ax.axis('equal')
+ax.legend()
+pl.tight_layout()
+pl.show()
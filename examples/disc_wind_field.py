@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Shoot a disc through a gridded wind field. The field is made from the
+logarithmic profile of the environment, saved and memory mapped, so the
+shot should match the one with the profile itself. A gust is then
+added in the middle of the fairway.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from shotshaper.environment import Environment
+from shotshaper.windfield import WindField
+import matplotlib.pyplot as pl
+import numpy as np
+import tempfile
+import time
+
+d = DiscGolfDisc('dd2')
+params = dict(speed=24, omega=116.8, pitch=6.0, position=(0, 0, 1.5),
+              nose_angle=2.0, roll_angle=-10.0)
+
+env = Environment(Uref=4.0, winddir=(0, 1, 0))
+x = np.linspace(-20, 120, 141)
+y = np.linspace(-40, 40, 81)
+z = np.linspace(0, 30, 61)
+wind = np.empty((len(x), len(y), len(z), 3))
+wind[:] = env.wind_abl(z).T
+
+directory = tempfile.mkdtemp()
+WindField(x, y, z, wind).save(directory)
+field = WindField.load(directory)
+print(field)
+
+# The profile is not linear in z, so the fields differ slightly
+profile = d.shoot(**params, environment=env)
+gridded = d.shoot(**params, environment=env.replace(wind_field=field))
+print('Landing with the profile:   ', profile.landing)
+print('Landing with the wind field:', gridded.landing)
+
+# Interpolation cost, for a single point and for a batch
+p = np.array((40.0, 3.0, 7.5))
+n = 10000
+t0 = time.perf_counter()
+for _ in range(n):
+    field(p)
+print('Single point: %.1f us' % (1e6*(time.perf_counter() - t0)/n))
+P = np.random.default_rng(0).uniform((0, -20, 0), (100, 20, 25), (1000, 3)).T
+t0 = time.perf_counter()
+for _ in range(100):
+    field(P)
+print('1000 points:  %.1f us' % (1e6*(time.perf_counter() - t0)/100))
+
+# Crosswind gust between 40 and 60 m
+gust = wind.copy()
+gust[(x > 40) & (x < 60), :, :, 1] += 6.0
+gusty = d.shoot(**params, environment=env.replace(wind_field=WindField(x, y, z, gust)))
+
+fig, ax = pl.subplots()
+for s, label in ((profile, 'Profile'), (gridded, 'Wind field'), (gusty, 'Gust')):
+    ax.plot(s.position[0], s.position[1], label=label)
+ax.set_xlabel('Distance (m)')
+ax.set_ylabel('Drift (m)')
+ax.axis('equal')
+ax.legend()
+pl.tight_layout()
+pl.show()
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Landing zone of a disc for a release with random variations and a
+gusting cross wind, shown as a probability map.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from shotshaper.montecarlo import dispersion
+from scipy import stats
+import matplotlib.pyplot as pl
+
+d = DiscGolfDisc('dd2')
+release = dict(speed=stats.norm(24.2, 1.0), omega=stats.norm(116.8, 5.0),
+               pitch=stats.norm(15.5, 1.5), nose_angle=stats.norm(0.0, 1.0),
+               roll_angle=stats.norm(14.7, 3.0), position=(0,0,1.3))
+
+result = dispersion(d, release, n=20000, wind_speed=stats.uniform(0, 4),
+                    wind_direction=90)
+
+print(result)
+print('Throughput:      %.0f throws/s per core (%d workers)' % (result.throughput, result.workers))
+print('Covariance:     ', result.covariance.tolist())
+q = result.quantiles((0.05, 0.5, 0.95))
+print('x 5/50/95 %%:     %.1f %.1f %.1f' % tuple(q[0]))
+print('y 5/50/95 %%:     %.1f %.1f %.1f' % tuple(q[1]))
+
+pl.figure()
+pl.pcolormesh(result.x_edges, result.y_edges, result.density().T, cmap='viridis')
+pl.colorbar(label='Probability density (1/m$^2$)')
+pl.axis('equal')
+pl.xlabel('x (m)')
+pl.ylabel('y (m)')
+pl.show()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Find release angles for a throw landing 70 m ahead and 10 m to the
+right, at a fixed speed and spin.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from shotshaper.inverse import solve_release
+import matplotlib.pyplot as pl
+import time
+
+d = DiscGolfDisc('dd2')
+target = (70, -10)
+
+t0 = time.perf_counter()
+solutions, n = solve_release(d, target, speed=24, omega=116, position=(0,0,1.3))
+print('%d solutions from %d simulations in %.1f s' % (len(solutions), n,
+                                                      time.perf_counter() - t0))
+for s in solutions:
+    print(s)
+
+pl.figure()
+for s in solutions[:4]:
+    shot = d.shoot(**s.params)
+    x, y, z = shot.position
+    pl.plot(x, y, label='pitch %.1f, roll %.1f' % (s.params['pitch'], s.params['roll_angle']))
+pl.plot(*target, 'kx', ms=10)
+pl.axis('equal')
+pl.xlabel('x (m)')
+pl.ylabel('y (m)')
+pl.legend()
+pl.show()
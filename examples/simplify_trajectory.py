@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Simplify a hyzer flip to the samples needed at a few tolerances, and
+compare with the uniform sampling in time of the same number of points.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+import matplotlib.pyplot as pl
+import numpy as np
+import time
+
+d = DiscGolfDisc('dd2')
+s = d.shoot(speed=24.2, omega=116.8, pitch=15.5, position=np.array((0, 0, 1.3)),
+            nose_angle=0.0, roll_angle=14.7)
+dense = s.resample(2000)
+
+
+def path_error(path, points):
+    # Largest distance of the points from the polyline through path
+    a, b = path[:, :-1, None], path[:, 1:, None]
+    c = b - a
+    u = np.clip(np.sum((points[:, None] - a)*c, axis=0)/np.sum(c*c, axis=0), 0, 1)
+    return np.linalg.norm(points[:, None] - a - u*c, axis=0).min(axis=0).max()
+
+
+fig, ax = pl.subplots()
+ax.plot(dense.position[0], dense.position[1], 'k-', lw=0.5, label='Dense')
+for i, tolerance in enumerate((0.1, 0.01)):
+    # Simplified from the dense sampling, so that the tolerance holds for
+    # the path itself and not only for the 200 samples of the shot
+    t0 = time.perf_counter()
+    r = dense.simplify(tolerance)
+    dt = time.perf_counter() - t0
+    uniform = s.resample(len(r))
+    print('Tolerance %.2f m: %d of %d samples in %.2f ms, error %.3f m, uniform in time %.3f m' % (
+        tolerance, len(r), len(dense), 1e3*dt, path_error(r.position, dense.position),
+        path_error(uniform.position, dense.position)))
+    ax.plot(r.position[0], r.position[1], f'C{i}o-', ms=3, label='%g m, %d samples' % (tolerance, len(r)))
+
+turns = s.summary.turns['position']
+ax.plot(turns[:, 0], turns[:, 1], 'rx', label='Turns')
+ax.set_xlabel('Distance (m)')
+ax.set_ylabel('Drift (m)')
+ax.legend()
+pl.tight_layout()
+pl.show()
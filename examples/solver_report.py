@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Accuracy versus cost of the available integration settings for each
+projectile class. The landing point of each setting is compared to a
+tightly converged reference solution, so that the cheapest setting
+meeting a given landing accuracy can be picked.
+"""
+
+from shotshaper.projectile import ShotPutBall, SoccerBall, TableTennisBall, DiscGolfDisc
+from shotshaper.integrate import Solver
+import numpy as np
+import time
+
+cases = [
+    ('ShotPutBall', ShotPutBall('M'),
+     dict(speed=13.5, pitch=38, position=(0,0,2.2))),
+    ('SoccerBall', SoccerBall(),
+     dict(speed=25, pitch=20, spin=(0,0,-40))),
+    ('TableTennisBall', TableTennisBall(),
+     dict(speed=16.8, pitch=45, position=(0,0,1.0), spin=(0,0,0))),
+    ('DiscGolfDisc', DiscGolfDisc('dd2'),
+     dict(speed=24.2, omega=116.8, pitch=15.5, position=(0,0,1.3),
+          nose_angle=0.0, roll_angle=14.7)),
+]
+
+solvers = [
+    Solver('RK45'),
+    Solver('RK45', rtol=1e-6, atol=1e-9),
+    Solver('DOP853', rtol=1e-6, atol=1e-9),
+    Solver('LSODA', rtol=1e-6, atol=1e-9),
+    Solver('Radau', rtol=1e-6, atol=1e-9),
+    Solver('RK4', dt=0.05),
+    Solver('RK4', dt=0.01),
+    Solver('Verlet', dt=0.01),
+    Solver('Verlet', dt=0.002),
+]
+reference = Solver('DOP853', rtol=1e-11, atol=1e-11)
+
+
+class Counter:
+    def __init__(self, f):
+        self.f = f
+        self.n = 0
+
+    def __call__(self, *args):
+        self.n += 1
+        return self.f(*args)
+
+
+for name, p, kwargs in cases:
+    advance = p.advance
+    ref = p.shoot(solver=reference, **kwargs).landing
+
+    print()
+    print(name)
+    print('%-48s %12s %8s %10s' % ('Solver', 'Landing (m)', 'RHS', 'Time (ms)'))
+    for solver in solvers:
+        p.advance = Counter(advance)
+        t0 = time.perf_counter()
+        s = p.shoot(solver=solver, **kwargs)
+        t = time.perf_counter() - t0
+        err = np.linalg.norm(s.landing - ref)
+        print('%-48s %12.2e %8d %10.2f' % (solver, err, p.advance.n, 1e3*t))
+    p.advance = advance
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+Sweep speed, pitch and roll of a disc and plot the distance and drift.
+Interrupt the script and run it again to resume the sweep.
+"""
+
+from shotshaper.projectile import DiscGolfDisc
+from shotshaper.sweep import cartesian, run_sweep
+from shotshaper.summary import SUMMARY
+import matplotlib.pyplot as pl
+import numpy as np
+import time
+
+d = DiscGolfDisc('dd2')
+design = cartesian(speed=np.linspace(15, 30, 16), pitch=np.linspace(0, 30, 16),
+                   roll_angle=np.linspace(-40, 40, 17))
+
+t0 = time.perf_counter()
+sweep = run_sweep(d, design, 'sweep_dd2', fixed=dict(omega=116, nose_angle=0, position=(0,0,1.3)))
+print('%d throws in %.1f s' % (len(sweep), time.perf_counter() - t0))
+
+distance = sweep.summary[:, SUMMARY.index('distance')].reshape(16, 16, 17)
+drift = sweep.summary[:, SUMMARY.index('drift')].reshape(16, 16, 17)
+
+fig, ax = pl.subplots(1, 2, figsize=(10, 4))
+for a, v, label in zip(ax, (distance, drift), ('Distance (m)', 'Drift (m)')):
+    c = a.pcolormesh(np.linspace(-40, 40, 17), np.linspace(0, 30, 16), v[-1], shading='nearest')
+    fig.colorbar(c, ax=a, label=label)
+    a.set_xlabel('Roll angle (deg)')
+    a.set_ylabel('Pitch (deg)')
+    a.set_title('Speed 30 m/s')
+pl.tight_layout()
+pl.show()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Compact storage of many shots.
+
+All shots are kept in one contiguous array of shape
+(n_shots, n_vars, n_samples), where the variables are time followed by
+position, velocity and, for discs, attitude. Shots may have different
+numbers of samples, in which case the unused samples are filled with NaN.
+"""
+
+import os
+import numpy as np
+
+TIME = 0
+POSITION = slice(1, 4)
+VELOCITY = slice(4, 7)
+ATTITUDE = slice(7, 10)
+
+
+class ShotView:
+    """
+    A single shot in a ShotBatch. Provides the same attributes as
+    Shot, as views into the batch storage, so it can be passed to
+    e.g. DiscGolfDisc.post_process without copying.
+    """
+    __slots__ = ('batch', 'index')
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def _get(self, var):
+        return self.batch.data[self.index, var, :self.batch.lengths[self.index]]
+
+    @property
+    def time(self):
+        return self._get(TIME)
+
+    @property
+    def position(self):
+        return self._get(POSITION)
+
+    @property
+    def velocity(self):
+        return self._get(VELOCITY)
+
+    @property
+    def attitude(self):
+        if not self.batch.has_attitude:
+            raise AttributeError("Shot has no attitude")
+        return self._get(ATTITUDE)
+
+    @property
+    def t_end(self):
+        return self.time[-1]
+
+    @property
+    def landing(self):
+        return self.position[:, -1]
+
+    def __len__(self):
+        return int(self.batch.lengths[self.index])
+
+
+class ShotBatch:
+    """
+    Many shots stored as one array of shape (n_shots, n_vars, n_samples).
+
+    Indexing with an integer gives a ShotView, while slices and index
+    arrays give a new ShotBatch. For a batch where all shots have the same
+    length, time has shape (n_shots, n_samples) and position, velocity and
+    attitude have shape (n_shots, 3, n_samples).
+
+    :param array data: Storage array, with variables time, position,
+                       velocity and optionally attitude
+    :param array lengths: Number of valid samples of each shot, all
+                          samples if None
+    :param array status: Integration status of each shot
+    :param array obstacle: Identifier of the obstacle that ended each
+                           shot, -1 if none, see obstacles.Obstacles
+    """
+    __slots__ = ('data', 'lengths', 'status', 'obstacle')
+
+    def __init__(self, data, lengths=None, status=None, obstacle=None):
+        self.data = data
+        if lengths is None:
+            lengths = np.full(data.shape[0], data.shape[2])
+        self.lengths = np.asarray(lengths)
+        self.status = status
+        self.obstacle = obstacle
+
+    @classmethod
+    def empty(cls, n_shots, n_samples, attitude=True, dtype=np.float64):
+        """
+        Allocate a batch filled with NaN.
+
+        :param int n_shots: Number of shots
+        :param int n_samples: Maximum number of samples per shot
+        :param bool attitude: Whether to store attitude
+        :param dtype: Storage type, typically float32 or float64
+        :rtype: ShotBatch
+        """
+        n_vars = 10 if attitude else 7
+        data = np.full((n_shots, n_vars, n_samples), np.nan, dtype=dtype)
+        return cls(data)
+
+    @classmethod
+    def from_shots(cls, shots, dtype=np.float64):
+        """
+        Collect individual shots, which may have different lengths.
+
+        :param shots: Sequence of Shot
+        :param dtype: Storage type
+        :rtype: ShotBatch
+        """
+        lengths = np.array([len(s.time) for s in shots])
+        attitude = hasattr(shots[0], 'attitude')
+        batch = cls.empty(len(shots), lengths.max(), attitude, dtype)
+        for i, s in enumerate(shots):
+            n = lengths[i]
+            batch.data[i, TIME, :n] = s.time
+            batch.data[i, POSITION, :n] = s.position
+            batch.data[i, VELOCITY, :n] = s.velocity
+            if attitude:
+                batch.data[i, ATTITUDE, :n] = s.attitude
+        batch.lengths = lengths
+        return batch
+
+    @property
+    def has_attitude(self):
+        return self.data.shape[1] > 7
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    @property
+    def time(self):
+        return self.data[:, TIME]
+
+    @property
+    def position(self):
+        return self.data[:, POSITION]
+
+    @property
+    def velocity(self):
+        return self.data[:, VELOCITY]
+
+    @property
+    def attitude(self):
+        if not self.has_attitude:
+            raise AttributeError("Shots have no attitude")
+        return self.data[:, ATTITUDE]
+
+    @property
+    def landing(self):
+        """
+        Final position of every shot, shape (n_shots, 3)
+        """
+        i = np.arange(len(self))
+        return self.data[i, POSITION, self.lengths - 1]
+
+    def summary(self):
+        """
+        Flight summaries estimated from the samples, with the quantities
+        of summary.SUMMARY as columns
+
+        :return: Summaries, shape (n_shots, len(SUMMARY))
+        :rtype: array
+        """
+        i = np.arange(len(self))
+        t_end = self.data[i, TIME, self.lengths - 1]
+        landing = self.landing
+        x = self.position
+        return np.stack((t_end, landing[:, 0], landing[:, 1], np.nanmax(x[:, 2], axis=1),
+                         np.nanmin(x[:, 1], axis=1), np.nanmax(x[:, 1], axis=1)), axis=-1)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, key):
+        if np.ndim(key) == 0 and not isinstance(key, slice):
+            i = range(len(self))[key]
+            return ShotView(self, i)
+        status = None if self.status is None else self.status[key]
+        obstacle = None if self.obstacle is None else self.obstacle[key]
+        return ShotBatch(self.data[key], self.lengths[key], status, obstacle)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ShotView(self, i)
+
+    def astype(self, dtype):
+        """
+        Copy of the batch with another storage type.
+
+        :rtype: ShotBatch
+        """
+        return ShotBatch(self.data.astype(dtype), self.lengths.copy(), self.status,
+                         self.obstacle)
+
+    def save(self, path):
+        """
+        Save the storage array to a .npy file. Shorter shots are
+        recognised from the NaN padding of the time when loading. The
+        status and obstacle ids, if any, go to a file next to it with the
+        extension .meta.npz, which is removed when there are none.
+
+        :param string path: File name
+        """
+        path = _npy(path)
+        np.save(path, self.data)
+        extra = {k: v for k, v in (('status', self.status), ('obstacle', self.obstacle))
+                 if v is not None}
+        if extra:
+            np.savez(_meta(path), **extra)
+        elif os.path.exists(_meta(path)):
+            # Left by an earlier batch saved to the same file
+            os.remove(_meta(path))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load a batch saved with save. By default the file is memory
+        mapped, so that shots are only read from disk when accessed.
+
+        :param string path: File name
+        :param string mmap_mode: Passed to numpy.load, None to read into memory
+        :rtype: ShotBatch
+        """
+        path = _npy(path)
+        data = np.load(path, mmap_mode=mmap_mode)
+        lengths = np.count_nonzero(~np.isnan(data[:, TIME]), axis=1)
+        status = obstacle = None
+        if os.path.exists(_meta(path)):
+            with np.load(_meta(path)) as f:
+                status = f['status'] if 'status' in f else None
+                obstacle = f['obstacle'] if 'obstacle' in f else None
+        return cls(data, lengths, status, obstacle)
+
+
+def _npy(path):
+    # File name as written by np.save
+    path = os.fspath(path)
+    return path if path.endswith('.npy') else path + '.npy'
+
+
+def _meta(path):
+    return path[:-len('.npy')] + '.meta.npz'
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Memoization of shots.
+
+A ShotCache wraps the shoot method of any projectile. Results are stored
+under a key computed from the quantized shoot arguments, the projectile
+data (e.g. the disc coefficients and mass) and the environment of the
+shot, so that repeated throws are returned without
+integrating again. An in-memory LRU tier can be combined with an
+on-disk tier that persists between sessions.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from numbers import Number
+import numpy as np
+
+from .environment import OBJECTS as ENVIRONMENT_OBJECTS, resolve as resolve_environment
+from .projectile import Shot
+from .summary import FlightSummary
+
+
+def _update(h, value, decimals):
+    # Feed a value to the hash, rounding floating point data
+    # to the given number of decimals unless it is None
+    if isinstance(value, str):
+        h.update(b's' + value.encode())
+    elif isinstance(value, (bool, np.bool_)):
+        h.update(b'b' + bytes([bool(value)]))
+    elif isinstance(value, (Number, np.ndarray, list, tuple)):
+        a = np.asarray(value, dtype=float)
+        if decimals is not None:
+            a = np.round(a, decimals) + 0.0   # + 0.0 turns -0.0 into 0.0
+        h.update(b'a' + str(a.shape).encode() + a.tobytes())
+    elif value is None:
+        h.update(b'n')
+    elif hasattr(value, '__dict__'):
+        h.update(b'o' + type(value).__name__.encode())
+        _update_dict(h, vars(value), decimals)
+
+
+def _update_dict(h, d, decimals):
+    for k in sorted(d):
+        v = d[k]
+        if callable(v) and not hasattr(v, 'shape'):
+            # Functions are skipped, callable data such as the coefficient
+            # table of a disc is identified by its content hash
+            if not hasattr(v, 'key'):
+                continue
+            v = v.key
+        h.update(k.encode())
+        _update(h, v, decimals)
+
+
+def _quantize(value, decimals):
+    if isinstance(value, (bool, str)) or value is None:
+        return value
+    if isinstance(value, Number):
+        return float(round(value, decimals))
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return np.round(np.asarray(value, dtype=float), decimals)
+    return value
+
+
+class ShotCache:
+    """
+    Cache for shots, used in place of the shoot method, e.g.
+
+    .. code-block:: python
+
+        cache = ShotCache(maxsize=256, directory='shot_cache')
+        shot = cache.shoot(disc, speed=24, omega=116, pitch=15,
+                           nose_angle=0, roll_angle=15)
+
+    Numerical arguments are rounded to the given number of decimals
+    before shooting, so that all arguments within a rounding interval
+    share the same, reproducible result. Returned shots are shared
+    between callers and must not be modified in place.
+
+    :param int maxsize: Number of shots kept in memory
+    :param string directory: Directory for the on-disk tier, None to disable
+    :param int max_files: Number of shots kept on disk, the least
+                          recently used are removed first
+    :param int decimals: Decimals kept when quantizing arguments
+    """
+    def __init__(self, maxsize=1024, directory=None, max_files=100000, decimals=6):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.max_files = max_files
+        self.decimals = decimals
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._shots = OrderedDict()
+        self._lock = threading.Lock()
+        self._n_files = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # A pickled cache, e.g. sent to worker processes, keeps its
+        # settings and disk tier but starts with an empty memory tier
+        state = dict(vars(self))
+        state['_shots'] = OrderedDict()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self._lock = threading.Lock()
+
+    def key(self, projectile, **kwargs):
+        """
+        Content hash identifying a shot.
+
+        :param projectile: Projectile to shoot
+        :return: Hexadecimal key
+        :rtype: string
+        """
+        env = resolve_environment(kwargs.pop('environment', None))
+        h = hashlib.sha1()
+        h.update(type(projectile).__name__.encode())
+        _update_dict(h, vars(projectile), None)
+        conditions = env.as_dict()
+        for k in ENVIRONMENT_OBJECTS:
+            if conditions[k] is not None:
+                # Identified by its content hash, computed once per object
+                conditions[k] = conditions[k].key
+        _update_dict(h, conditions, None)
+        _update_dict(h, kwargs, self.decimals)
+        return h.hexdigest()
+
+    def shoot(self, projectile, **kwargs):
+        """
+        Return the cached shot, or shoot and store it.
+
+        :param projectile: Projectile to shoot
+        :param kwargs: Arguments to the shoot method of the projectile
+        :return: Shot, or FlightSummary with summary_only
+        :rtype: Shot
+        """
+        # Shoot in the environment the key was computed for
+        kwargs['environment'] = resolve_environment(kwargs.get('environment'))
+        key = self.key(projectile, **kwargs)
+
+        with self._lock:
+            shot = self._shots.get(key)
+            if shot is not None:
+                self._shots.move_to_end(key)
+                self.hits += 1
+                return shot
+
+        shot = self._load(key)
+        loaded = shot is not None
+        if not loaded:
+            quantized = {k: _quantize(v, self.decimals) for k, v in kwargs.items()}
+            shot = projectile.shoot(**quantized)
+            self._save(key, shot)
+
+        with self._lock:
+            if loaded:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            self._shots[key] = shot
+            while len(self._shots) > self.maxsize:
+                self._shots.popitem(last=False)
+
+        return shot
+
+    def stats(self):
+        """
+        Hit and miss counts
+
+        :rtype: dict
+        """
+        return dict(hits=self.hits, disk_hits=self.disk_hits, misses=self.misses,
+                    size=len(self._shots))
+
+    def clear(self):
+        """
+        Empty the in-memory tier and reset the statistics
+        """
+        with self._lock:
+            self._shots.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                if 'time' not in f:
+                    # Stored with summary_only
+                    shot = FlightSummary.from_arrays(f)
+                    os.utime(path)
+                    return shot
+                att = f['attitude'] if 'attitude' in f else None
+                shot = Shot(f['time'], f['position'], f['velocity'], att)
+                if 'summary_scalars' in f:
+                    shot.summary = FlightSummary.from_arrays(f)
+        except (OSError, KeyError, ValueError):
+            return None
+        # Mark as recently used for the eviction
+        os.utime(path)
+        return shot
+
+    def _save(self, key, shot):
+        if self.directory is None:
+            return
+        if isinstance(shot, FlightSummary):
+            arrays = shot.to_arrays()
+        else:
+            arrays = dict(time=shot.time, position=shot.position, velocity=shot.velocity)
+            if hasattr(shot, 'attitude'):
+                arrays['attitude'] = shot.attitude
+            if shot.summary is not None:
+                arrays.update(shot.summary.to_arrays())
+        # Unique to the process and thread, for caches shared between them
+        tmp = self._path(key + '.%d.%d.tmp' % (os.getpid(), threading.get_ident()))
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            if self._n_files is None:
+                self._n_files = len(self._files())
+            self._n_files += 1
+            if self._n_files <= self.max_files:
+                return
+            files = sorted(self._files(), key=lambda p: os.stat(p).st_mtime)
+            for p in files[:len(files) - self.max_files]:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            self._n_files = min(len(files), self.max_files)
+
+    def _files(self):
+        return [os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                if f.endswith('.npz')]
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the disc molds in the discs directory.
+
+The YAML files are compiled once into a binary catalog next to them,
+which is recompiled whenever a YAML file is added or changed. Each mold
+is loaded once per process, and its read-only data and coefficient
+tables are shared by all discs of that mold, whatever their mass.
+"""
+
+import os
+import threading
+import numpy as np
+import yaml
+
+from .coefficients import CoefficientTable
+
+DISC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'discs')
+CATALOG = os.path.join(DISC_DIR, '_catalog.npz')
+
+_molds = None
+_stamps = None
+_lock = threading.RLock()
+
+
+def flip(a, cl, cd, cm):
+    """
+    Data given from -90 deg to 90 deg.
+    Expand to -180 to 180 using symmetry considerations.
+    """
+    n = len(a)
+    idx = np.argmin(abs(a))
+
+    a2 = np.zeros(2*n)
+    cl2 = np.zeros(2*n)
+    cd2 = np.zeros(2*n)
+    cm2 = np.zeros(2*n)
+
+    a2[idx:idx+n] = a
+    cl2[idx:idx+n] = cl
+    cd2[idx:idx+n] = cd
+    cm2[idx:idx+n] = cm
+
+    i = np.arange(idx)
+    j = idx - i
+    a2[i] = -(180 + a[j])
+    cl2[i] = -cl[j]
+    cd2[i] = cd[j]
+    cm2[i] = -cm[j]
+
+    i = np.arange(idx+n, 2*n)
+    j = idx + n - i - 2
+    a2[i] = 180 - a[j]
+    cl2[i] = -cl[j]
+    cd2[i] = cd[j]
+    cm2[i] = -cm[j]
+
+    return a2, cl2, cd2, cm2
+
+
+class Mold:
+    """
+    Mass independent data of a disc mold. The arrays are read-only,
+    as they are shared between all discs of the mold.
+
+    :param float diameter: Diameter
+    :param float J_xy: Moment of inertia around the x- and y-axes, per unit mass
+    :param float J_z: Moment of inertia around the z-axis, per unit mass
+    :param array alpha: Angles of attack from -180 to 180 degrees
+    :param array cl: Lift coefficients
+    :param array cd: Drag coefficients
+    :param array cm: Moment coefficients
+    """
+    __slots__ = ('diameter', 'J_xy', 'J_z', 'alpha', 'cl', 'cd', 'cm', '_tables')
+
+    def __init__(self, diameter, J_xy, J_z, alpha, cl, cd, cm):
+        self.diameter = float(diameter)
+        self.J_xy = float(J_xy)
+        self.J_z = float(J_z)
+        for k, v in (('alpha', alpha), ('cl', cl), ('cd', cd), ('cm', cm)):
+            v = np.array(v, dtype=float)
+            v.flags.writeable = False
+            setattr(self, k, v)
+        self._tables = {}
+
+    def coefficients(self, kind='linear'):
+        """
+        Shared coefficient table of the given kind
+
+        :rtype: CoefficientTable
+        """
+        table = self._tables.get(kind)
+        if table is None:
+            table = CoefficientTable(self.alpha, self.cd, self.cl, self.cm, kind=kind)
+            table.table.flags.writeable = False
+            self._tables[kind] = table
+        return table
+
+
+def _sources():
+    return {f[:-5]: os.path.join(DISC_DIR, f) for f in os.listdir(DISC_DIR)
+            if f.endswith('.yaml')}
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def compile_catalog(path=CATALOG):
+    """
+    Parse all YAML files and write the binary catalog. If the catalog
+    cannot be written, e.g. for a read-only installation, the molds
+    are only kept in memory.
+
+    :param string path: Catalog file
+    :return: Molds by name
+    :rtype: dict
+    """
+    molds = {}
+    stamps = {}
+    arrays = {}
+    for name, source in sorted(_sources().items()):
+        with open(source, 'r') as f:
+            data = yaml.load(f, Loader=yaml.CSafeLoader if hasattr(yaml, 'CSafeLoader')
+                             else yaml.SafeLoader)
+        a, cl, cd, cm = flip(np.array(data['alpha'], dtype=float),
+                             np.array(data['Cl'], dtype=float),
+                             np.array(data['Cd'], dtype=float),
+                             np.array(data['Cm'], dtype=float))
+        scalars = (data['diameter'], data['J_xy'], data['J_z'])
+        molds[name] = Mold(*scalars, a, cl, cd, cm)
+        stamps[name] = _stamp(source)
+        arrays[name + '/scalars'] = np.array(scalars, dtype=float)
+        arrays[name + '/coefficients'] = np.array((a, cl, cd, cm))
+        arrays[name + '/stamp'] = np.array(stamps[name], dtype=np.int64)
+
+    try:
+        tmp = path + '.%d.tmp.npz' % os.getpid()
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+    return molds, stamps
+
+
+def load_catalog(path=CATALOG):
+    """
+    Read the binary catalog, compiling it first if it is missing or
+    out of date with respect to the YAML files.
+
+    :param string path: Catalog file
+    :return: Molds and source file stamps by name
+    :rtype: tuple of dicts
+    """
+    sources = _sources()
+    try:
+        with np.load(path) as f:
+            molds = {}
+            stamps = {}
+            for name, source in sources.items():
+                stamp = tuple(int(s) for s in f[name + '/stamp'])
+                if stamp != _stamp(source):
+                    raise KeyError(name)
+                scalars = f[name + '/scalars']
+                molds[name] = Mold(*scalars, *f[name + '/coefficients'])
+                stamps[name] = stamp
+            return molds, stamps
+    except (OSError, KeyError, ValueError):
+        return compile_catalog(path)
+
+
+def get(name):
+    """
+    Data of a disc mold, loading the catalog on first use.
+
+    :param string name: Name of the mold, e.g. dd2
+    :return: Mold
+    :rtype: Mold
+    """
+    global _molds, _stamps
+
+    with _lock:
+        if _molds is None:
+            _molds, _stamps = load_catalog()
+
+        source = os.path.join(DISC_DIR, name + '.yaml')
+        try:
+            stamp = _stamp(source)
+        except OSError:
+            raise FileNotFoundError("No disc named '%s' in %s" % (name, DISC_DIR))
+        if stamp != _stamps.get(name):
+            _molds, _stamps = compile_catalog()
+
+        return _molds[name]
+
+
+def names():
+    """
+    Names of all available molds
+
+    :rtype: list
+    """
+    return sorted(_sources())
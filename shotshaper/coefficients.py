@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Tabulated aerodynamic coefficients.
+"""
+
+import hashlib
+import math
+import numpy as np
+from scipy.interpolate import CubicSpline
+
+
+class CoefficientTable:
+    """
+    Drag, lift and moment coefficients of a disc, resampled to a uniform
+    grid of angles of attack from -180 to 180 degrees. A lookup is then a
+    single index computation followed by linear interpolation, giving all
+    three coefficients in one call.
+
+    With kind linear, the grid includes all data points as long as they
+    lie on multiples of step, and the table reproduces linear
+    interpolation of the data exactly. With kind cubic, the data is
+    interpolated by cubic splines before tabulation.
+
+    :param array alpha: Angles of attack of the data in degrees
+    :param array cd: Drag coefficients
+    :param array cl: Lift coefficients
+    :param array cm: Moment coefficients
+    :param string kind: linear or cubic
+    :param float step: Grid spacing in degrees
+    """
+    def __init__(self, alpha, cd, cl, cm, kind='linear', step=0.5):
+        self.kind = kind
+        self.n = int(round(360/step))
+        self.step = 360/self.n
+        self.angles = np.linspace(-180, 180, self.n + 1)
+
+        if kind == 'linear':
+            data = [np.interp(self.angles, alpha, c) for c in (cd, cl, cm)]
+        elif kind == 'cubic':
+            data = [CubicSpline(alpha, c)(self.angles) for c in (cd, cl, cm)]
+        else:
+            raise ValueError("Unknown kind '%s'" % kind)
+
+        self.table = np.array(data)
+        self.cd, self.cl, self.cm = (d.tolist() for d in data)
+        self._key = None
+
+    @property
+    def key(self):
+        """
+        Content hash of the kind and the tabulated coefficients, computed once
+        """
+        if self._key is None:
+            h = hashlib.sha1(self.kind.encode())
+            h.update(np.ascontiguousarray(self.table, dtype=float).tobytes())
+            self._key = h.hexdigest()
+        return self._key
+
+    def __call__(self, alpha):
+        """
+        Coefficients for the angle(s) of attack alpha.
+
+        :param alpha: Angle in radians, scalar or array
+        :return: Drag, lift and moment coefficients, with the shape of alpha
+        :rtype: tuple
+        """
+        if np.ndim(alpha) == 0:
+            deg = math.degrees(alpha)
+            if not -180.0 <= deg <= 180.0:
+                deg = (deg + 180.0) % 360.0 - 180.0
+            pos = (deg + 180.0)/self.step
+            i = min(int(pos), self.n - 1)
+            w = pos - i
+            cd, cl, cm = self.cd, self.cl, self.cm
+            return (cd[i] + w*(cd[i+1] - cd[i]),
+                    cl[i] + w*(cl[i+1] - cl[i]),
+                    cm[i] + w*(cm[i+1] - cm[i]))
+
+        deg = np.degrees(alpha)
+        outside = (deg < -180.0) | (deg > 180.0)
+        if outside.any():
+            deg = np.where(outside, (deg + 180.0) % 360.0 - 180.0, deg)
+        pos = (deg + 180.0)/self.step
+        i = np.minimum(pos.astype(int), self.n - 1)
+        w = pos - i
+        c = self.table[:, i] + w*(self.table[:, i+1] - self.table[:, i])
+        return c[0], c[1], c[2]
+
+    def slopes(self, alpha):
+        """
+        Derivatives of the coefficients with respect to the angle of
+        attack, consistent with the interpolation done by __call__.
+
+        :param alpha: Angle in radians, scalar or array
+        :return: dCd/dalpha, dCl/dalpha and dCm/dalpha per radian
+        :rtype: tuple
+        """
+        deg = np.degrees(alpha)
+        deg = np.where((deg < -180.0) | (deg > 180.0), (deg + 180.0) % 360.0 - 180.0, deg)
+        i = np.minimum(((deg + 180.0)/self.step).astype(int), self.n - 1)
+        d = (self.table[:, i+1] - self.table[:, i])*(180.0/(math.pi*self.step))
+        return d[0], d[1], d[2]
@@ -1,6 +1,22 @@
 # -*- coding: utf-8 -*-
 """
+Physical conditions of a shot: gravity, air properties and wind.
+
+An Environment holds one set of conditions, and is passed to shoot and
+shoot_many with the keyword environment. It cannot be modified, so that
+shots with different conditions may run at the same time in threads or
+asynchronous tasks. The module globals below are the default conditions,
+used for shots without an environment. Changing them affects later
+shots, but not the Environment objects already made.
+
+While a shot is integrated, its environment is the active one, as
+returned by current. The activation is local to the thread, or to the
+asynchronous task, running the shot.
 """
+import hashlib
+import math
+from contextlib import contextmanager
+from contextvars import ContextVar
 import numpy as np
 
 g = -9.81
@@ -14,14 +30,283 @@ Uref = 0.0
 zref = 1.5
 kappa = 0.41
 
+# Gridded wind replacing the logarithmic profile, see windfield.WindField
+wind_field = None
+# Heightmap of the ground, flat at z = 0 if None, see terrain.Terrain
+terrain = None
+# Trees and structures ending a shot, see obstacles.Obstacles
+obstacles = None
+
+# Names of the conditions, in the order of the arguments of Environment
+KEYS = ('g', 'rho', 'mu', 'winddir', 'z0', 'Uref', 'zref', 'kappa', 'wind_field', 'terrain',
+        'obstacles')
+# Conditions held by reference, identified by their content hash in caches
+OBJECTS = ('wind_field', 'terrain', 'obstacles')
+
+
+class Environment:
+    """
+    Immutable set of conditions, see replace for a modified copy. The
+    constants of the logarithmic wind profile are computed once.
+    Conditions not given take the values of the module globals.
+
+    :param float g: Gravitational acceleration, negative downwards
+    :param float rho: Density of air
+    :param float mu: Dynamic viscosity of air
+    :param array winddir: Direction of the wind, a unit vector
+    :param float z0: Roughness length of the ground
+    :param float Uref: Wind speed at the reference height
+    :param float zref: Reference height
+    :param float kappa: von Karman constant
+    :param WindField wind_field: Gridded wind used instead of the
+                                 logarithmic profile, optional
+    :param Terrain terrain: Heightmap of the ground, optional
+    :param Obstacles obstacles: Obstacles ending a shot, optional
+    :ivar array wind_ref: Wind vector at the reference height, Uref*winddir
+    :ivar float log_ref: log((zref + z0)/z0)
+    :ivar float wind_scale: Wind speed per unit of log((z + z0)/z0)
+    """
+    __slots__ = KEYS + ('wind_ref', 'log_ref', 'wind_scale', '_zero', '_key')
+
+    def __init__(self, g=None, rho=None, mu=None, winddir=None, z0=None, Uref=None,
+                 zref=None, kappa=None, wind_field=None, terrain=None, obstacles=None):
+        given = dict(g=g, rho=rho, mu=mu, winddir=winddir, z0=z0, Uref=Uref,
+                     zref=zref, kappa=kappa, wind_field=wind_field, terrain=terrain,
+                     obstacles=obstacles)
+        values = {k: globals()[k] if v is None else v for k, v in given.items()}
+        for k in KEYS:
+            if k != 'winddir' and k not in OBJECTS:
+                values[k] = float(values[k])
+        values['winddir'] = np.array(values['winddir'], dtype=float)
+        values['wind_ref'] = values['Uref']*values['winddir']
+        values['_zero'] = np.zeros(3)
+        for k in ('winddir', 'wind_ref', '_zero'):
+            values[k].flags.writeable = False
+        values['log_ref'] = math.log((values['zref'] + values['z0'])/values['z0'])
+        values['wind_scale'] = values['Uref']/values['log_ref']
+        values['_key'] = None
+        for k, v in values.items():
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Environment cannot be modified, use replace")
+
+    def __reduce__(self):
+        return (Environment, tuple(getattr(self, k) for k in KEYS))
+
+    def replace(self, **changes):
+        """
+        Copy with some conditions changed, e.g. env.replace(Uref=4.8)
+
+        :rtype: Environment
+        """
+        values = {k: getattr(self, k) for k in KEYS}
+        values.update(changes)
+        return Environment(**values)
+
+    def as_dict(self):
+        """
+        Conditions by name, see KEYS
+
+        :rtype: dict
+        """
+        return {k: getattr(self, k) for k in KEYS}
+
+    @property
+    def key(self):
+        """
+        Content hash of the conditions, computed once. The wind field,
+        terrain and obstacles are identified by their own content hash.
+
+        :rtype: string
+        """
+        if self._key is None:
+            h = hashlib.sha1()
+            for k in KEYS:
+                v = getattr(self, k)
+                if k in OBJECTS:
+                    h.update(b'n' if v is None else v.key.encode())
+                else:
+                    h.update(np.asarray(v, dtype=float).tobytes())
+            object.__setattr__(self, '_key', h.hexdigest())
+        return self._key
+
+    def __eq__(self, other):
+        if not isinstance(other, Environment):
+            return NotImplemented
+        return all(getattr(self, k) is getattr(other, k) for k in OBJECTS) and \
+            all(np.array_equal(getattr(self, k), getattr(other, k))
+                for k in KEYS if k not in OBJECTS)
+
+    def __hash__(self):
+        return hash(tuple(np.asarray(getattr(self, k)).tobytes() for k in KEYS if k not in OBJECTS)
+                    + tuple(id(getattr(self, k)) for k in OBJECTS))
+
+    def __repr__(self):
+        values = ['%s=%s' % (k, np.round(getattr(self, k), 6).tolist())
+                  for k in KEYS if k not in OBJECTS]
+        values += ['%s=%r' % (k, getattr(self, k)) for k in OBJECTS
+                   if getattr(self, k) is not None]
+        return 'Environment(%s)' % ', '.join(values)
+
+    def height(self, x):
+        """
+        Height above the ground of the position(s) x
+
+        :param array x: Position (3,), or stacked positions (3, N)
+        :return: Height, scalar or shape (N,)
+        """
+        if self.terrain is None:
+            return x[2]
+        return x[2] - self.terrain(x[0], x[1])
+
+    def wind(self, x, t=0.0):
+        """
+        Wind at the position(s) x at the time(s) t, from the wind field
+        if there is one, else from the logarithmic profile
+
+        :param array x: Position (3,), or stacked positions (3, N)
+        :param t: Time, scalar or array of shape (N,)
+        :return: Wind, shape (3,) or (3, N)
+        :rtype: array
+        """
+        if self.wind_field is not None:
+            return self.wind_field(x, t)
+        return self.wind_abl(self.height(x))
+
+    def wind_gradient(self, x, t=0.0):
+        """
+        Derivatives of wind with respect to x, y and z, for a single position
+
+        :return: Matrix with the derivative along x, y and z in its columns
+        :rtype: array
+        """
+        if self.wind_field is not None:
+            return self.wind_field.gradient(x, t)
+        G = np.zeros((3,3))
+        G[:,2] = self.wind_abl_gradient(self.height(x))
+        if self.terrain is not None:
+            # The profile follows the ground
+            dhdx, dhdy = self.terrain.gradient(x[0], x[1])
+            G[:,0] = -dhdx*G[:,2]
+            G[:,1] = -dhdy*G[:,2]
+        return G
+
+    def wind_abl(self, z):
+        """
+        Wind vector of the atmospheric boundary layer at the height(s) z
+
+        :param z: Height, scalar or array of shape (N,)
+        :return: Wind, shape (3,) or (3, N)
+        :rtype: array
+        """
+        if np.ndim(z) > 0:
+            u = self.wind_scale*np.log((np.maximum(z, 0.0) + self.z0)/self.z0)
+            return np.multiply.outer(self.winddir, u)
+
+        if self.wind_scale == 0.0 or z <= 0.0:
+            return self._zero
+        return (self.wind_scale*math.log((z + self.z0)/self.z0))*self.winddir
+
+    def wind_profile(self, z):
+        """
+        Wind speed at the height(s) z relative to the reference speed Uref,
+        such that wind_abl(z) = Uref*winddir*wind_profile(z)
+        """
+        z = np.maximum(z, 0.0)
+        return np.log((z + self.z0)/self.z0)/self.log_ref
+
+    def wind_abl_gradient(self, z):
+        """
+        Derivative of wind_abl with respect to the height z, for a single height
+        """
+        if z <= 0.0:
+            return self._zero
+
+        return self.wind_scale/(z + self.z0)*self.winddir
+
+
+_active = ContextVar('environment', default=None)
+
+# Environment of the module globals, with the values it was made from
+# and the contents of winddir
+_from_globals = None
+
+
+def from_globals():
+    """
+    Environment with the current values of the module globals. It is
+    made again only when a global has been assigned, or winddir
+    modified in place, since the last call.
+
+    :rtype: Environment
+    """
+    global _from_globals
+    values = tuple(globals()[k] for k in KEYS)
+    direction = np.asarray(winddir).tobytes()
+    cached = _from_globals
+    if cached is not None and direction == cached[1] and \
+            all(a is b for a, b in zip(values, cached[0])):
+        return cached[2]
+    env = Environment()
+    _from_globals = (values, direction, env)
+    return env
+
+
+def current():
+    """
+    Environment of the shot being integrated, or the module
+    globals outside of a shot
+
+    :rtype: Environment
+    """
+    env = _active.get()
+    return from_globals() if env is None else env
+
+
+def resolve(env=None):
+    """
+    The given environment, or the current one if None
+
+    :rtype: Environment
+    """
+    return current() if env is None else env
+
+
+@contextmanager
+def use(env=None):
+    """
+    Make env the active environment within a with block, e.g.
+
+    .. code-block:: python
+
+        with environment.use(Environment(Uref=4.8)):
+            arc, alphas, betas, lifts, drags, moms, rolls = disc.post_process(s, omega)
+
+    :param Environment env: Conditions, the module globals if None
+    """
+    env = from_globals() if env is None else env
+    token = _active.set(env)
+    try:
+        yield env
+    finally:
+        _active.reset(token)
+
+
 def wind_abl(z):
     # For a constant wind:
     # return Uref*winddir
+    return current().wind_abl(z)
+
+def wind_profile(z):
+    """
+    Wind speed at the height(s) z relative to the reference speed Uref,
+    such that wind_abl(z) = Uref*winddir*wind_profile(z)
+    """
+    return current().wind_profile(z)
 
-    if z < 0.0:
-        z = 0.0
-    
-    ustar = Uref*kappa/(np.log((zref+z0)/z0))
-    u = ustar/kappa*np.log((z+z0)/z0)
-    
-    return u*winddir
+def wind_abl_gradient(z):
+    """
+    Derivative of wind_abl with respect to the height z, for a single height
+    """
+    return current().wind_abl_gradient(z)
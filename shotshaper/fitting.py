@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""
+Fitting of disc throws to tracked trajectories.
+
+fit_throws estimates the release parameters, the wind and optionally
+factors on the aerodynamic coefficients of throws by nonlinear least
+squares. The experimental data is aligned in time with the release and
+interpolated once, when creating a ThrowData, so that the model is
+simply sampled at the times of the data. The Levenberg-Marquardt
+iterations of many throws run in lock step: the parameter perturbations
+of the finite difference Jacobians of all throws are simulated together
+in one call to shoot_many, and so are the trial steps. Larger batches
+are split in chunks spread over a process pool.
+
+Tracks of the ground position alone do not determine all the release
+parameters and the wind: a higher spin, a nose angle or a headwind bend
+the path much alike, and so do a steeper pitch and a larger roll. By
+default the spin is held at the empirical relation to the speed and the
+nose angle at zero, and the pitch, roll angle and wind are tied to their
+initial values by a Gaussian prior, see PRIOR. Parameters ending on a
+bound are reported.
+
+The yaw of a throw is its heading, and is applied by turning the
+simulated trajectory, with the wind turned the opposite way during the
+simulation. The wind is given in the axes of the data, as wind_x and
+wind_y at the reference height, replacing the wind of the environment.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import warnings
+import numpy as np
+
+from .environment import resolve as resolve_environment
+from .integrate import Solver
+
+RELEASE = ('speed', 'omega', 'pitch', 'roll_angle', 'nose_angle', 'yaw')
+WIND = ('wind_x', 'wind_y')
+SCALE = ('cd_scale', 'cl_scale', 'cm_scale')
+PARAMETERS = RELEASE + WIND + SCALE
+
+# Parameters estimated by default, the spin, nose angle and coefficient
+# factors are held at their initial values
+FREE = ('speed', 'pitch', 'roll_angle', 'yaw') + WIND
+
+# Standard deviations of the prior around the initial values, for the
+# parameters that planar tracks constrain poorly
+PRIOR = dict(pitch=10.0, roll_angle=20.0, omega=20.0, nose_angle=2.0, wind_x=2.0, wind_y=2.0,
+             cd_scale=0.1, cl_scale=0.1, cm_scale=0.1)
+
+BOUNDS = dict(speed=(5, 40), omega=(10, 300), pitch=(-20, 45), roll_angle=(-90, 90),
+              nose_angle=(-20, 20), yaw=(-90, 90), wind_x=(-15, 15), wind_y=(-15, 15),
+              cd_scale=(0.5, 2), cl_scale=(0.5, 2), cm_scale=(0.5, 2))
+
+# Finite difference steps
+STEPS = dict(speed=1e-2, omega=1e-1, pitch=1e-2, roll_angle=1e-2, nose_angle=1e-2,
+             yaw=1e-2, wind_x=1e-2, wind_y=1e-2, cd_scale=1e-3, cl_scale=1e-3, cm_scale=1e-3)
+
+# A fixed step makes the trajectories smooth functions of the parameters
+SOLVER = Solver('RK4', dt=0.02)
+
+# Release height of the throws when it is not tracked
+HEIGHT = 1.5
+
+MAX_ITERATIONS = 200
+CHUNK = 256
+
+
+class ThrowData:
+    """
+    Tracked trajectory of a throw, with time starting at the release.
+
+    :param array time: Times of the samples
+    :param array position: Positions, shape (2, n) for (x, y) or (3, n) for (x, y, z)
+    :param array speed: Speeds, optional, NaN where missing
+    :param float dt: Interval to interpolate the samples to, None to keep them
+    :ivar array release: Position of the first sample
+    """
+    def __init__(self, time, position, speed=None, dt=None):
+        time = np.asarray(time, dtype=float)
+        position = np.atleast_2d(np.asarray(position, dtype=float))
+        ok = np.isfinite(time) & np.isfinite(position).all(axis=0)
+        time, position = time[ok], position[:, ok]
+        if speed is not None:
+            speed = np.asarray(speed, dtype=float)[ok]
+        time = time - time[0]
+
+        if dt is not None:
+            grid = np.arange(0, time[-1] + 0.5*dt, dt)
+            position = np.array([np.interp(grid, time, p) for p in position])
+            if speed is not None:
+                known = np.isfinite(speed)
+                speed = np.interp(grid, time[known], speed[known], left=np.nan, right=np.nan)
+            time = grid
+
+        self.time = time
+        self.position = position
+        self.speed = speed
+        self.release = position[:, 0]
+
+    @classmethod
+    def load(cls, path, dt=None):
+        """
+        Read a tracked throw with columns t, x, y and v after two header
+        lines, as the files data/throwN. Speeds of zero are missing values.
+
+        :param string path: File name
+        :param float dt: Interval to interpolate the samples to
+        :rtype: ThrowData
+        """
+        t, x, y, v = np.loadtxt(path, skiprows=2, unpack=True)
+        v[v <= 0] = np.nan
+        return cls(t, (x, y), v, dt)
+
+    def __len__(self):
+        return len(self.time)
+
+
+class FitResult:
+    """
+    Parameters of a throw estimated by fit_throws.
+
+    :ivar dict params: All model parameters, see PARAMETERS
+    :ivar tuple free: Names of the estimated parameters
+    :ivar dict std: Standard deviation of the estimated parameters, from
+                    the Jacobian at the solution
+    :ivar float rms: Root mean square position residual in meters
+    :ivar array position: Fitted trajectory at the times of the data, in its axes
+    :ivar int n_simulations: Number of simulated throws
+    :ivar bool success: Whether the iterations converged
+    :ivar tuple at_bound: Names of the estimated parameters that ended on
+                          one of their bounds, which are then not determined
+                          by the data
+    """
+    def __init__(self, params, free, std, rms, position, n_simulations, success,
+                 at_bound=()):
+        self.params = params
+        self.free = free
+        self.std = std
+        self.rms = rms
+        self.position = position
+        self.n_simulations = n_simulations
+        self.success = success
+        self.at_bound = at_bound
+
+    def shoot_params(self, height=HEIGHT):
+        """
+        Keywords for DiscGolfDisc.shoot_many reproducing the fitted throw
+        in the axes of the simulation, i.e. before turning it by the yaw
+
+        :rtype: dict
+        """
+        return _shoot_params(self.params, height)
+
+    def __repr__(self):
+        free = ', '.join('%s=%.2f' % (k, self.params[k]) for k in self.free)
+        if self.at_bound:
+            free += ', at_bound=%s' % (self.at_bound,)
+        return 'FitResult(%s, rms=%.3f)' % (free, self.rms)
+
+
+def _shoot_params(p, height):
+    yaw = np.radians(p['yaw'])
+    c, s = np.cos(yaw), np.sin(yaw)
+    wx, wy = p['wind_x'], p['wind_y']
+    return dict(speed=p['speed'], omega=p['omega'], pitch=p['pitch'],
+                roll_angle=p['roll_angle'], nose_angle=p['nose_angle'],
+                position=(0.0, 0.0, height), wind=(c*wx + s*wy, c*wy - s*wx, 0.0),
+                scale=(p['cd_scale'], p['cl_scale'], p['cm_scale']))
+
+
+class _Residuals:
+    # Residuals of many throws. Row i of X holds the free parameters of
+    # throw index[i], and the residuals of all throws are padded with
+    # zeros to the length of the longest. The prior adds the deviations
+    # from the initial values x0 in standard deviations, weighted by the
+    # square root of the number of samples so that one standard deviation
+    # costs as much as a root mean square misfit of one meter
+    def __init__(self, disc, datasets, keys, values, heights, solver, speed_weight, env,
+                 x0, prior):
+        self.disc = disc
+        self.env = env
+        self.keys = keys
+        self.values = values
+        self.heights = heights
+        self.solver = solver
+        self.speed_weight = speed_weight
+        self.x0 = x0
+        self.prior = np.array([prior.get(k, np.inf) for k in keys], dtype=float)
+        self.tied = np.isfinite(self.prior)
+        self.prior_weight = np.sqrt([len(d) for d in datasets])
+        self.n_simulations = np.zeros(len(datasets), dtype=int)
+
+        n = max(len(d) for d in datasets)
+        pad = lambda a: np.pad(a, [(0, 0)]*(np.ndim(a) - 1) + [(0, n - a.shape[-1])], mode='edge')
+        self.time = np.array([pad(d.time) for d in datasets])
+        self.release = np.array([d.release[0:2] for d in datasets])
+        self.position = np.zeros((len(datasets), 3, n))
+        self.mask = np.zeros((len(datasets), 3, n))
+        self.speed = np.zeros((len(datasets), n))
+        self.speed_mask = np.zeros((len(datasets), n))
+        for i, d in enumerate(datasets):
+            m = len(d)
+            self.position[i, :len(d.position), :m] = d.position
+            self.mask[i, :len(d.position), :m] = 1
+            if speed_weight and d.speed is not None:
+                known = np.isfinite(d.speed)
+                self.speed[i, :m] = np.where(known, d.speed, 0)
+                self.speed_mask[i, :m] = speed_weight*known
+
+    def params(self, x, i):
+        p = dict(self.values[i])
+        p.update(zip(self.keys, np.asarray(x, dtype=float).tolist()))
+        return p
+
+    def trajectories(self, X, index):
+        params = [self.params(x, i) for x, i in zip(X, index)]
+        shots = self.disc.shoot_many([_shoot_params(p, self.heights[i])
+                                      for p, i in zip(params, index)],
+                                     solver=self.solver, times=self.time[index],
+                                     environment=self.env)
+        self.n_simulations += np.bincount(index, minlength=len(self.n_simulations))
+
+        # Turn by the yaw, and move to the release point of the data
+        yaw = np.radians([p['yaw'] for p in params])[:, None]
+        c, s = np.cos(yaw), np.sin(yaw)
+        x, y, z = shots.position.transpose(1, 0, 2)
+        position = np.stack((c*x - s*y, s*x + c*y, z), axis=1)
+        position[:, 0:2] += self.release[index, :, None]
+        return position, shots.velocity
+
+    def __call__(self, X, index):
+        position, velocity = self.trajectories(X, index)
+        r = (position - self.position[index])*self.mask[index]
+        r = [r.reshape(len(X), -1)]
+        if self.speed_weight:
+            speed = np.sqrt((velocity**2).sum(axis=1))
+            r.append((speed - self.speed[index])*self.speed_mask[index])
+        if self.tied.any():
+            r.append(((X - self.x0[index])/self.prior*self.prior_weight[index, None])[:, self.tied])
+        return np.concatenate(r, axis=1)
+
+
+def _levenberg_marquardt(residuals, x, lo, hi, steps, max_iterations, ftol, xtol):
+    # Levenberg-Marquardt iterations for many throws in lock step, with
+    # the steps projected onto the bounds. The forward differences of the
+    # Jacobians, and the trial steps, of all throws are simulated together.
+    T, k = x.shape
+    x = x.copy()
+    all_throws = np.arange(T)
+    r = residuals(x, all_throws)
+    cost = 0.5*(r*r).sum(axis=1)
+    J = np.zeros((T, r.shape[1], k))
+    damping = np.full(T, 1e-3)
+    stale = np.ones(T, dtype=bool)
+    active = np.ones(T, dtype=bool)
+    converged = np.zeros(T, dtype=bool)
+
+    for iteration in range(max_iterations):
+        idx = np.flatnonzero(active & stale)
+        if len(idx):
+            # Step backwards at the upper bound
+            h = np.where(x[idx] + steps <= hi, steps, -steps)
+            X = (x[idx, None, :] + h[:, :, None]*np.eye(k)).reshape(-1, k)
+            R = residuals(X, np.repeat(idx, k)).reshape(len(idx), k, -1)
+            J[idx] = ((R - r[idx, None, :])/h[:, :, None]).transpose(0, 2, 1)
+            stale[idx] = False
+
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+        A = np.einsum('inj,ink->ijk', J[idx], J[idx])
+        g = np.einsum('inj,in->ij', J[idx], r[idx])
+        # Hold parameters at a bound that the descent direction leaves
+        blocked = ((x[idx] <= lo) & (g > 0)) | ((x[idx] >= hi) & (g < 0))
+        A[blocked[:, :, None] | blocked[:, None, :]] = 0
+        g[blocked] = 0
+        D = np.where(blocked, 1.0, np.maximum(np.einsum('ijj->ij', A), 1e-12))
+        A += (damping[idx, None] + blocked)[:, :, None]*D[:, :, None]*np.eye(k)
+        trial = np.clip(x[idx] + np.linalg.solve(A, -g[..., None])[..., 0], lo, hi)
+        r_trial = residuals(trial, idx)
+        cost_trial = 0.5*(r_trial*r_trial).sum(axis=1)
+
+        better = cost_trial < cost[idx]
+        done = better & ((cost[idx] - cost_trial <= ftol*cost[idx]) |
+                         (np.linalg.norm(trial - x[idx], axis=1)
+                          <= xtol*(np.linalg.norm(x[idx], axis=1) + xtol)))
+        a = idx[better]
+        x[a], r[a], cost[a] = trial[better], r_trial[better], cost_trial[better]
+        damping[a] /= 3
+        stale[a] = True
+        damping[idx[~better]] *= 4
+        converged[idx[done]] = True
+        active[idx[done | (damping[idx] > 1e10)]] = False
+
+    # Jacobians at the solutions, for the covariances
+    idx = np.flatnonzero(stale)
+    if len(idx):
+        h = np.where(x[idx] + steps <= hi, steps, -steps)
+        X = (x[idx, None, :] + h[:, :, None]*np.eye(k)).reshape(-1, k)
+        R = residuals(X, np.repeat(idx, k)).reshape(len(idx), k, -1)
+        J[idx] = ((R - r[idx, None, :])/h[:, :, None]).transpose(0, 2, 1)
+
+    return x, r, J, converged
+
+
+def guess(disc, data, height=HEIGHT, environment=None):
+    """
+    Rough parameters of a throw from the start of its trajectory: the
+    speed and heading over the first 0.2 seconds, the empirical spin for
+    that speed, and a level release with the wind of the environment.
+
+    :param DiscGolfDisc disc: Disc thrown
+    :param ThrowData data: Tracked trajectory
+    :param float height: Release height
+    :param Environment environment: Conditions, the current if None
+    :rtype: dict
+    """
+    env = resolve_environment(environment)
+    k = max(np.searchsorted(data.time, 0.2), 1)
+    d = data.position[:, k] - data.position[:, 0]
+    pitch = 10.0
+    if len(d) > 2:
+        # Undo the fall under gravity
+        d[2] -= 0.5*env.g*data.time[k]**2
+        pitch = np.degrees(np.arctan2(d[2], np.hypot(d[0], d[1])))
+    speed = np.linalg.norm(d)/data.time[k]
+    wind = env.wind_ref
+    return dict(speed=float(speed), omega=float(disc.empirical_spin(speed)), pitch=float(pitch),
+                roll_angle=0.0, nose_angle=0.0, yaw=float(np.degrees(np.arctan2(d[1], d[0]))),
+                wind_x=float(wind[0]), wind_y=float(wind[1]),
+                cd_scale=1.0, cl_scale=1.0, cm_scale=1.0)
+
+
+def fit_throws(disc, datasets, free=FREE, initial=None, bounds=None, heights=None,
+               prior=None, speed_weight=0.0, solver=None, max_iterations=MAX_ITERATIONS,
+               ftol=1e-6, xtol=1e-6, chunk=CHUNK, workers=None, environment=None,
+               **fixed):
+    """
+    Estimate the parameters of throws from their tracked trajectories.
+    The throws are fitted in chunks, each chunk in lock step so that one
+    call to shoot_many serves all its throws, and the chunks are spread
+    over a process pool.
+
+    .. code-block:: python
+
+        data = [ThrowData.load('data/throw%d' % i) for i in (1, 6, 15)]
+        results = fit_throws(DiscGolfDisc('dd2'), data, wind_x=4.8, wind_y=0)
+        results = fit_throws(DiscGolfDisc('dd2'), data, free=FREE + ('omega', 'cl_scale'))
+
+    :param DiscGolfDisc disc: Disc thrown
+    :param datasets: Sequence of ThrowData
+    :param tuple free: Parameters to estimate, from PARAMETERS
+    :param initial: Initial values for each throw, dictionaries that may
+                    be partial or None, from guess where not given
+    :param dict bounds: Bounds overriding those of BOUNDS
+    :param heights: Release height of each throw, from the data if tracked, else HEIGHT
+    :param dict prior: Standard deviations of the prior overriding those of
+                       PRIOR, inf for none
+    :param float speed_weight: Weight of the speed residuals, in meters per m/s
+    :param Solver solver: Integration settings, defaults to SOLVER
+    :param int max_iterations: Maximum number of iterations
+    :param float ftol: Relative reduction of the sum of squares for convergence
+    :param float xtol: Relative change of the parameters for convergence
+    :param int chunk: Throws fitted together
+    :param int workers: Number of processes, all cores if None. With one
+                        worker the chunks run in this process.
+    :param Environment environment: Air and gravity, the current if None
+    :param fixed: Values of parameters held fixed, e.g. wind_x=4.8
+    :return: Results in the order of datasets. A warning is issued for
+             parameters ending on a bound, see FitResult.at_bound.
+    :rtype: list of FitResult
+    """
+    free = tuple(free)
+    initial = initial or [None]*len(datasets)
+    if heights is None:
+        heights = [d.release[2] if len(d.position) > 2 else HEIGHT for d in datasets]
+    limits = dict(BOUNDS, **(bounds or {}))
+    options = (free, limits, dict(PRIOR, **(prior or {})), speed_weight, solver or SOLVER,
+               max_iterations, ftol, xtol, resolve_environment(environment), fixed)
+    jobs = [(disc, datasets[i:i+chunk], initial[i:i+chunk], heights[i:i+chunk]) + options
+            for i in range(0, len(datasets), chunk)]
+    if workers == 1 or len(jobs) == 1:
+        results = [_fit_chunk(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_fit_chunk, *zip(*jobs)))
+    results = [r for chunk_results in results for r in chunk_results]
+
+    at_bound = ['%d (%s)' % (i, ', '.join(r.at_bound)) for i, r in enumerate(results)
+                if r.at_bound]
+    if at_bound:
+        warnings.warn('Parameters ended on a bound for throws %s, fix them or '
+                      'tie them with a prior' % '; '.join(at_bound))
+    return results
+
+
+def fit_throw(disc, data, initial=None, height=None, **kwargs):
+    """
+    Estimate the parameters of a throw from its tracked trajectory, e.g.
+    fit_throw(DiscGolfDisc('dd2'), ThrowData.load('data/throw6')).
+    See fit_throws for the keywords.
+
+    :param DiscGolfDisc disc: Disc thrown
+    :param ThrowData data: Tracked trajectory
+    :param dict initial: Initial values, from guess where not given
+    :param float height: Release height, from the data if tracked, else HEIGHT
+    :rtype: FitResult
+    """
+    heights = None if height is None else [height]
+    return fit_throws(disc, [data], initial=[initial], heights=heights, workers=1, **kwargs)[0]
+
+
+def _fit_chunk(disc, datasets, initial, heights, free, limits, prior, speed_weight, solver,
+               max_iterations, ftol, xtol, env, fixed):
+    values = []
+    for data, p, height in zip(datasets, initial, heights):
+        v = guess(disc, data, height, env)
+        v.update(p or {})
+        v.update(fixed)
+        values.append(v)
+    lo, hi = np.array([limits[k] for k in free], dtype=float).T
+    x0 = np.clip([[v[k] for k in free] for v in values], lo, hi)
+    steps = np.array([STEPS[k] for k in free])
+
+    residuals = _Residuals(disc, datasets, free, values, heights, solver, speed_weight, env,
+                           x0, prior)
+    x, r, J, converged = _levenberg_marquardt(residuals, x0, lo, hi, steps,
+                                              max_iterations, ftol, xtol)
+
+    position, _ = residuals.trajectories(x, np.arange(len(x)))
+    results = []
+    for i, data in enumerate(datasets):
+        # Covariance from the Jacobian, scaled by the residual variance
+        n_res = data.position.size + residuals.tied.sum()
+        variance = (r[i]**2).sum()/max(n_res - len(free), 1)
+        std = np.sqrt(np.maximum(np.diag(np.linalg.pinv(J[i].T @ J[i])*variance), 0))
+        m, d = len(data), len(data.position)
+        rms = np.sqrt(((position[i, :d, :m] - data.position)**2).sum(axis=0).mean())
+        at_bound = tuple(k for k, v, a, b in zip(free, x[i], lo, hi) if v <= a or v >= b)
+        results.append(FitResult(residuals.params(x[i], i), free, dict(zip(free, std.tolist())),
+                                 float(rms), position[i, :, :m], int(residuals.n_simulations[i]),
+                                 bool(converged[i]), at_bound))
+    return results
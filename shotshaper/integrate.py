@@ -0,0 +1,535 @@
+# -*- coding: utf-8 -*-
+"""
+Integration settings and integrators complementing scipy's solve_ivp.
+
+solve_batch integrates many independent projectiles in one go. The right
+hand side is evaluated for all projectiles at once, with the states stored
+column-wise, i.e. ``y`` has shape (n, N) for N projectiles with n state
+variables each. Every projectile keeps its own step size and its own
+terminal events, so the result is the same as integrating them one by one
+with the RK45 method of solve_ivp, but the Python overhead is paid once per
+step instead of once per step and projectile.
+
+solve_fixed provides fixed step RK4 and Verlet integrators, for which the
+cost of a shot is known in advance.
+"""
+
+import numpy as np
+
+T_END = 60
+N_STEP = 200
+
+FIXED_STEP_METHODS = ('RK4', 'Verlet')
+IMPLICIT_METHODS = ('Radau', 'BDF', 'LSODA')
+
+class Solver:
+    """
+    Settings for the integration of a shot, passed to shoot with
+    the keyword solver.
+
+    :param string method: Any solve_ivp method, e.g. RK45, DOP853, LSODA
+                          or Radau, or one of the fixed step methods RK4
+                          and Verlet
+    :param float rtol: Relative tolerance, adaptive methods only
+    :param float atol: Absolute tolerance, adaptive methods only
+    :param float max_step: Maximum step size, adaptive methods only
+    :param float first_step: Initial step size, adaptive methods only
+    :param float dt: Step size, fixed step methods only
+    :param float t_end: Maximum flight time
+    :param int n_step: Number of samples in the returned shot
+    """
+    def __init__(self, method='RK45', rtol=1e-3, atol=1e-6, max_step=np.inf,
+                 first_step=None, dt=0.01, t_end=T_END, n_step=N_STEP):
+        self.method = method
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.first_step = first_step
+        self.dt = dt
+        self.t_end = t_end
+        self.n_step = n_step
+
+    def __repr__(self):
+        if self.fixed_step:
+            return "Solver(method='%s', dt=%g)" % (self.method, self.dt)
+        return "Solver(method='%s', rtol=%g, atol=%g)" % (self.method, self.rtol, self.atol)
+
+    @property
+    def fixed_step(self):
+        return self.method in FIXED_STEP_METHODS
+
+    @property
+    def implicit(self):
+        return self.method in IMPLICIT_METHODS
+
+    def options(self, jac=None):
+        """
+        Keyword arguments for solve_ivp
+
+        :param callable jac: Jacobian of the right hand side, only
+                             passed on for the implicit methods
+        :rtype: dict
+        """
+        options = dict(method=self.method, rtol=self.rtol, atol=self.atol,
+                       max_step=self.max_step, first_step=self.first_step)
+        if jac is not None and self.implicit:
+            options['jac'] = jac
+        return options
+
+
+# Dormand-Prince 5(4) coefficients, identical to scipy's RK45
+C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+A = np.array([
+    [0, 0, 0, 0, 0],
+    [1/5, 0, 0, 0, 0],
+    [3/40, 9/40, 0, 0, 0],
+    [44/45, -56/15, 32/9, 0, 0],
+    [19372/6561, -25360/2187, 64448/6561, -212/729, 0],
+    [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]
+])
+B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525, 1/40])
+ERROR_EXPONENT = -1/5
+
+SAFETY = 0.9
+MIN_FACTOR = 0.2
+MAX_FACTOR = 10
+
+N_BISECT = 50
+
+
+def _rms(x):
+    return np.sqrt(np.mean(x**2, axis=0))
+
+
+def _subset(args, idx):
+    return [a[..., idx] for a in args]
+
+
+def hermite(t0, y0, f0, t1, y1, f1, t):
+    """
+    Cubic Hermite interpolation between two integration points.
+    All arguments may be stacked, with time arrays broadcasting
+    against the last axis of the state arrays.
+    """
+    h = t1 - t0
+    h = np.where(h > 0, h, 1.0)
+    s = (t - t0)/h
+    s2 = s*s
+    s3 = s2*s
+    h00 = 2*s3 - 3*s2 + 1
+    h10 = s3 - 2*s2 + s
+    h01 = -2*s3 + 3*s2
+    h11 = s3 - s2
+
+    return h00*y0 + h10*h*f0 + h01*y1 + h11*h*f1
+
+
+class BatchSolution:
+    """
+    Result of solve_batch and solve_fixed. Keeps the accepted steps
+    of every projectile, and evaluates the solution through cubic Hermite
+    interpolation between them.
+
+    :param array t_end: Final time of each projectile, shape (N,)
+    :param array status: 1 if a terminal event was hit, 0 if the end of
+                         the interval was reached and -1 on failure
+    :param list t_events: Roots of each event for each projectile, if recorded
+    """
+    def __init__(self, t_end, status, rows, t, y, f, t_events=None):
+        self.t_end = t_end
+        self.status = status
+        self.t_events = t_events
+
+        order = np.argsort(rows, kind='stable')
+        self._t = t[order]
+        self._y = y[:, order]
+        self._f = f[:, order]
+        counts = np.bincount(rows, minlength=len(t_end))
+        self._offsets = np.concatenate(([0], np.cumsum(counts)))
+        # Projectile and time of each step as one sorted key, see at
+        self._scale = self._t.max() + 1.0
+        self._key = np.repeat(np.arange(len(t_end)), counts)*self._scale + self._t
+
+    def __len__(self):
+        return len(self.t_end)
+
+    def __call__(self, j, t):
+        """
+        Evaluate the solution of projectile j at the times t.
+
+        :param int j: Projectile index
+        :param array t: Times, within [0, t_end[j]]
+        :return: States, shape (n, len(t))
+        :rtype: array
+        """
+        lo, hi = self._offsets[j], self._offsets[j+1]
+        tj = self._t[lo:hi]
+        k = np.searchsorted(tj, t, side='right') - 1
+        k = np.clip(k, 0, max(hi - lo - 2, 0))
+        k1 = np.minimum(k + 1, hi - lo - 1)
+        yj = self._y[:, lo:hi]
+        fj = self._f[:, lo:hi]
+
+        return hermite(tj[k], yj[:, k], fj[:, k],
+                       tj[k1], yj[:, k1], fj[:, k1], t)
+
+    def at(self, j, t):
+        """
+        Evaluate the solution of the projectiles j at the times t, for
+        many projectiles at once.
+
+        :param array j: Projectile indices, shape (m,)
+        :param array t: Times, shape (m,), within [0, t_end[j]]
+        :return: States, shape (n, m)
+        :rtype: array
+        """
+        j = np.asarray(j)
+        t = np.asarray(t, dtype=float)
+        lo, hi = self._offsets[j], self._offsets[j+1]
+        k = np.searchsorted(self._key, j*self._scale + t, side='right') - 1
+        k = np.clip(k, lo, np.maximum(hi - 2, lo))
+        k1 = np.minimum(k + 1, hi - 1)
+
+        return hermite(self._t[k], self._y[:, k], self._f[:, k],
+                       self._t[k1], self._y[:, k1], self._f[:, k1], t)
+
+    def sample(self, n, out=None):
+        """
+        Sample all projectiles at n uniformly spaced times between
+        zero and their individual final time.
+
+        :param int n: Number of samples per projectile
+        :param array out: Array of shape (N, n_vars, n) to write the states to
+        :return: Times with shape (N, n) and states with shape (N, n_vars, n)
+        :rtype: tuple
+        """
+        t = np.linspace(0, self.t_end, n, axis=-1)
+        return self.evaluate(t, out)
+
+    def evaluate(self, t, out=None):
+        """
+        Sample all projectiles at given times. Times after the final
+        time of a projectile are clipped to it, repeating its final state.
+
+        :param array t: Times, shape (n,) for all or (N, n) for each projectile
+        :param array out: Array of shape (N, n_vars, n) to write the states to
+        :return: Clipped times with shape (N, n) and states with shape (N, n_vars, n)
+        :rtype: tuple
+        """
+        N = len(self)
+        t = np.minimum(np.broadcast_to(t, (N, np.shape(t)[-1])), self.t_end[:, None])
+        if out is None:
+            out = np.empty((N, self._y.shape[0], t.shape[1]))
+        for j in range(N):
+            out[j] = self(j, t[j])
+
+        return t, out
+
+
+def _initial_step(fun, t0, y0, f0, args, t_bound, rtol, atol):
+    # Vectorized version of scipy.integrate._ivp.common.select_initial_step,
+    # order 4 error estimator
+    scale = atol + np.abs(y0)*rtol
+    d0 = _rms(y0/scale)
+    d1 = _rms(f0/scale)
+    small = (d0 < 1e-5) | (d1 < 1e-5)
+    h0 = np.where(small, 1e-6, 0.01*d0/np.where(small, 1.0, d1))
+    h0 = np.minimum(h0, t_bound - t0)
+    y1 = y0 + h0*f0
+    f1 = fun(t0 + h0, y1, *args)
+    d2 = _rms((f1 - f0)/scale)/h0
+
+    dmax = np.maximum(d1, d2)
+    flat = dmax <= 1e-15
+    h1 = np.where(flat, np.maximum(1e-6, h0*1e-3),
+                  (0.01/np.where(flat, 1.0, dmax))**(1/5))
+
+    return np.minimum(np.minimum(100*h0, h1), t_bound - t0)
+
+
+def _locate(event, t0, y0, f0, t1, y1, f1, g0):
+    # Bisection for the event root on the step interpolant, vectorized
+    # over all projectiles that triggered the event in this step
+    lo = t0.copy()
+    hi = t1.copy()
+    glo = g0.copy()
+    for i in range(N_BISECT):
+        mid = 0.5*(lo + hi)
+        g = event(mid, hermite(t0, y0, f0, t1, y1, f1, mid))
+        same = np.sign(g) == np.sign(glo)
+        lo = np.where(same, mid, lo)
+        glo = np.where(same, g, glo)
+        hi = np.where(same, hi, mid)
+
+    return hi
+
+
+def solve_batch(fun, t_bound, y0, args=(), events=(), rtol=1e-3, atol=1e-6,
+                max_step=np.inf, first_step=None):
+    """
+    Integrate N independent systems from time zero with an explicit
+    Runge-Kutta method of order 5(4), using a separate adaptive step
+    size for each system.
+
+    :param callable fun: Right hand side ``fun(t, y, *args)``, taking a time
+                         array of shape (m,) and states of shape (n, m)
+    :param float t_bound: Final time
+    :param array y0: Initial states, shape (n, N)
+    :param tuple args: Extra arguments to fun, arrays whose last axis
+                       has length N
+    :param tuple events: Event functions ``event(t, y)`` returning an
+                         array of shape (m,). The attributes ``terminal``
+                         and ``direction`` are used as in solve_ivp,
+                         except that all events must be terminal.
+    :param float rtol: Relative tolerance
+    :param float atol: Absolute tolerance
+    :param float max_step: Maximum step size
+    :param float first_step: Initial step size, selected automatically if None
+    :return: Solution of all systems
+    :rtype: BatchSolution
+    """
+    y0 = np.asarray(y0, dtype=float)
+    n, N = y0.shape
+    args = [np.asarray(a, dtype=float) for a in args]
+
+    t = np.zeros(N)
+    y = y0.copy()
+    f = fun(t, y, *args)
+    if first_step is None:
+        h = _initial_step(fun, t, y, f, args, t_bound, rtol, atol)
+    else:
+        h = np.full(N, float(first_step))
+    h = np.minimum(h, max_step)
+    g = np.array([ev(t, y) for ev in events]).reshape(len(events), N)
+    directions = [getattr(ev, 'direction', 0) for ev in events]
+
+    t_end = np.full(N, float(t_bound))
+    status = np.zeros(N, dtype=int)
+    active = np.ones(N, dtype=bool)
+    rejected = np.zeros(N, dtype=bool)
+
+    rows, ts, ys, fs = [np.arange(N)], [t.copy()], [y.copy()], [f.copy()]
+
+    K = np.empty((7, n, N))
+    while active.any():
+        idx = np.flatnonzero(active)
+        m = len(idx)
+        ta = t[idx]
+        ya = y[:, idx]
+        fa = f[:, idx]
+        argsa = _subset(args, idx)
+
+        # Fail on vanishing steps, as solve_ivp does
+        min_step = 10*np.abs(np.nextafter(ta, np.inf) - ta)
+        failed = h[idx] < min_step
+        if failed.any():
+            status[idx[failed]] = -1
+            t_end[idx[failed]] = ta[failed]
+            active[idx[failed]] = False
+            continue
+
+        ha = np.minimum(h[idx], t_bound - ta)
+        Ka = K[:, :, :m]
+        Ka[0] = fa
+        for s in range(1, 6):
+            dy = np.tensordot(A[s, :s], Ka[:s], axes=(0, 0))*ha
+            Ka[s] = fun(ta + C[s]*ha, ya + dy, *argsa)
+        y_new = ya + np.tensordot(B, Ka[:6], axes=(0, 0))*ha
+        t_new = ta + ha
+        f_new = fun(t_new, y_new, *argsa)
+        Ka[6] = f_new
+
+        err = np.tensordot(E, Ka, axes=(0, 0))*ha
+        scale = atol + np.maximum(np.abs(ya), np.abs(y_new))*rtol
+        err_norm = _rms(err/scale)
+
+        with np.errstate(divide='ignore'):
+            factor = SAFETY*err_norm**ERROR_EXPONENT
+        accept = err_norm < 1
+        grow = np.where(err_norm == 0, MAX_FACTOR, np.minimum(MAX_FACTOR, factor))
+        grow = np.where(rejected[idx], np.minimum(1, grow), grow)
+        shrink = np.maximum(MIN_FACTOR, factor)
+        h[idx] = np.minimum(ha*np.where(accept, grow, shrink), max_step)
+        rejected[idx] = ~accept
+
+        if not accept.any():
+            continue
+
+        ia = idx[accept]
+        ta, ya, fa = ta[accept], ya[:, accept], fa[:, accept]
+        t_new, y_new, f_new = t_new[accept], y_new[:, accept], f_new[:, accept]
+
+        t[ia] = t_new
+        y[:, ia] = y_new
+        f[:, ia] = f_new
+        rows.append(ia)
+        ts.append(t_new)
+        ys.append(y_new)
+        fs.append(f_new)
+
+        # Terminal events, keep the earliest root if several trigger
+        t_stop = t_new.copy()
+        hit = np.zeros(len(ia), dtype=bool)
+        for e, ev in enumerate(events):
+            g_old = g[e, ia]
+            g_new = ev(t_new, y_new)
+            g[e, ia] = g_new
+            # A strict sign change, so that an event function staying at
+            # zero is not crossed at every step
+            up = (g_old < 0) & (g_new >= 0)
+            down = (g_old > 0) & (g_new <= 0)
+            if directions[e] > 0:
+                crossed = up
+            elif directions[e] < 0:
+                crossed = down
+            else:
+                crossed = up | down
+            if not crossed.any():
+                continue
+            c = np.flatnonzero(crossed)
+            root = _locate(ev, ta[c], ya[:, c], fa[:, c],
+                           t_new[c], y_new[:, c], f_new[:, c], g_old[c])
+            t_stop[c] = np.minimum(t_stop[c], root)
+            hit[c] = True
+
+        done = hit | (t_new >= t_bound)
+        t_end[ia[done]] = t_stop[done]
+        status[ia[hit]] = 1
+        active[ia[done]] = False
+
+    return BatchSolution(t_end, status, np.concatenate(rows),
+                         np.concatenate(ts), np.concatenate(ys, axis=1),
+                         np.concatenate(fs, axis=1))
+
+
+def _rk4_step(fun, t, y, f, dt, args):
+    k2 = fun(t + 0.5*dt, y + 0.5*dt*f, *args)
+    k3 = fun(t + 0.5*dt, y + 0.5*dt*k2, *args)
+    k4 = fun(t + dt, y + dt*k3, *args)
+    return y + dt/6*(f + 2*k2 + 2*k3 + k4)
+
+
+def _verlet_step(fun, t, y, f, dt, args):
+    # Velocity Verlet, where the velocity dependent forces at the new
+    # position use a predicted velocity. Any state beyond position
+    # and velocity follows the same trapezoidal update.
+    y_pred = y + dt*f
+    y_pred[0:3] += 0.5*dt*dt*f[3:6]
+    f_pred = fun(t + dt, y_pred, *args)
+    y_new = y + 0.5*dt*(f + f_pred)
+    y_new[0:3] = y_pred[0:3]
+    return y_new
+
+
+def solve_fixed(fun, t_bound, y0, args=(), events=(), dt=0.01, method='RK4'):
+    """
+    Integrate from time zero with a fixed step size. The cost is four
+    right hand side evaluations per step with RK4 and two with Verlet,
+    which assumes that the first three states are positions and the
+    next three their velocities.
+
+    Stacked states of shape (n, N) are integrated together, in which case
+    fun and the events work on stacked arrays as for solve_batch. All
+    systems are advanced until the last one has terminated. Events that
+    are not terminal do not stop a system, their roots are recorded in
+    the t_events attribute of the solution.
+
+    :param callable fun: Right hand side ``fun(t, y, *args)``
+    :param float t_bound: Final time
+    :param array y0: Initial state, shape (n,) or (n, N)
+    :param tuple args: Extra arguments to fun
+    :param tuple events: Event functions ``event(t, y)``
+    :param float dt: Step size
+    :param string method: RK4 or Verlet
+    :return: Solution of all systems
+    :rtype: BatchSolution
+    """
+    if method == 'RK4':
+        step = _rk4_step
+    elif method == 'Verlet':
+        step = _verlet_step
+    else:
+        raise ValueError("Unknown fixed step method '%s'" % method)
+
+    y0 = np.asarray(y0, dtype=float)
+    if y0.ndim == 1:
+        # Single system, work on a stack of one
+        fun1, events1 = fun, events
+        fun = lambda t, y, *a: np.asarray(fun1(t[0], y[:, 0], *a))[:, None]
+        events = [_stacked_event(ev) for ev in events1]
+        y0 = y0[:, None]
+    n, N = y0.shape
+
+    t = 0.0
+    y = y0.copy()
+    f = fun(np.zeros(N), y, *args)
+    g = np.array([ev(np.zeros(N), y) for ev in events]).reshape(len(events), N)
+    directions = [getattr(ev, 'direction', 0) for ev in events]
+    terminal = [getattr(ev, 'terminal', False) for ev in events]
+    roots = [[[] for j in range(N)] for ev in events]
+
+    t_end = np.full(N, float(t_bound))
+    status = np.zeros(N, dtype=int)
+    active = np.ones(N, dtype=bool)
+    rows, ts, ys, fs = [np.arange(N)], [np.zeros(N)], [y.copy()], [f.copy()]
+
+    n_steps = int(np.ceil(t_bound/dt - 1e-9))
+    for i in range(n_steps):
+        h = min(dt, t_bound - t)
+        tv = np.full(N, t)
+        y_new = step(fun, tv, y, f, h, args)
+        f_new = fun(tv + h, y_new, *args)
+
+        ia = np.flatnonzero(active)
+        rows.append(ia)
+        ts.append(np.full(len(ia), t + h))
+        ys.append(y_new[:, ia])
+        fs.append(f_new[:, ia])
+
+        hit = np.zeros(N, dtype=bool)
+        t_stop = np.full(N, t + h)
+        for e, ev in enumerate(events):
+            g_new = ev(tv + h, y_new)
+            up = (g[e] < 0) & (g_new >= 0)
+            down = (g[e] > 0) & (g_new <= 0)
+            if directions[e] > 0:
+                crossed = up & active
+            elif directions[e] < 0:
+                crossed = down & active
+            else:
+                crossed = (up | down) & active
+            if crossed.any():
+                c = np.flatnonzero(crossed)
+                root = _locate(ev, tv[c], y[:, c], f[:, c], tv[c] + h,
+                               y_new[:, c], f_new[:, c], g[e, c])
+                for j, r in zip(c, root):
+                    roots[e][j].append(r)
+                if terminal[e]:
+                    t_stop[c] = np.minimum(t_stop[c], root)
+                    hit[c] = True
+            g[e] = g_new
+
+        t_end[hit] = t_stop[hit]
+        status[hit] = 1
+        active &= ~hit
+        t, y, f = t + h, y_new, f_new
+        if not active.any():
+            break
+
+    # Drop roots found after a terminal event in the same step
+    t_events = [[np.array([r for r in rj if r <= t_end[j]]) for j, rj in enumerate(re)]
+                for re in roots]
+
+    return BatchSolution(t_end, status, np.concatenate(rows),
+                         np.concatenate(ts), np.concatenate(ys, axis=1),
+                         np.concatenate(fs, axis=1), t_events)
+
+
+def _stacked_event(event):
+    def stacked(t, y):
+        return np.atleast_1d(np.asarray([event(t[k], y[:, k]) for k in range(len(t))],
+                                        dtype=float))
+    stacked.direction = getattr(event, 'direction', 0)
+    stacked.terminal = getattr(event, 'terminal', False)
+    return stacked
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Release parameters for a wanted flight.
+
+solve_release searches the release parameters of a disc, within bounds,
+for a throw landing at a target point and optionally passing close to
+waypoints. Random candidates are first screened with one call to
+shoot_many, after which the most promising ones are refined by bounded
+Nelder-Mead searches running in parallel in a process pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.optimize import minimize
+
+from .environment import resolve as resolve_environment
+
+# Default search space, parameters not given in bounds are held fixed
+BOUNDS = dict(pitch=(0, 40), roll_angle=(-60, 60), nose_angle=(-10, 10), yaw=(-30, 30))
+
+N_SCREEN = 512
+N_STARTS = 8
+MAX_SIMULATIONS = 300
+
+
+class ReleaseSolution:
+    """
+    Release parameters found by solve_release.
+
+    :ivar dict params: Keywords for DiscGolfDisc.shoot
+    :ivar array landing: Landing point
+    :ivar float error: Root mean square miss of the target and waypoints
+    :ivar int n_simulations: Simulations spent on this solution, not
+                             counting shots found in the cache
+    :ivar bool converged: Whether the search met its tolerance
+    """
+    def __init__(self, params, landing, error, n_simulations, converged):
+        self.params = params
+        self.landing = landing
+        self.error = error
+        self.n_simulations = n_simulations
+        self.converged = converged
+
+    def __repr__(self):
+        free = ', '.join('%s=%.2f' % kv for kv in self.params.items()
+                         if isinstance(kv[1], (int, float)))
+        return 'ReleaseSolution(%s, error=%.3f)' % (free, self.error)
+
+
+def _misses(positions, landing, target, waypoints):
+    # Miss of the target by the landing point, and of each waypoint by
+    # the closest sample of the trajectory
+    misses = [np.linalg.norm(landing[:2] - target)]
+    for w in waypoints:
+        d = positions[:len(w)] - w[:, None]
+        misses.append(np.sqrt((d*d).sum(axis=0).min()))
+    return np.array(misses)
+
+
+class _Converged(Exception):
+    pass
+
+
+class _Objective:
+    # Mean squared miss as a function of the free parameters scaled to [0, 1],
+    # raising _Converged as soon as the miss is within tol
+    def __init__(self, disc, fixed, keys, bounds, target, waypoints, cache, tol=0.0):
+        self.disc = disc
+        self.fixed = fixed
+        self.keys = keys
+        self.lo, self.hi = np.array(bounds, dtype=float).T
+        self.target = target
+        self.waypoints = waypoints
+        self.cache = cache
+        self.tol = tol
+        self.n_simulations = 0
+
+    def params(self, s):
+        p = dict(self.fixed)
+        p.update(zip(self.keys, (self.lo + np.clip(s, 0, 1)*(self.hi - self.lo)).tolist()))
+        return p
+
+    def shoot(self, s):
+        # Only simulations that were not found in the cache are counted
+        p = self.params(s)
+        if self.cache is not None:
+            misses = self.cache.misses
+            shot = self.cache.shoot(self.disc, **p)
+            self.n_simulations += self.cache.misses - misses
+        else:
+            self.n_simulations += 1
+            if not self.waypoints:
+                return p, self.disc.summarize(**p).landing, None
+            shot = self.disc.shoot(**p)
+        positions = shot.position if self.waypoints else None
+        return p, shot.summary.landing, positions
+
+    def __call__(self, s):
+        p, landing, positions = self.shoot(s)
+        f = np.mean(_misses(positions, landing, self.target, self.waypoints)**2)
+        if f <= self.tol**2:
+            raise _Converged(s)
+        return f
+
+
+def _refine(disc, fixed, keys, bounds, target, waypoints, cache, s0, tol, max_simulations):
+    objective = _Objective(disc, fixed, keys, bounds, target, waypoints, cache, tol)
+    try:
+        s = minimize(objective, s0, method='Nelder-Mead', bounds=[(0, 1)]*len(keys),
+                     options=dict(maxfev=max_simulations, xatol=1e-4, fatol=0.01*tol**2,
+                                  initial_simplex=_simplex(s0))).x
+    except _Converged as e:
+        s = e.args[0]
+    p, landing, positions = objective.shoot(s)
+    error = np.sqrt(np.mean(_misses(positions, landing, target, waypoints)**2))
+    return ReleaseSolution(p, landing, error, objective.n_simulations, error <= tol)
+
+
+def _simplex(s0, size=0.05):
+    # Initial simplex inside the unit box around s0
+    n = len(s0)
+    simplex = np.tile(s0, (n + 1, 1))
+    for i in range(n):
+        simplex[i+1, i] += size if s0[i] + size <= 1 else -size
+    return simplex
+
+
+def solve_release(disc, target, bounds=None, waypoints=(), n_starts=N_STARTS,
+                  n_screen=N_SCREEN, tol=0.25, max_simulations=MAX_SIMULATIONS,
+                  workers=None, cache=None, seed=0, **fixed):
+    """
+    Find release parameters for a throw landing at a target point.
+
+    .. code-block:: python
+
+        disc = DiscGolfDisc('dd2')
+        solutions, n = solve_release(disc, target=(70, -10), speed=24, omega=116,
+                                     position=(0, 0, 1.3))
+
+    :param DiscGolfDisc disc: Disc to throw
+    :param target: Landing point (x, y)
+    :param dict bounds: Lower and upper bounds of the free parameters, e.g.
+                        dict(pitch=(5, 20), speed=(20, 26)), defaults to BOUNDS
+    :param waypoints: Points (x, y) or (x, y, z) the flight should pass
+    :param int n_starts: Number of local searches
+    :param int n_screen: Random candidates screened to select the starts
+    :param float tol: Wanted root mean square miss in meters
+    :param int max_simulations: Simulations allowed per local search
+    :param int workers: Number of processes, all cores if None. With one
+                        worker the searches run in this process.
+    :param ShotCache cache: Cache to reuse simulations from, shared between
+                            processes through its directory, if any
+    :param int seed: Seed for the random candidates
+    :param fixed: Parameters held fixed, e.g. speed, omega and position,
+                  and other keywords for DiscGolfDisc.shoot such as engine
+                  and environment, the current environment if not given
+    :return: Solutions ranked by their error, and the total number of simulations
+    :rtype: tuple
+    """
+    bounds = dict(BOUNDS if bounds is None else bounds)
+    keys = list(bounds)
+    limits = [bounds[k] for k in keys]
+    fixed.setdefault('engine', 'fast')
+    fixed['environment'] = resolve_environment(fixed.get('environment'))
+    for k in BOUNDS:
+        if k not in bounds:
+            fixed.setdefault(k, 0.0)
+    target = np.asarray(target, dtype=float)[:2]
+    waypoints = [np.asarray(w, dtype=float) for w in waypoints]
+
+    # Screen random candidates all at once
+    rng = np.random.default_rng(seed)
+    candidates = rng.uniform(size=(n_screen, len(keys)))
+    screen = _Objective(disc, fixed, keys, limits, target, waypoints, None)
+    params = [screen.params(s) for s in candidates]
+    # Keywords of shoot that shoot_many takes once for all throws
+    shared = ('engine', 'environment', 'solver')
+    shots = disc.shoot_many([{k: v for k, v in p.items() if k not in shared} for p in params],
+                            solver=fixed.get('solver'), environment=fixed['environment'])
+    misses = np.array([_misses(s.position if waypoints else None, s.landing, target, waypoints)
+                       for s in shots])
+    score = np.mean(misses**2, axis=1)
+    score[shots.status < 0] = np.inf
+    starts = candidates[np.argsort(score)[:n_starts]]
+
+    jobs = [(disc, fixed, keys, limits, target, waypoints, cache, s0, tol, max_simulations)
+            for s0 in starts]
+    if workers == 1:
+        solutions = [_refine(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            solutions = list(pool.map(_refine, *zip(*jobs)))
+
+    n_simulations = n_screen + sum(s.n_simulations for s in solutions)
+
+    # Rank, and drop solutions that converged to the same parameters
+    solutions.sort(key=lambda s: s.error)
+    distinct = []
+    for s in solutions:
+        x = np.array([s.params[k] for k in keys])
+        if all(np.abs(x - np.array([d.params[k] for k in keys])).max() > 0.01*np.ptp(limits, axis=1).max()
+               for d in distinct):
+            distinct.append(s)
+
+    return distinct, n_simulations
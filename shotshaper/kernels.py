@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Fused right hand side kernels for the disc golf disc.
+
+The kernel evaluates the same model as DiscGolfDisc.advance, but the
+chain of transforms T_12, T_23, T_34 and their transposes is written out
+with scalar trigonometry, so that no intermediate matrices or vectors are
+created, and the coefficients are read from the uniform grid of the
+CoefficientTable. All model data is passed as plain arguments, which also
+makes the kernel compilable with numba when it is installed.
+"""
+
+import math
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def disc_rhs(t, vec, omega, mass, area, diameter, I_xy, I_z, rho, g,
+             wind_scale, z0, wx, wy, wz, step, cd, cl, cm):
+    """
+    Right hand side of DiscGolfDisc, see DiscGolfDisc._kernel_args
+    for the arguments following omega.
+    """
+    x, y, z, u, v, w, phi, theta, psi = vec[0], vec[1], vec[2], vec[3], vec[4], \
+                                        vec[5], vec[6], vec[7], vec[8]
+
+    # Logarithmic wind profile, see environment.wind_abl
+    if z < 0.0:
+        z = 0.0
+    uw = wind_scale*math.log((z + z0)/z0)
+    ur = u - uw*wx
+    vr = v - uw*wy
+    wr = w - uw*wz
+
+    # Rows of T_12, i.e. the Body axes in Earth axes
+    cph, sph = math.cos(phi), math.sin(phi)
+    cth, sth = math.cos(theta), math.sin(theta)
+    cps, sps = math.cos(psi), math.sin(psi)
+    b00 = cth*cps
+    b01 = sph*sth*cps - cph*sps
+    b02 = cph*sth*cps + sph*sps
+    b10 = cth*sps
+    b11 = sph*sth*sps + cph*cps
+    b12 = cph*sth*sps - sph*cps
+    b20 = -sth
+    b21 = sph*cth
+    b22 = cph*cth
+
+    # Velocity in Body axes and side slip angle
+    u2 = b00*ur + b01*vr + b02*wr
+    v2 = b10*ur + b11*vr + b12*wr
+    w2 = b20*ur + b21*vr + b22*wr
+    beta = -math.atan2(v2, u2)
+    cb, sb = math.cos(beta), math.sin(beta)
+
+    # Zero side slip axes and angle of attack
+    e3x0 = cb*b00 - sb*b10
+    e3x1 = cb*b01 - sb*b11
+    e3x2 = cb*b02 - sb*b12
+    e3y2 = sb*b02 + cb*b12
+    u3 = cb*u2 - sb*v2
+    alpha_ = -math.atan2(w2, u3)
+    ca, sa = math.cos(alpha_), math.sin(alpha_)
+
+    # Wind axes
+    e4x0 = ca*e3x0 - sa*b20
+    e4x1 = ca*e3x1 - sa*b21
+    e4x2 = ca*e3x2 - sa*b22
+    e4y0 = sb*b00 + cb*b10
+    e4y1 = sb*b01 + cb*b11
+    e4z0 = sa*e3x0 + ca*b20
+    e4z1 = sa*e3x1 + ca*b21
+    e4z2 = sa*e3x2 + ca*b22
+    u4 = ca*u3 - sa*w2
+
+    # Aerodynamic forces, with coefficients tabulated uniformly from
+    # -180 to 180 degrees as in CoefficientTable
+    pos = (math.degrees(alpha_) + 180.0)/step
+    i = min(int(pos), len(cd) - 2)
+    s = pos - i
+    q = 0.5*rho*u4*u4*area
+    Fd = q*(cd[i] + s*(cd[i+1] - cd[i]))
+    Fl = q*(cl[i] + s*(cl[i+1] - cl[i]))
+    M = q*diameter*(cm[i] + s*(cm[i+1] - cm[i]))
+
+    # Accelerations in Wind axes, gravity along Earth z-axis
+    dudt = (-Fd + mass*g*e4x2)/mass
+    dvdt = g*e3y2
+    dwdt = (Fl + mass*g*e4z2)/mass
+    dphidt = -M/(omega*(I_xy - I_z))
+
+    out = np.empty(9)
+    out[0] = u
+    out[1] = v
+    out[2] = w
+    out[3] = dudt*e4x0 + dvdt*e4y0 + dwdt*e4z0
+    out[4] = dudt*e4x1 + dvdt*e4y1 + dwdt*e4z1
+    out[5] = dudt*e4x2 + dvdt*e3y2 + dwdt*e4z2
+    out[6] = dphidt*e3x0
+    out[7] = dphidt*e3x1
+    out[8] = dphidt*e3x2
+    return out
+
+
+_disc_rhs_numba = None
+
+
+def get_disc_rhs(engine):
+    """
+    Get the right hand side kernel for an engine.
+
+    :param string engine: Either fast (pure Python) or numba
+    :return: Kernel function
+    :rtype: callable
+    """
+    global _disc_rhs_numba
+
+    if engine == 'fast':
+        return disc_rhs
+    elif engine == 'numba':
+        if numba is None:
+            raise ImportError("The numba engine requires numba to be installed")
+        if _disc_rhs_numba is None:
+            _disc_rhs_numba = numba.njit(disc_rhs)
+        return _disc_rhs_numba
+
+    raise ValueError("Unknown engine '%s'" % engine)
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed trajectory tables for instant answers in interactive use.
+
+A TrajectoryTable holds flight summaries and downsampled trajectories of
+one disc on a regular grid of speed, omega, pitch, nose angle and roll
+angle. Throws inside the grid are answered by multilinear interpolation
+where the table is accurate enough, and fall back to DiscGolfDisc.shoot
+elsewhere.
+
+Flights respond sharply to the release near a turnover, where a small
+change of speed or angle moves the landing by tens of metres, so a
+single error for the whole table is useless. The error of each grid
+cell is instead estimated from the second differences of the landing
+and the trajectory at its corners, which bound the error of linear
+interpolation for a smooth response, scaled by the largest ratio of
+the true to the estimated error over random validation throws. Throws
+in cells with an estimate above the requested tolerance are simulated.
+The grid is dense over the range of typical throws and covers nothing
+else, since a coarse grid over all release angles is too inaccurate to
+be used.
+
+A table only answers throws in the environment it was built in, and
+simulates throws in any other conditions, e.g. after the wind globals
+of shotshaper.environment are changed.
+
+Tables are built offline with build_table, see also
+utils/build_lookup_tables.py.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import numpy as np
+
+from .environment import resolve as resolve_environment
+from .projectile import DiscGolfDisc, Shot
+from .integrate import Solver
+from .summary import SUMMARY
+
+AXES = ('speed', 'omega', 'pitch', 'nose_angle', 'roll_angle')
+
+# Typical throws, from putts to long drives
+GRID = dict(speed=np.linspace(10, 35, 21),
+            omega=np.linspace(60, 180, 5),
+            pitch=np.linspace(0, 30, 13),
+            nose_angle=np.linspace(0, 20, 9),
+            roll_angle=np.linspace(-40, 40, 17))
+
+# Default accuracy in m for answers from a table
+TOL = 1.0
+
+N_POINTS = 33
+
+
+def _shoot_chunk(name, mass, z0, points, n_points, env):
+    d = DiscGolfDisc(name, mass)
+    params = [dict(zip(AXES, p), position=(0, 0, z0)) for p in points]
+    shots = d.shoot_many(params, solver=Solver(n_step=n_points), environment=env)
+    summary, paths = shots.summary(), shots.position
+    bad = shots.status < 0
+    summary[bad] = np.nan
+    paths[bad] = np.nan
+    return summary, paths
+
+
+def _cell_error(values, n):
+    """
+    Interpolation error estimate of each grid cell, from the second
+    differences along each of the n grid axes of values, shape
+    grid + (d, ...). The norm is taken over d and the maximum over any
+    further axes. Cells next to a failed throw get an infinite error.
+    """
+    error = 0
+    for a in range(n):
+        d2 = np.diff(values, 2, axis=a)
+        d2 = np.linalg.norm(d2, axis=n)
+        if d2.ndim > n:
+            d2 = d2.reshape(d2.shape[:n] + (-1,)).max(axis=-1)
+        # Linear interpolation error of a parabola, at most h^2 f''/8,
+        # with the end points taking the second difference next to them
+        d2 = np.concatenate([d2.take([0], axis=a), d2, d2.take([-1], axis=a)], axis=a)
+        error = error + d2/8
+    error = np.where(np.isnan(error), np.inf, error)
+    # Largest estimate over the corners of each cell
+    for a in range(n):
+        error = np.maximum(error.take(range(error.shape[a] - 1), axis=a),
+                           error.take(range(1, error.shape[a]), axis=a))
+    return error
+
+
+def build_table(name, mass=0.175, z0=1.3, grid=None, n_points=N_POINTS,
+                n_validate=200, workers=None, chunk=2048, seed=0, environment=None):
+    """
+    Simulate a disc on a grid of release parameters.
+
+    :param string name: Disc name, as for DiscGolfDisc
+    :param float mass: Disc mass
+    :param float z0: Release height
+    :param dict grid: Grid values for each of the AXES, defaults to GRID
+    :param int n_points: Samples kept of each trajectory
+    :param int n_validate: Random throws used to estimate the errors
+    :param int workers: Number of processes, all cores if None
+    :param int chunk: Throws per task
+    :param int seed: Seed for the validation throws
+    :param Environment environment: Conditions of the throws, the current if None
+    :return: Table
+    :rtype: TrajectoryTable
+    """
+    env = resolve_environment(environment)
+    grid = dict(GRID, **(grid or {}))
+    axes = [np.asarray(grid[a], dtype=float) for a in AXES]
+    points = np.array(list(product(*axes)))
+    chunks = [points[i:i+chunk] for i in range(0, len(points), chunk)]
+
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(_shoot_chunk, *zip(*[(name, mass, z0, c, n_points, env)
+                                                     for c in chunks])))
+    shape = tuple(len(a) for a in axes)
+    summary = np.concatenate([r[0] for r in results]).reshape(shape + (len(SUMMARY),))
+    paths = np.concatenate([r[1] for r in results]).reshape(shape + (3, n_points))
+
+    n = len(AXES)
+    cell_error = dict(landing=_cell_error(summary[..., 1:3], n),
+                      path=_cell_error(paths, n))
+    table = TrajectoryTable(name, mass, z0, axes, summary, paths, cell_error=cell_error,
+                            environment_key=env.key)
+
+    # Errors of random throws inside the grid
+    rng = np.random.default_rng(seed)
+    test = np.stack([rng.uniform(a[0], a[-1], n_validate) for a in axes], axis=-1)
+    true_summary, true_paths = _shoot_chunk(name, mass, z0, test, n_points, env)
+    est = [table._interpolate(p) for p in test]
+    est_summary = np.array([e[0] for e in est])
+    est_paths = np.array([e[1] for e in est])
+    ok = ~(np.isnan(true_summary).any(axis=1) | np.isnan(est_summary).any(axis=1))
+    table.error = dict(zip(SUMMARY, np.abs(est_summary - true_summary)[ok].max(axis=0)))
+    path_error = np.linalg.norm(est_paths - true_paths, axis=1).max(axis=1)
+    table.error['path'] = path_error[ok].max()
+
+    # Scale the cell estimates to cover the validation throws
+    landing_error = np.linalg.norm(est_summary[:, 1:3] - true_summary[:, 1:3], axis=1)
+    cells = tuple(np.array([table._cell(p)[0] for p in test]).T)
+    for key, e in (('landing', landing_error), ('path', path_error)):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = e[ok]/cell_error[key][cells][ok]
+        ratio = ratio[np.isfinite(ratio)]
+        table.scale[key] = max(1.0, ratio.max()) if len(ratio) else 1.0
+
+    return table
+
+
+class TrajectoryTable:
+    """
+    Flight summaries and trajectories of a disc on a grid of release
+    parameters. The attribute error holds the largest interpolation
+    error over the n_validate random throws of build_table, for each
+    summary quantity and for the trajectory (path) as the distance
+    between points. It is an estimate from a sample, not a bound.
+    Whether a throw is answered from the table is decided by the error
+    estimate of its cell, see cell_error.
+
+    :param string name: Disc name
+    :param float mass: Disc mass
+    :param float z0: Release height
+    :param list axes: Grid values for each of the AXES
+    :param array summary: Summaries, shape grid + (len(SUMMARY),)
+    :param array paths: Positions, shape grid + (3, n_points)
+    :param dict error: Largest errors of the validation throws
+    :param dict cell_error: Error estimates of the landing and the
+                            trajectory (path) for each grid cell
+    :param dict scale: Factors of the cell estimates, from the validation throws
+    :param string environment_key: Key of the environment the table was
+                                   built in, see Environment.key. Tables
+                                   without one only answer by simulation.
+    """
+    def __init__(self, name, mass, z0, axes, summary, paths, error=None,
+                 cell_error=None, scale=None, environment_key=None):
+        self.name = name
+        self.mass = mass
+        self.z0 = z0
+        self.axes = axes
+        self.summary = summary
+        self.paths = paths
+        self.error = error or {}
+        if cell_error is None:
+            n = len(axes)
+            cell_error = dict(landing=_cell_error(summary[..., 1:3], n),
+                              path=_cell_error(paths, n))
+        self.cell_error = cell_error
+        self.scale = dict(dict(landing=1.0, path=1.0), **(scale or {}))
+        self.environment_key = environment_key
+        self._disc = None
+
+        self._corners = np.array(list(product((0, 1), repeat=len(axes))))
+
+    def save(self, path):
+        """
+        Save the table to a .npz file, in single precision.
+
+        :param string path: File name
+        """
+        errors = np.array([self.error.get(k, np.nan) for k in SUMMARY + ('path',)])
+        np.savez_compressed(path, name=self.name, mass=self.mass, z0=self.z0,
+                            summary=self.summary.astype(np.float32),
+                            paths=self.paths.astype(np.float32), error=errors,
+                            landing_error=self.cell_error['landing'].astype(np.float32),
+                            path_error=self.cell_error['path'].astype(np.float32),
+                            scale=np.array((self.scale['landing'], self.scale['path'])),
+                            environment_key=self.environment_key or '',
+                            **{a: x for a, x in zip(AXES, self.axes)})
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a table saved with save.
+
+        :param string path: File name
+        :rtype: TrajectoryTable
+        """
+        with np.load(path) as f:
+            error = dict(zip(SUMMARY + ('path',), f['error']))
+            cell_error = dict(landing=f['landing_error'], path=f['path_error'])
+            scale = dict(zip(('landing', 'path'), f['scale']))
+            env_key = str(f['environment_key']) if 'environment_key' in f else ''
+            return cls(str(f['name']), float(f['mass']), float(f['z0']),
+                       [f[a] for a in AXES], f['summary'], f['paths'], error,
+                       cell_error, scale, env_key or None)
+
+    def contains(self, **kwargs):
+        """
+        Whether a throw is inside the table. All AXES must be given,
+        yaw must be zero and the release height must match the table.
+        Throws with their own solver, or in another environment than
+        the table was built in, are not covered.
+        """
+        if kwargs.get('yaw', 0.0) != 0.0:
+            return False
+        if 'solver' in kwargs or kwargs.get('engine', 'default') != 'default':
+            return False
+        env = resolve_environment(kwargs.get('environment'))
+        if self.environment_key is None or env.key != self.environment_key:
+            return False
+        pos = kwargs.get('position', (0, 0, 0))
+        if pos[0] != 0 or pos[1] != 0 or abs(pos[2] - self.z0) > 1e-9:
+            return False
+        for a, x in zip(AXES, self.axes):
+            if a not in kwargs or not x[0] <= kwargs[a] <= x[-1]:
+                return False
+        return True
+
+    def _cell(self, p):
+        # Lower corner of the grid cell containing p, and the weights of
+        # the upper corners
+        idx = np.empty(len(p), dtype=int)
+        w = np.empty(len(p))
+        for i, (x, v) in enumerate(zip(self.axes, p)):
+            k = min(max(np.searchsorted(x, v, side='right') - 1, 0), len(x) - 2)
+            idx[i] = k
+            w[i] = (v - x[k])/(x[k+1] - x[k])
+        return idx, w
+
+    def estimate(self, key='landing', **kwargs):
+        """
+        Error estimate of the table for a throw inside it, the distance
+        of the landing point or of the trajectory points from a true
+        simulation
+
+        :param string key: landing or path
+        :param kwargs: Throw, as for DiscGolfDisc.shoot
+        :rtype: float
+        """
+        idx, w = self._cell([kwargs[a] for a in AXES])
+        return float(self.scale[key]*self.cell_error[key][tuple(idx)])
+
+    def _interpolate(self, p):
+        # Multilinear interpolation between the 2^5 surrounding grid points
+        idx, w = self._cell(p)
+        corners = idx + self._corners
+        weights = np.prod(np.where(self._corners, w, 1 - w), axis=1)
+        flat = np.ravel_multi_index(corners.T, self.summary.shape[:len(p)])
+
+        n = len(self.axes)
+        summary = self.summary.reshape((-1,) + self.summary.shape[n:])[flat]
+        paths = self.paths.reshape((-1,) + self.paths.shape[n:])[flat]
+        return (np.tensordot(weights, summary, axes=(0, 0)),
+                np.tensordot(weights, paths, axes=(0, 0)))
+
+    def _fallback(self):
+        if self._disc is None:
+            self._disc = DiscGolfDisc(self.name, self.mass)
+        return self._disc
+
+    def summary_at(self, tol=TOL, **kwargs):
+        """
+        Flight summary of a throw, see SUMMARY for the quantities.
+
+        :param float tol: Required accuracy in m of the landing point, a true
+                          simulation is done if the estimate of the table is
+                          larger. Use inf to always answer from the table.
+        :param kwargs: Throw, as for DiscGolfDisc.shoot
+        :return: Summary and its errors, the estimate of the throw for the
+                 distance and drift and the largest validation errors for
+                 the others, all zero for a true simulation
+        :rtype: tuple of dicts
+        """
+        if self._use_table(tol, **kwargs):
+            s, p = self._interpolate([kwargs[a] for a in AXES])
+            if not np.isnan(s).any():
+                error = {k: self.error.get(k, np.nan) for k in SUMMARY}
+                error['distance'] = error['drift'] = self.estimate(**kwargs)
+                return dict(zip(SUMMARY, s)), error
+
+        summary = self._fallback().summarize(**kwargs)
+        return summary.as_dict(), dict.fromkeys(SUMMARY, 0.0)
+
+    def shoot(self, tol=TOL, **kwargs):
+        """
+        Trajectory of a throw, interpolated in the table if possible.
+
+        :param float tol: Required accuracy in m of the trajectory points, a
+                          true simulation is done if the estimate of the table
+                          is larger. Use inf to always answer from the table.
+        :param kwargs: Throw, as for DiscGolfDisc.shoot
+        :return: Shot and its error estimate, which is zero for a true
+                 simulation. Interpolated shots only have positions.
+        :rtype: tuple
+        """
+        if self._use_table(tol, key='path', **kwargs):
+            s, p = self._interpolate([kwargs[a] for a in AXES])
+            if not np.isnan(p).any():
+                t = np.linspace(0, s[0], p.shape[-1])
+                return Shot(t, p, np.full_like(p, np.nan)), self.estimate('path', **kwargs)
+
+        return self._fallback().shoot(**kwargs), 0.0
+
+    def _use_table(self, tol, key='landing', **kwargs):
+        if not self.contains(**kwargs):
+            return False
+        return self.estimate(key, **kwargs) <= tol
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo dispersion of landing points.
+
+The release parameters and the wind of a throw are drawn from
+distributions, and the throws are simulated in chunks with shoot_many,
+spread over a process pool. The landing points of each chunk are reduced
+to a LandingStatistics, with running mean and covariance and fixed bin
+histograms, which are merged as the chunks complete. The memory use is
+therefore independent of the number of throws.
+
+Every chunk draws from its own random stream, spawned from the seed, so
+that results are reproducible whatever the number of workers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import os
+import time
+import numpy as np
+
+from .environment import resolve as resolve_environment
+
+CHUNK = 2000
+N_BINS = 200
+QUANTILE_BIN = 0.05
+
+
+class LandingStatistics:
+    """
+    Streaming statistics of landing points (x, y). Statistics of separate
+    samples can be merged, giving the same result as for all samples.
+
+    :param tuple extent: Range ((x_min, x_max), (y_min, y_max)) of the histograms
+    :param int bins: Number of bins along each axis of the 2-D histogram
+    :param float quantile_bin: Bin width of the 1-D histograms used for quantiles
+    :ivar int count: Number of landing points
+    :ivar array mean: Mean landing point
+    :ivar array histogram: Counts of the 2-D histogram, with edges x_edges and y_edges
+    :ivar int outside: Landing points outside extent
+    :ivar int failed: Throws that failed to integrate
+    """
+    def __init__(self, extent, bins=N_BINS, quantile_bin=QUANTILE_BIN):
+        self.extent = tuple(tuple(float(v) for v in r) for r in extent)
+        self.bins = bins
+        self.quantile_bin = quantile_bin
+        self.count = 0
+        self.mean = np.zeros(2)
+        self._m2 = np.zeros((2,2))
+        self.histogram = np.zeros((bins, bins), dtype=np.int64)
+        self.x_edges, self.y_edges = (np.linspace(lo, hi, bins + 1) for lo, hi in self.extent)
+        self._marginals = [np.zeros(int(np.ceil((hi - lo)/quantile_bin)) + 2, dtype=np.int64)
+                           for lo, hi in self.extent]
+        self.outside = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self.workers = 1
+
+    def _empty(self):
+        return LandingStatistics(self.extent, self.bins, self.quantile_bin)
+
+    def update(self, points):
+        """
+        Add landing points.
+
+        :param array points: Points of shape (n, 2), NaN rows count as failed
+        """
+        points = np.asarray(points, dtype=float)[:,0:2]
+        ok = ~np.isnan(points).any(axis=1)
+        self.failed += int((~ok).sum())
+        points = points[ok]
+        if len(points) == 0:
+            return
+
+        other = self._empty()
+        other.count = len(points)
+        other.mean = points.mean(axis=0)
+        d = points - other.mean
+        other._m2 = d.T @ d
+        h, _, _ = np.histogram2d(points[:,0], points[:,1], bins=(self.x_edges, self.y_edges))
+        other.histogram = h.astype(np.int64)
+        other.outside = len(points) - int(h.sum())
+        for k, ((lo, hi), m) in enumerate(zip(self.extent, other._marginals)):
+            # Values below and above the extent go to the first and last bin
+            i = np.clip(np.floor((points[:,k] - lo)/self.quantile_bin).astype(int) + 1,
+                        0, len(m) - 1)
+            m += np.bincount(i, minlength=len(m))
+        self.merge(other)
+
+    def merge(self, other):
+        """
+        Add the statistics of other samples, with the same extent and bins.
+
+        :param LandingStatistics other: Statistics to add
+        """
+        n = self.count + other.count
+        if other.count > 0:
+            delta = other.mean - self.mean
+            self._m2 += other._m2 + np.outer(delta, delta)*self.count*other.count/n
+            self.mean = self.mean + delta*other.count/n
+        self.count = n
+        self.histogram += other.histogram
+        for m, mo in zip(self._marginals, other._marginals):
+            m += mo
+        self.outside += other.outside
+        self.failed += other.failed
+
+    @property
+    def covariance(self):
+        """
+        Sample covariance of the landing points
+
+        :rtype: array
+        """
+        return self._m2/max(self.count - 1, 1)
+
+    def quantiles(self, q):
+        """
+        Quantiles of x and y, accurate to the quantile bin width.
+        Points beyond the extent are placed at its ends.
+
+        :param q: Probabilities, scalar or array
+        :return: Quantiles of x and y, with shape (2,) + shape of q
+        :rtype: array
+        """
+        q = np.asarray(q, dtype=float)
+        result = []
+        for (lo, hi), m in zip(self.extent, self._marginals):
+            cdf = np.cumsum(m)/max(self.count, 1)
+            i = np.minimum(np.searchsorted(cdf, q, side='left'), len(m) - 1)
+            # Interpolate linearly within the bin
+            below = np.where(i > 0, cdf[i - 1], 0.0)
+            inside = np.where(cdf[i] > below, (q - below)/np.maximum(cdf[i] - below, 1e-300), 0.5)
+            result.append(np.clip(lo + (i - 1 + inside)*self.quantile_bin, lo, hi))
+        return np.array(result)
+
+    def density(self):
+        """
+        Probability density of the landing point, per square meter
+
+        :rtype: array
+        """
+        area = np.outer(np.diff(self.x_edges), np.diff(self.y_edges))
+        return self.histogram/(max(self.count, 1)*area)
+
+    @property
+    def throughput(self):
+        """
+        Throws per second per worker process
+        """
+        return (self.count + self.failed)/(self.elapsed*self.workers) if self.elapsed else np.nan
+
+    def __repr__(self):
+        return ('LandingStatistics(count=%d, mean=(%.2f, %.2f), std=(%.2f, %.2f))'
+                % ((self.count,) + tuple(self.mean) + tuple(np.sqrt(np.diag(self.covariance)))))
+
+
+def sample_params(release, n, rng, wind_speed=0.0, wind_direction=0.0):
+    """
+    Draw keywords for shoot_many.
+
+    :param dict release: Release keywords of DiscGolfDisc.shoot. Values are
+                         constants or distributions with an rvs method,
+                         such as the frozen distributions of scipy.stats
+    :param int n: Number of throws
+    :param rng: Random number generator
+    :param wind_speed: Wind speed at the reference height, constant or
+                       distribution, None to keep the wind of the environment
+    :param wind_direction: Direction the wind blows towards, degrees from the
+                           x-axis towards the y-axis, constant or distribution
+    :return: One keyword dictionary per throw
+    :rtype: list
+    """
+    def draw(value):
+        if hasattr(value, 'rvs'):
+            return value.rvs(size=n, random_state=rng)
+        return np.broadcast_to(np.asarray(value, dtype=float), (n,) + np.shape(value))
+
+    columns = {k: draw(v) for k, v in release.items()}
+    if wind_speed is not None:
+        speed = draw(wind_speed)
+        direction = np.radians(draw(wind_direction))
+        columns['wind'] = np.stack((speed*np.cos(direction), speed*np.sin(direction),
+                                    np.zeros(n)), axis=-1)
+    return [{k: c[i] for k, c in columns.items()} for i in range(n)]
+
+
+def _landing(disc, release, wind_speed, wind_direction, seed, n, solver=None, env=None):
+    # Landing points of n random throws, NaN for failed throws
+    rng = np.random.default_rng(seed)
+    params = sample_params(release, n, rng, wind_speed, wind_direction)
+    shots = disc.shoot_many(params, solver=solver, environment=env)
+    landing = shots.landing
+    landing[shots.status < 0] = np.nan
+    return landing
+
+
+def _simulate(disc, release, wind_speed, wind_direction, seed, n, extent, bins, quantile_bin,
+              solver=None, env=None):
+    stats = LandingStatistics(extent, bins, quantile_bin)
+    stats.update(_landing(disc, release, wind_speed, wind_direction, seed, n, solver, env))
+    return stats
+
+
+def dispersion(disc, release, n=100000, wind_speed=0.0, wind_direction=0.0,
+               extent=None, bins=N_BINS, quantile_bin=QUANTILE_BIN,
+               chunk=CHUNK, workers=None, seed=0, solver=None, environment=None):
+    """
+    Landing statistics of throws with random release and wind, e.g.
+
+    .. code-block:: python
+
+        from scipy import stats
+        release = dict(speed=stats.norm(24, 1), omega=stats.norm(116, 5),
+                       pitch=stats.norm(15.5, 1.5), nose_angle=stats.norm(0, 1),
+                       roll_angle=stats.norm(14.7, 3), position=(0, 0, 1.3))
+        result = dispersion(DiscGolfDisc('dd2'), release, n=100000,
+                            wind_speed=stats.uniform(0, 3))
+
+    :param DiscGolfDisc disc: Disc to throw
+    :param dict release: Release keywords, constants or distributions, see sample_params
+    :param int n: Number of throws
+    :param wind_speed: Wind speed at the reference height, constant or
+                       distribution, None to keep the wind of the environment
+    :param wind_direction: Wind direction in degrees, constant or distribution
+    :param tuple extent: Extent of the histograms, from a pilot chunk if None
+    :param int bins: Bins along each axis of the 2-D histogram
+    :param float quantile_bin: Resolution of the quantiles in meters
+    :param int chunk: Throws per task
+    :param int workers: Number of processes, all cores if None. With one
+                        worker the chunks run in this process.
+    :param int seed: Seed of the random streams
+    :param Solver solver: Integration settings, as for shoot_many
+    :param Environment environment: Air and gravity, the current if None. Its
+                                    wind is replaced by the random wind, except
+                                    for a wind field, which is always used.
+    :return: Statistics of the landing points
+    :rtype: LandingStatistics
+    """
+    workers = workers or os.cpu_count()
+    env = resolve_environment(environment)
+    if env.wind_field is not None and wind_speed is not None:
+        if hasattr(wind_speed, 'rvs') or np.any(np.asarray(wind_speed) != 0):
+            raise ValueError("A random wind cannot be combined with the wind field "
+                             "of the environment, use wind_speed=None")
+        wind_speed = None
+    n_chunks = -(-n//chunk)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    sizes = [min(chunk, n - i*chunk) for i in range(n_chunks)]
+
+    t0 = time.perf_counter()
+    first = None
+    if extent is None:
+        # Cover six standard deviations around the mean of the first chunk,
+        # which is then part of the result
+        first = _landing(disc, release, wind_speed, wind_direction, seeds[0], sizes[0],
+                         solver, env)
+        ok = first[~np.isnan(first).any(axis=1), 0:2]
+        half = np.maximum(6*ok.std(axis=0, ddof=1), 1.0)
+        extent = tuple((m - h, m + h) for m, h in zip(ok.mean(axis=0), half))
+
+    result = LandingStatistics(extent, bins, quantile_bin)
+    if first is not None:
+        result.update(first)
+        seeds, sizes = seeds[1:], sizes[1:]
+    jobs = ((disc, release, wind_speed, wind_direction, s, size, extent, bins, quantile_bin,
+             solver, env) for s, size in zip(seeds, sizes))
+    if workers == 1:
+        for job in jobs:
+            result.merge(_simulate(*job))
+    else:
+        # Keep a bounded number of chunks in flight
+        with ProcessPoolExecutor(workers) as pool:
+            pending = set()
+            for job in jobs:
+                pending.add(pool.submit(_simulate, *job))
+                if len(pending) >= 2*workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        result.merge(f.result())
+            for f in pending:
+                result.merge(f.result())
+
+    result.elapsed = time.perf_counter() - t0
+    result.workers = workers
+    return result
+
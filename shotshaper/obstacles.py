@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Obstacles of a course: trees, baskets and out of bounds structures.
+
+Obstacles are vertical cylinders, e.g. trunks and basket poles,
+ellipsoids and spheres, e.g. canopies, and axis aligned boxes, made
+with the functions below and collected in an Obstacles layer:
+
+.. code-block:: python
+
+    obstacles = Obstacles([cylinder(30, 2, 0.3, 6), sphere((30, 2, 8), 3),
+                           box((60, -20, 0), (61, 20, 2))], ids=[11, 12, 40])
+    s = disc.shoot(**params, environment=Environment(obstacles=obstacles))
+    s.summary.obstacle   # 11, 12 or 40 if one was hit, else -1
+
+Each obstacle has a continuous distance like function, negative inside,
+and the clearance of a position is the smallest of these. The shot ends
+at the first root of the clearance along its dense output. Adaptive
+steps are often longer than a trunk is wide, so instead of checking the
+clearance at the ends of the steps, the path is sampled at intervals
+shorter than the thinnest obstacle, and the root is then refined within
+the first interval entering an obstacle. A path that only cuts a corner
+of an obstacle, over less than its thinnest half width, may go unnoticed.
+
+The obstacles are sorted into a uniform grid of square cells in x and
+y, so that the clearance of a position only involves the obstacles
+overlapping its cell. With the default cell size, which shrinks as the
+obstacles get denser, the cost per sample stays about the same as the
+number of obstacles grows.
+"""
+
+import hashlib
+import math
+import numpy as np
+
+CYLINDER = 0
+ELLIPSOID = 1
+BOX = 2
+
+# Largest number of cells of the index
+MAX_CELLS = 1 << 20
+# Samples per trajectory to estimate its speed, and margin on that speed
+N_SPEED = 16
+SPEED_MARGIN = 1.25
+# Samples per interval and rounds when refining a hit
+N_REFINE = 32
+N_ROUNDS = 6
+
+
+def cylinder(x, y, radius, top, bottom=0.0):
+    """
+    Vertical cylinder, e.g. a trunk or a basket pole
+
+    :param float x: Position of the axis along x
+    :param float y: Position of the axis along y
+    :param float radius: Radius
+    :param float top: Height of the top
+    :param float bottom: Height of the bottom
+    :return: Kind, center and half size of the obstacle
+    :rtype: tuple
+    """
+    return CYLINDER, (x, y, 0.5*(bottom + top)), (radius, radius, 0.5*(top - bottom))
+
+
+def ellipsoid(center, radii):
+    """
+    Axis aligned ellipsoid, e.g. a canopy
+
+    :param array center: Center
+    :param array radii: Semi axes along x, y and z
+    """
+    return ELLIPSOID, tuple(center), tuple(radii)
+
+
+def sphere(center, radius):
+    """
+    Sphere, an ellipsoid with equal semi axes
+    """
+    return ellipsoid(center, (radius, radius, radius))
+
+
+def box(lower, upper):
+    """
+    Axis aligned box, e.g. a building or a fence
+
+    :param array lower: Corner with the smallest coordinates
+    :param array upper: Corner with the largest coordinates
+    """
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    return BOX, tuple(0.5*(lower + upper)), tuple(0.5*(upper - lower))
+
+
+def _distance(kind, d, size):
+    # Distance like function of stacked offsets d from the centers, shape
+    # (3, ...), negative inside. Exact outside cylinders and boxes along
+    # the faces, and scaled by the smallest semi axis for ellipsoids.
+    if kind == CYLINDER:
+        return np.maximum(np.hypot(d[0], d[1]) - size[0], np.abs(d[2]) - size[2])
+    if kind == ELLIPSOID:
+        r = np.sqrt(((d/size)**2).sum(axis=0))
+        return (r - 1.0)*size.min(axis=0)
+    return (np.abs(d) - size).max(axis=0)
+
+
+def _distance1(kind, dx, dy, dz, sx, sy, sz):
+    # Same as _distance for a single offset
+    if kind == CYLINDER:
+        return max(math.hypot(dx, dy) - sx, abs(dz) - sz)
+    if kind == ELLIPSOID:
+        r = math.sqrt((dx/sx)**2 + (dy/sy)**2 + (dz/sz)**2)
+        return (r - 1.0)*min(sx, sy, sz)
+    return max(abs(dx) - sx, abs(dy) - sy, abs(dz) - sz)
+
+
+def _samples(j, lo, hi, n):
+    # n uniform samples between lo and hi of each trajectory j, as
+    # flat arrays of the trajectory and the time
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    s = k/np.repeat(n - 1, n)
+    lo, hi = np.broadcast_to(lo, n.shape), np.broadcast_to(hi, n.shape)
+    return np.repeat(j, n), np.repeat(lo, n) + s*np.repeat(hi - lo, n)
+
+
+class Obstacles:
+    """
+    Layer of obstacles with a uniform grid index in x and y.
+
+    :param list shapes: Obstacles made with cylinder, ellipsoid, sphere and box
+    :param array ids: Integer identifier of each obstacle, reported when
+                      it is hit, the position in shapes if None
+    :param float cell: Side of the cells of the index, by default about
+                       two obstacles per cell, but at least the typical
+                       width of an obstacle
+    :param float spacing: Largest distance between samples of a path,
+                          by default the thinnest half width of an obstacle
+    :ivar float clear: Clearance reported away from all obstacles
+    """
+    def __init__(self, shapes, ids=None, cell=None, spacing=None):
+        if len(shapes) == 0:
+            raise ValueError("At least one obstacle is needed")
+        kind, center, size = zip(*shapes)
+        self.kind = np.array(kind, dtype=np.int8)
+        self.center = np.array(center, dtype=float).reshape(-1, 3)
+        self.size = np.array(size, dtype=float).reshape(-1, 3)
+        if (self.size <= 0).any():
+            raise ValueError("Obstacles must have positive sizes")
+        self.ids = np.arange(len(shapes)) if ids is None else np.asarray(ids, dtype=np.int64)
+        if self.ids.shape != (len(shapes),):
+            raise ValueError("There must be one id per obstacle")
+        self.spacing = float(self.size.min() if spacing is None else spacing)
+        self._key = None
+        self._build(cell)
+
+    def _build(self, cell):
+        lower = self.center[:, :2] - self.size[:, :2]
+        upper = self.center[:, :2] + self.size[:, :2]
+        self.origin = lower.min(axis=0)
+        extent = upper.max(axis=0) - self.origin
+        if cell is None:
+            width = 2*np.median(self.size[:, :2].max(axis=1))
+            cell = max(width, math.sqrt(2*extent.prod()/len(self)))
+        # Keep the grid to a bounded number of cells
+        cell = max(float(cell), math.sqrt(extent.prod()/MAX_CELLS), 1e-9)
+        self.cell = cell
+        self.clear = cell
+        self.n_cells = tuple(int(n) for n in np.maximum(np.ceil(extent/cell), 1))
+
+        # Cells overlapped by the bounding box of each obstacle
+        first = np.clip(((lower - self.origin)//cell).astype(int), 0, np.array(self.n_cells) - 1)
+        last = np.clip(((upper - self.origin)//cell).astype(int), 0, np.array(self.n_cells) - 1)
+        members = [[] for _ in range(self.n_cells[0]*self.n_cells[1])]
+        for k, ((i0, j0), (i1, j1)) in enumerate(zip(first, last)):
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    members[i*self.n_cells[1] + j].append(k)
+        # Flat lists for the vectorized queries, the obstacles of cell c
+        # being _index[_start[c]:_start[c+1]]
+        self._count = np.array([len(m) for m in members], dtype=np.intp)
+        self._start = np.concatenate(([0], np.cumsum(self._count)))
+        self._index = np.array([k for m in members for k in m], dtype=np.intp)
+        self._members = [tuple(m) for m in members]
+        self._params = [(int(k), *c, *s) for k, c, s in zip(self.kind, self.center.tolist(),
+                                                             self.size.tolist())]
+
+    def __len__(self):
+        return len(self.kind)
+
+    def __repr__(self):
+        counts = np.bincount(self.kind, minlength=3)
+        return 'Obstacles(cylinders=%d, ellipsoids=%d, boxes=%d, cells=%s, cell=%g)' % (
+            tuple(counts) + (self.n_cells, self.cell))
+
+    @property
+    def key(self):
+        """
+        Content hash of the obstacles and the spacing, computed once
+        """
+        if self._key is None:
+            h = hashlib.sha1()
+            for a in (self.kind, self.center, self.size, self.ids, np.float64(self.spacing)):
+                h.update(np.ascontiguousarray(a).tobytes())
+            self._key = h.hexdigest()
+        return self._key
+
+    def _cell(self, x, y):
+        # Index of the cell containing a point, -1 outside the grid
+        i = math.floor((x - self.origin[0])/self.cell)
+        j = math.floor((y - self.origin[1])/self.cell)
+        if 0 <= i < self.n_cells[0] and 0 <= j < self.n_cells[1]:
+            return i*self.n_cells[1] + j
+        return -1
+
+    def clearance(self, x):
+        """
+        Smallest distance like value of the obstacles near the
+        position(s) x, negative inside an obstacle and at most clear
+
+        :param array x: Position (3,), or stacked positions (n, N) with
+                        the position in the first three rows
+        :return: Clearance, scalar or shape (N,)
+        """
+        if np.ndim(x) == 1:
+            px, py, pz = float(x[0]), float(x[1]), float(x[2])
+            c = self._cell(px, py)
+            value = self.clear
+            if c >= 0:
+                for k in self._members[c]:
+                    kind, cx, cy, cz, sx, sy, sz = self._params[k]
+                    value = min(value, _distance1(kind, px - cx, py - cy, pz - cz, sx, sy, sz))
+            return value
+
+        value = np.full(np.shape(x)[1], self.clear)
+        p, k, first = self._pairs(x)
+        if len(k):
+            v = np.minimum.reduceat(self._distances(x, p, k), first)
+            value[p[first]] = np.minimum(v, self.clear)
+        return value
+
+    def _pairs(self, x):
+        # Each position with each obstacle of its cell, as the position
+        # indices p, sorted, and the obstacle indices k, and the first
+        # pair of each position with obstacles
+        i = np.floor((x[0] - self.origin[0])/self.cell).astype(np.intp)
+        j = np.floor((x[1] - self.origin[1])/self.cell).astype(np.intp)
+        inside = (i >= 0) & (i < self.n_cells[0]) & (j >= 0) & (j < self.n_cells[1])
+        c = np.where(inside, i*self.n_cells[1] + j, 0)
+        count = np.where(inside, self._count[c], 0)
+        end = np.cumsum(count)
+        p = np.repeat(np.arange(len(c)), count)
+        k = self._index[np.arange(end[-1] if len(end) else 0)
+                        - np.repeat(end - count - self._start[c], count)]
+        first = (end - count)[count > 0]
+        return p, k, first
+
+    def _distances(self, x, p, k):
+        # Distances of the positions p to the obstacles k
+        d = x[0:3, p] - self.center[k].T
+        size = self.size[k].T
+        kind = self.kind[k]
+        kinds = np.unique(kind)
+        if len(kinds) == 1:
+            return _distance(kinds[0], d, size)
+        values = np.empty(len(k))
+        for kd in kinds:
+            mask = kind == kd
+            values[mask] = _distance(kd, d[:, mask], size[:, mask])
+        return values
+
+    def locate(self, x):
+        """
+        Identifier of the obstacle nearest to the position(s) x among
+        those around it, e.g. the one hit at the end of a shot, or -1
+        if there is none
+
+        :param array x: Position (3,), or stacked positions (n, N)
+        :return: Identifier, scalar or shape (N,)
+        """
+        single = np.ndim(x) == 1
+        x = np.asarray(x, dtype=float).reshape(len(x), -1)
+        ids = np.full(x.shape[1], -1)
+        p, k, first = self._pairs(x)
+        if len(k):
+            values = self._distances(x, p, k)
+            # Pairs by position, nearest obstacle first
+            order = np.lexsort((values, p))
+            p, k, values = p[order], k[order], values[order]
+            found = values[first] < self.clear
+            ids[p[first[found]]] = self.ids[k[first[found]]]
+        return int(ids[0]) if single else ids
+
+    def first_hit(self, solution, t_end):
+        """
+        First entry of each trajectory into an obstacle, along the dense
+        output of the integration
+
+        :param callable solution: States solution(j, t) of the trajectories
+                                  j at the times t, both of shape (m,),
+                                  with the position and the velocity in
+                                  the first six rows, e.g. BatchSolution.at
+        :param array t_end: Final time of each trajectory
+        :return: Time of the hit of each trajectory, t_end if none, and
+                 the identifier of the obstacle hit, -1 if none
+        :rtype: tuple
+        """
+        t_end = np.asarray(t_end, dtype=float)
+        N = len(t_end)
+        # Sample times, with at most spacing between samples at the
+        # largest speed of each trajectory
+        j, t = _samples(np.arange(N), 0.0, t_end, np.full(N, N_SPEED))
+        u = solution(j, t)[3:6]
+        v = SPEED_MARGIN*np.maximum.reduceat(np.sqrt((u**2).sum(axis=0)), np.arange(0, len(j), N_SPEED))
+        n = np.ceil(t_end*v/self.spacing).astype(int) + 2
+        lo, hi, hit = self._entry(solution, *_samples(np.arange(N), 0.0, t_end, n), n)
+
+        t_hit = t_end.copy()
+        ids = np.full(N, -1)
+        hits = np.flatnonzero(hit)
+        if not len(hits):
+            return t_hit, ids
+
+        # Shrink the interval entering the obstacle, for all hits at once
+        lo, hi = lo[hits], hi[hits]
+        n = np.full(len(hits), N_REFINE)
+        for _ in range(N_ROUNDS):
+            lo, hi, _ = self._entry(solution, *_samples(hits, lo, hi, n), n)
+
+        t_hit[hits] = hi
+        ids[hits] = self.locate(solution(hits, hi))
+        return t_hit, ids
+
+    def _entry(self, solution, j, t, n):
+        # First sample inside an obstacle of each trajectory, sampled at
+        # the times t, n per trajectory, and the sample before it
+        inside = self.clearance(solution(j, t)) <= 0
+        start = np.cumsum(n) - n
+        # Index of the first sample inside, or the last sample if none
+        first = np.minimum.reduceat(np.where(inside, np.arange(len(t)), len(t)), start)
+        hit = first < len(t)
+        first = np.where(hit, first, start + n - 1)
+        return t[np.maximum(first - 1, start)], t[first], hit
+
+    def save(self, path):
+        """
+        Save the obstacles to a .npz file
+
+        :param string path: File name
+        """
+        np.savez(path, kind=self.kind, center=self.center, size=self.size,
+                 ids=self.ids, cell=self.cell, spacing=self.spacing)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load obstacles saved with save
+
+        :param string path: File name
+        :rtype: Obstacles
+        """
+        with np.load(path) as f:
+            shapes = list(zip(f['kind'], f['center'], f['size']))
+            return cls(shapes, f['ids'], float(f['cell']), float(f['spacing']))
+
+    def __reduce__(self):
+        return (Obstacles, (list(zip(self.kind.tolist(), self.center.tolist(), self.size.tolist())),
+                            self.ids, self.cell, self.spacing))
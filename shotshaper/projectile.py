@@ -13,62 +13,317 @@ TODO:
 
 from abc import ABC, abstractmethod
 from scipy.integrate import solve_ivp
-from scipy.interpolate import interp1d
 from .transforms import T_12, T_23, T_34, T_14, T_41, T_31
+from .integrate import solve_batch, solve_fixed, Solver, N_STEP
+from .kernels import get_disc_rhs
+from .batch import ShotBatch, TIME
+from .summary import FlightSummary, flight_events
+from .simplify import simplify
+from . import catalog
 import matplotlib.pyplot as pl
-from numpy import exp,matmul,pi,sqrt,arctan2,radians,degrees,sin,cos,array,concatenate,linspace,zeros_like,cross,zeros,argmin
+from numpy import exp,matmul,pi,sqrt,arctan2,radians,degrees,sin,cos,array,asarray,concatenate,linspace,zeros_like,cross,zeros,argmin,moveaxis,broadcast_to,where,errstate,eye,outer,dot,shape,select
 from numpy.linalg import norm
 from . import environment
-import os
-import yaml
-
-T_END = 60
-N_STEP = 200
+from .environment import resolve as resolve_environment, use as _use_environment
 
 def hit_ground(t, y, *args): 
-    return y[2]
+    # Height above the ground of the active environment
+    return environment.current().height(y)
 
 def stopped(t, y, *args):
-    U = norm(y[3:6])
+    U = norm(y[3:6], axis=0)
     return U - 1e-4
 
+hit_ground.terminal = True
+hit_ground.direction = -1
+stopped.terminal = True
+stopped.direction = -1
+
+def _as_kwargs(params):
+    """
+    Convert shoot_many parameters to a list of keyword dictionaries.
+    A structured array gives one dictionary per row.
+    """
+    names = getattr(getattr(params, 'dtype', None), 'names', None)
+    if names is not None:
+        return [{k: row[k] for k in names} for row in params]
+    return list(params)
+
 class Shot:
+    """
+    Result of a shot, with time, position, velocity and, for projectiles
+    with an orientation, attitude sampled at the same times.
+
+    Shots returned by shoot keep the dense output of the integration,
+    and only evaluate the samples when they are first accessed. The
+    dense output also gives the state at any time through at, and
+    other samplings through resample and slicing, and simplify keeps
+    only the samples needed to follow the path within a tolerance. The
+    attribute summary holds the FlightSummary of the shot, located
+    exactly by events during the integration.
+    """
     def __init__(self,t,x,v,att=None):
-        self.time = t
-        self.position = x
-        self.velocity = v
-        if att is not None:
-            self.attitude = att
-        
+        self._time = t
+        self._position = x
+        self._velocity = v
+        self._attitude = att
+        self.solution = None
+        self.t_end = t[-1]
+        self.summary = None
+    
+    @classmethod
+    def from_solution(cls, solution, t_end, n=N_STEP, t=None):
+        """
+        Create a shot evaluated lazily from a dense solution.
+
+        :param callable solution: Dense output, returning the states at given times
+        :param float t_end: Final time
+        :param int n: Number of uniformly spaced samples
+        :param array t: Sample times, overrides n
+        :return: Shot
+        :rtype: Shot
+        """
+        shot = cls.__new__(cls)
+        shot._time = t
+        shot._position = None
+        shot._velocity = None
+        shot._attitude = None
+        shot._n = n
+        shot.solution = solution
+        shot.t_end = t_end
+        shot.summary = None
+        return shot
+    
+    def _evaluate(self):
+        f = self.solution(self.time)
+        self._position = f[0:3]
+        self._velocity = f[3:6]
+        if len(f) > 6:
+            self._attitude = f[6:9]
+        else:
+            self._attitude = False
+    
+    @property
+    def time(self):
+        if self._time is None:
+            self._time = linspace(0,self.t_end,self._n)
+        return self._time
+    
+    @property
+    def position(self):
+        if self._position is None:
+            self._evaluate()
+        return self._position
+    
+    @property
+    def velocity(self):
+        if self._velocity is None:
+            self._evaluate()
+        return self._velocity
+    
+    @property
+    def attitude(self):
+        if self._attitude is None and self.solution is not None:
+            self._evaluate()
+        if self._attitude is None or self._attitude is False:
+            raise AttributeError("Shot has no attitude")
+        return self._attitude
+    
+    @property
+    def landing(self):
+        """
+        Final position, evaluated without sampling the whole shot
+        """
+        if self.solution is None:
+            return self.position[:,-1]
+        return self.solution(self.t_end)[0:3]
+    
+    def __len__(self):
+        return len(self.time)
+    
+    def __getitem__(self, key):
+        """
+        Shot with a subset of the samples, e.g. shot[::10]. Only
+        the selected samples are evaluated.
+        """
+        t = self.time[key]
+        if self.solution is not None and self._position is None:
+            shot = Shot.from_solution(self.solution, self.t_end, t=t)
+        else:
+            att = self._attitude[:,key] if hasattr(self, 'attitude') else None
+            shot = Shot(t, self.position[:,key], self.velocity[:,key], att)
+            shot.solution = self.solution
+            shot.t_end = self.t_end
+        shot.summary = self.summary
+        return shot
+    
+    def at(self, t):
+        """
+        State at the time(s) t from the dense output.
+
+        :param t: Time or array of times within [0, t_end]
+        :return: State vector(s), position and velocity followed by attitude if present
+        :rtype: array
+        """
+        self._require_solution()
+        return self.solution(t)
+    
+    def resample(self, n):
+        """
+        Same shot with n uniformly spaced samples, without integrating again.
 
+        :param int n: Number of samples
+        :return: Resampled shot
+        :rtype: Shot
+        """
+        self._require_solution()
+        shot = Shot.from_solution(self.solution, self.t_end, n=n)
+        shot.summary = self.summary
+        return shot
+    
+    def simplify(self, tolerance=0.01):
+        """
+        Same shot with only the samples needed to stay within tolerance
+        of the sampled path, keeping the apex, turns and landing. See
+        simplify.simplify.
+
+        :param float tolerance: Largest distance in m of a dropped sample
+        :return: Simplified shot
+        :rtype: Shot
+        """
+        return simplify(self, tolerance)
+    
+    def _require_solution(self):
+        if self.solution is None:
+            raise ValueError("Shot has no dense output, only the stored samples are available")
+        
 class _Projectile(ABC):
     def __init__(self):
         pass
    
-    def _shoot(self, advance_function, y0, *args):
-        hit_ground.terminal = True
-        hit_ground.direction = -1
-        stopped.terminal = True
-        stopped.direction = -1
-        
-        sol = solve_ivp(advance_function,[0,T_END],y0,
-                        dense_output=True,args=args,
-                        method='RK45',
-                        events=(hit_ground,stopped))
-        
-        t = linspace(0,sol.t[-1],N_STEP)
-        
-        f = sol.sol(t)
-        pos = array([f[0],f[1],f[2]])
-        vel = array([f[3],f[4],f[5]])
-        
-        if len(f) <= 6:
-            shot = Shot(t, pos, vel)
-        else:    
-            att = array([f[6],f[7],f[8]])
-            shot = Shot(t, pos, vel, att)
+    def _shoot(self, advance_function, y0, *args, solver=None, jac=None,
+               target=None, summary_only=False, env=None):
+        """
+        Integrate a shot, tracking the events of a FlightSummary on the
+        way. With summary_only, no dense output is built and only the
+        summary is returned. The environment env is active during the
+        integration, see environment.use.
+        """
+        with _use_environment(resolve_environment(env)):
+            return self._integrate(advance_function, y0, *args, solver=solver, jac=jac,
+                                   target=target, summary_only=summary_only)
+    
+    def _integrate(self, advance_function, y0, *args, solver=None, jac=None,
+                   target=None, summary_only=False):
+        if solver is None:
+            solver = Solver()
+        obstacles = environment.current().obstacles
+        events = (hit_ground,stopped) + flight_events(target)
+        
+        if solver.fixed_step:
+            sol = solve_fixed(advance_function, solver.t_end, y0, args=args,
+                              events=events, dt=solver.dt, method=solver.method)
+            t_end = sol.t_end[0]
+            dense = lambda t: sol(0, t)
+            t_events = [te[0] for te in sol.t_events]
+            y_events = [dense(te).T for te in t_events]
+            y_end = dense(t_end)
+            t_steps = y_steps = None
+        else:
+            sol = solve_ivp(advance_function,[0,solver.t_end],y0,
+                            dense_output=not summary_only or obstacles is not None,args=args,
+                            events=events,
+                            **solver.options(jac))
+            t_end = sol.t[-1]
+            dense = sol.sol
+            t_events = sol.t_events
+            y_events = sol.y_events
+            y_end = sol.y[:,-1]
+            t_steps, y_steps = sol.t, sol.y
+        
+        obstacle = -1
+        if obstacles is not None:
+            # Cut the shot at the first obstacle hit
+            t_hit, hit = obstacles.first_hit(lambda j, t: dense(t), [t_end])
+            if hit[0] >= 0:
+                t_end, obstacle = t_hit[0], hit[0]
+                y_end = dense(t_end)
+                y_events = [y[:len(t[t <= t_end])] for t, y in zip(t_events, y_events)]
+                t_events = [t[t <= t_end] for t in t_events]
+        
+        summary = FlightSummary.from_events(y0, t_end, y_end, t_events[2:], y_events[2:],
+                                            landed=len(t_events[0]) > 0,
+                                            t_steps=t_steps, y_steps=y_steps)
+        summary.obstacle = obstacle
+        if summary_only:
+            return summary
+        
+        shot = Shot.from_solution(dense, t_end, n=solver.n_step)
+        shot.summary = summary
         
         return shot
+    
+    def _shoot_options(self, kwargs):
+        # Keywords of shoot handled by _shoot
+        return dict(solver=kwargs.get('solver'), target=kwargs.get('target'),
+                    summary_only=kwargs.get('summary_only', False),
+                    env=kwargs.get('environment'))
+    
+    def summarize(self, **kwargs):
+        """
+        Flight summary of a shot, without building the dense output.
+        Takes the same keywords as shoot.
+
+        :rtype: FlightSummary
+        """
+        return self.shoot(summary_only=True, **kwargs)
+    
+    def _shoot_many(self, advance_function, y0, *args, solver=None, dtype=float, times=None,
+                    env=None):
+        """
+        Integrate many shots together. The advance function must accept
+        states of shape (n, N), and each extra argument must have N as
+        its last dimension. Supports the RK45 method and the fixed
+        step methods. The shots are sampled uniformly, or at the given
+        times, see BatchSolution.evaluate.
+        """
+        if solver is None:
+            solver = Solver()
+        
+        env = resolve_environment(env)
+        with _use_environment(env):
+            if solver.fixed_step:
+                sol = solve_fixed(advance_function, solver.t_end, y0, args=args,
+                                  events=(hit_ground,stopped),
+                                  dt=solver.dt, method=solver.method)
+            elif solver.method == 'RK45':
+                sol = solve_batch(advance_function, solver.t_end, y0, args=args,
+                                  events=(hit_ground,stopped),
+                                  rtol=solver.rtol, atol=solver.atol,
+                                  max_step=solver.max_step,
+                                  first_step=solver.first_step)
+            else:
+                raise ValueError("Method %s is not supported for many shots" % solver.method)
+        
+        obstacle = None
+        if env.obstacles is not None:
+            # Cut the shots at the first obstacle hit
+            t_hit, obstacle = env.obstacles.first_hit(sol.at, sol.t_end)
+            sol.t_end = where(obstacle >= 0, t_hit, sol.t_end)
+            sol.status = where(obstacle >= 0, 1, sol.status)
+        
+        n, N = y0.shape
+        n_samples = solver.n_step if times is None else shape(times)[-1]
+        shots = ShotBatch.empty(N, n_samples, attitude=n > 6, dtype=dtype)
+        if times is None:
+            t, f = sol.sample(n_samples, out=shots.data[:,TIME+1:])
+        else:
+            t, f = sol.evaluate(times, out=shots.data[:,TIME+1:])
+        shots.data[:,TIME] = t
+        shots.status = sol.status
+        shots.obstacle = obstacle
+        
+        return shots
          
     @abstractmethod
     def advance(self,t,vec,*args):
@@ -109,19 +364,45 @@ class _Particle(_Projectile):
     def shoot(self, **kwargs):
 
         y0 = self.initialize_shot(**kwargs)
-        shot = self._shoot(self.advance, y0)
+        shot = self._shoot(self.advance, y0, jac=self.jacobian,
+                           **self._shoot_options(kwargs))
         
         return shot
+    
+    def shoot_many(self, params, solver=None, dtype=float, times=None, environment=None):
+        """
+        Shoot many projectiles at once, see DiscGolfDisc.shoot_many.
+
+        :param params: Sequence of keyword dictionaries as accepted by
+                       shoot, or a structured array with one field per keyword
+        :param Solver solver: Integration settings, RK45 or fixed step methods
+        :param dtype: Storage type of the results
+        :param array times: Sample times, for all or for each shot
+        :param Environment environment: Conditions of all shots, the current if None
+        :return: All shots, in the same order as params
+        :rtype: ShotBatch
+        """
+        params = _as_kwargs(params)
+        y0 = array([self.initialize_shot(**p) for p in params]).T
+        
+        return self._shoot_many(self.advance, y0, *self._many_args(params),
+                                solver=solver, dtype=dtype, times=times, env=environment)
+    
+    def _many_args(self, params):
+        # Per shot extra arguments to advance, stacked along the last axis
+        return ()
         
     def gravity_force(self, x=None):
+        """
+        Gravitational acceleration, for a single position or
+        stacked positions of shape (3, N).
+        """
+        g = environment.current().g
         if x is None:
-            return array((0,0,environment.g))
+            return array((0,0,g))
         else:
-            # Messy way to return g array...
-            f = zeros_like(x)
-            f[0,:] = 0
-            f[1,:] = 0
-            f[2,:] = environment.g
+            f = zeros_like(x, dtype=float)
+            f[2] = g
             return f
         
     def advance(self, t, vec, *args):
@@ -129,9 +410,24 @@ class _Particle(_Projectile):
         x = vec[0:3]
         u = vec[3:6]
         
-        f = self.gravity_force()
+        f = self.gravity_force(u)
         
         return concatenate((u,f))
+    
+    def jacobian(self, t, vec, *args):
+        """
+        Jacobian of advance with respect to vec, passed to the
+        implicit solvers, e.g. Radau and BDF.
+        """
+        J = zeros((6,6))
+        J[0:3,3:6] = eye(3)
+        J[3:6,3:6] = self.acceleration_jacobian(vec[3:6], *args)
+        
+        return J
+    
+    def acceleration_jacobian(self, u, *args):
+        # Derivative of the acceleration with respect to the velocity
+        return zeros((3,3))
         
     
 class _SphericalParticleAirResistance(_Particle):
@@ -147,19 +443,37 @@ class _SphericalParticleAirResistance(_Particle):
     
     def air_resistance_force(self, U, Cd):
         
-        f = -0.5*environment.rho*self.area*Cd*norm(U)*U/self.mass
+        f = -0.5*environment.current().rho*self.area*Cd*norm(U, axis=0)*U/self.mass
         #f = -0.5*environment.rho*self.area*Cd*Umag*U/self.mass
         
         return f
     
+    def air_resistance_jacobian(self, U, Cd, dCd):
+        """
+        Derivative of air_resistance_force with respect to the velocity U,
+        where dCd is the derivative of the drag coefficient with respect
+        to the speed.
+        """
+        Umag = norm(U)
+        if Umag == 0:
+            return zeros((3,3))
+        k = 0.5*environment.current().rho*self.area/self.mass
+        
+        return -k*((dCd*Umag + Cd)*outer(U, U)/Umag + Cd*Umag*eye(3))
+    
+    def acceleration_jacobian(self, u, *args):
+        Umag = norm(u)
+        return self.air_resistance_jacobian(u, self.drag_coefficient(Umag),
+                                            self.drag_coefficient_derivative(Umag))
+    
     def advance(self, t, vec, *args):
         x = vec[0:3]
         u = vec[3:6]
         
-        Cd = self.drag_coefficient(norm(u))
+        Cd = self.drag_coefficient(norm(u, axis=0))
         
         f = self.air_resistance_force(u, Cd) \
-          + self.gravity_force()
+          + self.gravity_force(u)
         
         return concatenate((u,f))
        
@@ -175,7 +489,8 @@ class _SphericalParticleAirResistance(_Particle):
         :rtype: float
         
         """
-        return environment.rho*velocity*self.diameter/environment.mu
+        env = environment.current()
+        return env.rho*velocity*self.diameter/env.mu
     
     def drag_coefficient(self, velocity):
         """
@@ -193,15 +508,17 @@ class _SphericalParticleAirResistance(_Particle):
             f = \\frac{B}{2}\\frac{R-r}{r\\sin\\phi}
 
 
-        :param float velocity: Velocity seen by particle
+        :param velocity: Velocity seen by particle, float or array
         :return: Drag coefficient
-        :rtype: float
+        :rtype: float or array
         """
     
-        Re = self.reynolds_number(velocity)
+        Re = asarray(self.reynolds_number(velocity), dtype=float)
         
-        if Re <= 0:
-            return 1e30
+        # No flow gives infinite drag, evaluate the fit with a
+        # dummy value there and mask it out afterwards
+        flow = Re > 0
+        Re = where(flow, Re, 1.0)
         
         tmp1 = Re/5.0
         tmp2 = Re/2.63e5
@@ -212,7 +529,33 @@ class _SphericalParticleAirResistance(_Particle):
            + 0.411*tmp2**-7.94/(1 + tmp2**-8) \
            + 0.25*tmp3/(1 + tmp3) 
            
-        return Cd
+        return where(flow, Cd, 1e30)[()]
+    
+    def drag_coefficient_derivative(self, velocity):
+        """
+        Derivative of drag_coefficient with respect to the velocity
+        
+        :param velocity: Velocity seen by particle, float or array
+        :rtype: float or array
+        """
+        Re = asarray(self.reynolds_number(velocity), dtype=float)
+        
+        # Zero without flow, as for drag_coefficient evaluated
+        # with a dummy value there
+        flow = Re > 0
+        Re = where(flow, Re, 1.0)
+        
+        tmp1 = Re/5.0
+        tmp2 = Re/2.63e5
+        tmp3 = Re/1e6
+        
+        dCd = -24.0/Re**2 \
+            + 2.6/5.0*(1 - 0.52*tmp1**1.52)/(1 + tmp1**1.52)**2 \
+            + 0.411/2.63e5*tmp2**-8.94*(-7.94 + 0.06*tmp2**-8)/(1 + tmp2**-8)**2 \
+            + 0.25/1e6/(1 + tmp3)**2
+        
+        env = environment.current()
+        return where(flow, dCd*env.rho*self.diameter/env.mu, 0.0)[()]
     
 
 class _SphericalParticleAirResistanceSpin(_SphericalParticleAirResistance):
@@ -229,24 +572,26 @@ class _SphericalParticleAirResistanceSpin(_SphericalParticleAirResistance):
         y0 = self.initialize_shot(**kwargs)
         spin = array((kwargs["spin"]))
         
-        shot = self._shoot(self.advance, y0, spin)
+        shot = self._shoot(self.advance, y0, spin, jac=self.jacobian,
+                           **self._shoot_options(kwargs))
         
         return shot        
     
+    def _many_args(self, params):
+        spin = array([array(p["spin"], dtype=float) for p in params]).T
+        return (spin,)
+    
     def spin_force(self,U,spin):
-        
-        Umag = norm(U)
-        omega = norm(spin)
+        """
+        Magnus force, for single or stacked velocities of shape (3, N)
+        with a single spin vector or one per velocity.
+        """
+        Umag = norm(U, axis=0)
+        omega = norm(spin, axis=0)
         
         Cl = self.lift_coefficient(Umag, omega)
         
-        if U.ndim == 1:
-            f = Cl*pi*self.radius**3*environment.rho*cross(spin, U)/self.mass
-        else:
-            # Messy way to return spin array for post-processing
-            f = zeros_like(U)
-            for i in range(U.shape[1]):
-                f[:,i] = Cl*pi*self.radius**3*environment.rho*cross(spin, U[:,i])/self.mass
+        f = Cl*pi*self.radius**3*environment.current().rho*cross(spin, U, axisa=0, axisb=0, axisc=0)/self.mass
         
         return f
     
@@ -254,13 +599,28 @@ class _SphericalParticleAirResistanceSpin(_SphericalParticleAirResistance):
         x = vec[0:3]
         u = vec[3:6]
         
-        Cd = self.drag_coefficient(norm(u), norm(spin))
+        Cd = self.drag_coefficient(norm(u, axis=0), norm(spin, axis=0))
         
         f = self.air_resistance_force(u, Cd) \
-          + self.gravity_force() \
+          + self.gravity_force(u) \
           + self.spin_force(u,spin)
         
         return concatenate((u,f))
+    
+    def acceleration_jacobian(self, u, spin):
+        Umag = norm(u)
+        omega = norm(spin)
+        
+        Cl = self.lift_coefficient(Umag, omega)
+        c = Cl*pi*self.radius**3*environment.current().rho/self.mass
+        # Cross product matrix, spin x u = S u
+        S = array(((0, -spin[2], spin[1]),
+                   (spin[2], 0, -spin[0]),
+                   (-spin[1], spin[0], 0)))
+        
+        return self.air_resistance_jacobian(u, self.drag_coefficient(Umag, omega),
+                                            self.drag_coefficient_derivative(Umag, omega)) \
+             + c*S
 
 
 class ShotPutBall(_SphericalParticleAirResistance):
@@ -302,13 +662,38 @@ class SoccerBall(_SphericalParticleAirResistanceSpin):
         vc = 12.19
         vs = 1.309
         
-        S = omega*self.radius/velocity;
-        if S > 0.05 and velocity > vc:
-            Cd = 0.4127*S**0.3056;
-        else:
-            Cd = 0.155 + 0.346 / (1 + exp((velocity - vc)/vs))
+        velocity = asarray(velocity, dtype=float)
+        with errstate(divide='ignore', invalid='ignore'):
+            S = omega*self.radius/velocity
+        spinning = (S > 0.05) & (velocity > vc)
+        S = where(spinning, S, 1.0)
+        Cd = where(spinning,
+                   0.4127*S**0.3056,
+                   0.155 + 0.346 / (1 + exp((velocity - vc)/vs)))
+        
+        return Cd[()]
+    
+    def drag_coefficient_derivative(self, velocity, omega):
+        """
+        Derivative of drag_coefficient with respect to the velocity,
+        for single or stacked velocities
+        """
+        vc = 12.19
+        vs = 1.309
+        
+        velocity = asarray(velocity, dtype=float)
+        moving = velocity > 0
+        velocity = where(moving, velocity, 1.0)
+        S = omega*self.radius/velocity
+        spinning = (S > 0.05) & (velocity > vc)
+        S = where(spinning, S, 1.0)
         
-        return Cd
+        e = exp((velocity - vc)/vs)
+        dCd = select((~moving, spinning),
+                     (0.0, -0.3056*0.4127*S**0.3056/velocity),
+                     -0.346*e/(vs*(1 + e)**2))
+        
+        return dCd[()]
     
     def lift_coefficient(self, Umag, omega):
         # TODO - complex dependency on Re and spin, skin texture etc
@@ -327,64 +712,27 @@ class TableTennisBall(SoccerBall):
         
         
 class DiscGolfDisc(_Projectile):
-    def __init__(self, name, mass=0.175):
-        this_dir = os.path.dirname(os.path.abspath(__file__))
-        path = os.path.join(this_dir, 'discs', name + '.yaml')
+    def __init__(self, name, mass=0.175, kind='linear'):
+        mold = catalog.get(name)
     
         self.name = name
+        self.diameter = mold.diameter
+        self.mass = mass
+        self.weight = environment.g*mass
+        self.area = pi*self.diameter**2/4.0
+        self.I_xy = mass*mold.J_xy
+        self.I_z = mass*mold.J_z
         
-        with open(path, 'r') as f:
-            data = yaml.load(f, Loader=yaml.FullLoader)
-            
-            self.diameter = data['diameter']
-            self.mass = mass
-            self.weight = environment.g*mass
-            self.area = pi*self.diameter**2/4.0
-            self.I_xy = mass*data['J_xy']
-            self.I_z = mass*data['J_z']
-            
-            a = array(data['alpha'])
-            cl = array(data['Cl'])
-            cd = array(data['Cd'])
-            cm = array(data['Cm'])
-            
-        
-        self._alpha,self._Cl,self._Cd,self._Cm = self._flip(a,cl,cd,cm)
-        kind = 'linear'
-        self.Cl_func = interp1d(self._alpha, self._Cl, kind=kind)
-        self.Cd_func = interp1d(self._alpha, self._Cd, kind=kind)
-        self.Cm_func = interp1d(self._alpha, self._Cm, kind=kind)
+        # Shared, read-only data of the mold
+        self._alpha,self._Cl,self._Cd,self._Cm = mold.alpha,mold.cl,mold.cd,mold.cm
+        self.coefficients = mold.coefficients(kind)
         
     def _flip(self,a,cl,cd,cm):
         """
         Data given from -90 deg to 90 deg.
         Expand to -180 to 180 using symmetry considerations.
         """
-        n = len(a)
-
-        idx = argmin(abs(a))
-        a2 = zeros(2*n)
-        cl2 = zeros(2*n)
-        cd2 = zeros(2*n)
-        cm2 = zeros(2*n)
-        
-        a2[idx:idx+n] = a[:]
-        cl2[idx:idx+n] = cl[:]
-        cd2[idx:idx+n] = cd[:]
-        cm2[idx:idx+n] = cm[:]
-        for i in range(idx):
-            a2[i] = -(180 + a[idx-i])
-            cl2[i] = -cl[idx-i]
-            cd2[i] =  cd[idx-i]
-            cm2[i] = -cm[idx-i]
-        
-        for i in range(idx+n,2*n):
-            a2[i] = 180 - a[idx+n-i-2]
-            cl2[i] = -cl[idx+n-i-2]
-            cd2[i] =  cd[idx+n-i-2]
-            cm2[i] = -cm[idx+n-i-2]
-        
-        return a2,cl2,cd2,cm2
+        return catalog.flip(a,cl,cd,cm)
         
     def _normalize_angle(self, alpha):
         """
@@ -406,8 +754,7 @@ class DiscGolfDisc(_Projectile):
         :rtype: float
         """
         
-        # NB! The stored data uses degrees for the angle
-        return self.Cd_func(degrees(self._normalize_angle(alpha)))
+        return self.coefficients(alpha)[0]
 
     def Cl(self, alpha): 
         """
@@ -418,8 +765,7 @@ class DiscGolfDisc(_Projectile):
         :rtype: float
         """
         
-        # NB! The stored data uses degrees for the angle
-        return self.Cl_func(degrees(self._normalize_angle(alpha)))
+        return self.coefficients(alpha)[1]
 
     def Cm(self, alpha): 
         """
@@ -430,8 +776,7 @@ class DiscGolfDisc(_Projectile):
         :rtype: float
         """
     
-        # NB! The stored data uses degrees for the angle
-        return self.Cm_func(degrees(self._normalize_angle(alpha)))
+        return self.coefficients(alpha)[2]
 
 
     def plot_coeffs(self, color='k'):
@@ -517,41 +862,135 @@ class DiscGolfDisc(_Projectile):
         return y0, omega
             
     def shoot(self, **kwargs):
-
+        """
+        Shoot the disc. See initialize_shot for the release parameters.
+        The keyword engine selects the right hand side used in the
+        integration: default uses advance, fast a fused scalar kernel
+        and numba the same kernel compiled with numba. The keyword solver
+        takes a Solver with the integration settings, the keyword
+        target a distance whose crossing is recorded in the summary, and
+        the keyword environment an Environment, the current one if not given.
+        """
         y0, omega = self.initialize_shot(**kwargs)
-               
-        shot = self._shoot(self.advance, y0, omega)
+        engine = kwargs.get('engine', 'default')
+        options = self._shoot_options(kwargs)
+        options['env'] = resolve_environment(options['env'])
+        
+        if engine == 'default':
+            shot = self._shoot(self.advance, y0, omega,
+                               jac=self.jacobian, **options)
+        else:
+            jac = lambda t, vec, *args: self.jacobian(t, vec, omega)
+            shot = self._shoot(get_disc_rhs(engine), y0, float(omega),
+                               *self._kernel_args(engine, options['env']), jac=jac, **options)
         
         return shot
     
-    def post_process(self, s, omega):
-        n = len(s.time)
-        alphas = zeros(n)
-        betas = zeros(n)
-        lifts = zeros(n)
-        drags = zeros(n)
-        moms = zeros(n)
-        rolls = zeros(n)
-        for i in range(n):
-            x = s.position[:,i]
-            u = s.velocity[:,i]
-            a = s.attitude[:,i]
-            
-            alpha, beta, Fd, Fl, M, g4 = self.forces(x, u, a, omega)
-            
-            alphas[i] = alpha
-            betas[i] = beta
-            lifts[i] = Fl
-            drags[i] = Fd
-            moms[i] = M
-            rolls[i] = -M/(omega*(self.I_xy - self.I_z))
-        
-        arc_length = norm(s.position, axis=0)
+    def _kernel_args(self, engine, env=None):
+        """
+        Model data and environment passed to the kernels in shotshaper.kernels
+        """
+        env = resolve_environment(env)
+        if env.wind_field is not None:
+            raise ValueError("The %s engine does not support wind fields, "
+                             "use the default engine" % engine)
+        if env.terrain is not None and env.wind_scale != 0.0:
+            raise ValueError("The %s engine does not support wind over terrain, "
+                             "use the default engine" % engine)
+        wind_scale = env.wind_scale
+        wx, wy, wz = (float(w) for w in env.winddir)
+        c = self.coefficients
+        if engine == 'numba':
+            tables = tuple(c.table)
+        else:
+            tables = (c.cd, c.cl, c.cm)
+        
+        return (self.mass, self.area, self.diameter, self.I_xy, self.I_z,
+                env.rho, env.g, wind_scale, env.z0, wx, wy, wz, c.step) + tables
+    
+    def shoot_many(self, params, solver=None, dtype=float, times=None, environment=None):
+        """
+        Shoot many discs at once. All throws are integrated together,
+        evaluating the right hand side for every throw in one call,
+        which is much faster than calling shoot repeatedly.
+
+        Besides the keywords of shoot, each throw may have its own wind,
+        given by the keyword wind as the wind vector at the reference
+        height. It replaces Uref*winddir of the environment, and
+        follows the same profile with height, and cannot be combined with
+        the wind field of an environment. The keyword scale gives
+        factors (drag, lift, moment) multiplying the coefficients of
+        the disc for that throw.
+
+        :param params: Sequence of keyword dictionaries as accepted by
+                       shoot, or a structured array with one field per keyword
+        :param Solver solver: Integration settings, RK45 or fixed step methods
+        :param dtype: Storage type of the results, e.g. float32 to save memory
+        :param array times: Sample times, for all or for each shot, instead
+                            of n_step uniform samples. Times after landing
+                            repeat the landing state.
+        :param Environment environment: Conditions of all throws, the current if None
+        :return: All shots, in the same order as params
+        :rtype: ShotBatch
+        """
+        env = resolve_environment(environment)
+        params = _as_kwargs(params)
+        y0, omega = zip(*[self.initialize_shot(**p) for p in params])
+        args = (array(omega),)
+        advance = self.advance_many
+        scaled = any('scale' in p for p in params)
+        winds = any('wind' in p for p in params)
+        if env.wind_field is not None:
+            if winds:
+                raise ValueError("The keyword wind cannot be used with a wind field")
+            if scaled:
+                advance = lambda t, vec, omega, scale: self.advance_many(t, vec, omega, None, scale)
+        elif scaled or winds:
+            args += (array([p.get('wind', env.wind_ref) for p in params], dtype=float).T,)
+        if scaled:
+            args += (array([p.get('scale', (1.0, 1.0, 1.0)) for p in params], dtype=float).T,)
+        
+        shots = self._shoot_many(advance, array(y0).T, *args,
+                                 solver=solver, dtype=dtype, times=times, env=env)
+        
+        return shots
+    
+    def post_process(self, s, omega, environment=None):
+        """
+        Angles, forces, moment and roll rate along a shot, evaluated for
+        all samples at once.
+
+        :param s: Shot, or a ShotBatch with stacked arrays of shape
+                  (n_shots, 3, n_samples)
+        :param omega: Spin of the shot, or of each shot in a batch
+        :param Environment environment: Conditions of the shot, the current if None
+        :return: Arc length, angle of attack (deg), side slip angle (deg),
+                 lift, drag, moment and roll rate (deg/s), with shape
+                 (n_samples,) or (n_shots, n_samples)
+        :rtype: tuple
+        """
+        pos = s.position
+        shape = pos.shape[:-2] + pos.shape[-1:]
+        
+        # Samples of all shots as columns of (3, N) arrays
+        x, u, a = (moveaxis(v, -2, 0).reshape(3, -1)
+                   for v in (pos, s.velocity, s.attitude))
+        t = broadcast_to(s.time, shape).reshape(-1)
+        omega = broadcast_to(asarray(omega, dtype=float)[..., None], shape).reshape(-1)
+        
+        with _use_environment(resolve_environment(environment)):
+            alpha, beta, Fd, Fl, M, e3x, e4 = self.forces_many(x, u, a, omega, t=t)
+        rolls = -M/(omega*(self.I_xy - self.I_z))
+        
+        alphas, betas, lifts, drags, moms, rolls = (v.reshape(shape) for v in
+                                                    (alpha, beta, Fl, Fd, M, rolls))
+        arc_length = norm(pos, axis=-2)
         return arc_length,degrees(alphas),degrees(betas),lifts,drags,moms,degrees(rolls)
             
-    def forces(self, x, u, a, omega):
+    def forces(self, x, u, a, omega, t=0.0):
+        env = environment.current()
         # Velocity in body axes
-        urel = u - environment.wind_abl(x[2])
+        urel = u - env.wind(x, t)
         u2 = matmul(T_12(a), urel)
         # Side slip angle is the angle between the x and y velocity
         beta = -arctan2(u2[1], u2[0])
@@ -564,17 +1003,18 @@ class DiscGolfDisc(_Projectile):
         u4 = matmul(T_34(alpha), u3)
         
         # Convert gravitational force from Earth to Wind axes
-        g = array((0, 0, self.mass*environment.g))
+        g = array((0, 0, self.mass*env.g))
         g4 = T_14(g, a, beta, alpha)
         
         # Aerodynamic forces
-        q = 0.5*environment.rho*u4[0]**2
+        q = 0.5*env.rho*u4[0]**2
         S = self.area
         D = self.diameter
         
-        Fd = q*S*self.Cd(alpha)
-        Fl = q*S*self.Cl(alpha)
-        M  = q*S*D*self.Cm(alpha)
+        Cd, Cl, Cm = self.coefficients(alpha)
+        Fd = q*S*Cd
+        Fl = q*S*Cl
+        M  = q*S*D*Cm
         
         return alpha, beta, Fd, Fl, M, g4
         
@@ -583,7 +1023,7 @@ class DiscGolfDisc(_Projectile):
         u = vec[3:6]
         a = vec[6:9]
         
-        alpha, beta, Fd, Fl, M, g4 = self.forces(x, u, a, omega)
+        alpha, beta, Fd, Fl, M, g4 = self.forces(x, u, a, omega, t)
         
         m = self.mass
         # Calculate accelerations
@@ -600,6 +1040,152 @@ class DiscGolfDisc(_Projectile):
         angvel1 = T_31(angvel3, a, beta)
         
         return concatenate((u,acc1,angvel1)) 
+    
+    def jacobian(self, t, vec, omega):
+        """
+        Analytic Jacobian of advance with respect to vec, passed to the
+        implicit solvers, e.g. Radau and BDF.
+        
+        With the relative velocity U, its magnitude V, the Body z-axis n
+        and s = n.U, the right hand side of advance reduces to
+        
+            du/dt = k*(-Cd*V*U + Cl*V**2*e4z) + g
+            da/dt = -c*Cm*V**2*e3x
+        
+        with the unit vectors e3x = (U - s*n)/h and e4z = (V**2*n - s*U)/(h*V),
+        h**2 = V**2 - s**2, and the angle of attack alpha = -arctan2(s, h).
+        These are differentiated with respect to U and n, and then
+        chained with the derivatives of U with respect to the position and
+        velocity, and of n with respect to the attitude.
+        """
+        x = vec[0:3]
+        u = vec[3:6]
+        a = vec[6:9]
+        
+        env = environment.current()
+        U = u - env.wind(x, t)
+        n = T_12(a)[2]
+        V = norm(U)
+        s = dot(n, U)
+        h = sqrt(max(V**2 - s**2, 0.0))
+        alpha = -arctan2(s, h)
+        e3x = (U - s*n)/h
+        e4z = (V**2*n - s*U)/(h*V)
+        
+        Cd, Cl, Cm = self.coefficients(alpha)
+        dCd, dCl, dCm = self.coefficients.slopes(alpha)
+        k = 0.5*env.rho*self.area/self.mass
+        c = 0.5*env.rho*self.area*self.diameter/(omega*(self.I_xy - self.I_z))
+        
+        def differentiate(dU, dn, dV, ds, dh):
+            # Derivatives of the accelerations and angular velocities
+            # for the given derivatives of U, n, V, s and h
+            dalpha = -(h*ds - s*dh)/V**2
+            de3x = (dU - outer(n, ds) - s*dn - outer(e3x, dh))/h
+            de4z = (2*V*outer(n, dV) + V**2*dn - outer(U, ds) - s*dU
+                    - outer(e4z, V*dh + h*dV))/(h*V)
+            dacc = k*(-V*outer(U, dCd*dalpha) - Cd*outer(U, dV) - Cd*V*dU
+                      + V**2*outer(e4z, dCl*dalpha) + 2*V*Cl*outer(e4z, dV)
+                      + Cl*V**2*de4z)
+            dang = -c*(V**2*outer(e3x, dCm*dalpha) + 2*V*Cm*outer(e3x, dV)
+                       + Cm*V**2*de3x)
+            return dacc, dang
+        
+        I, O = eye(3), zeros((3,3))
+        acc_U, ang_U = differentiate(I, O, U/V, n, e3x)
+        acc_n, ang_n = differentiate(O, I, zeros(3), U, -s*U/h)
+        
+        # Derivatives of the Body z-axis with respect to the attitude,
+        # n = (-sin(theta), sin(phi)*cos(theta), cos(phi)*cos(theta))
+        cph, sph = cos(a[0]), sin(a[0])
+        cth, sth = cos(a[1]), sin(a[1])
+        n_a = array(((0, -cth, 0),
+                     (cph*cth, -sph*sth, 0),
+                     (-sph*cth, -cph*sth, 0)))
+        U_x = -env.wind_gradient(x, t)
+        
+        J = zeros((9,9))
+        J[0:3,3:6] = I
+        J[3:6,0:3] = matmul(acc_U, U_x)
+        J[3:6,3:6] = acc_U
+        J[3:6,6:9] = matmul(acc_n, n_a)
+        J[6:9,0:3] = matmul(ang_U, U_x)
+        J[6:9,3:6] = ang_U
+        J[6:9,6:9] = matmul(ang_n, n_a)
+        
+        return J
+
+    def forces_many(self, x, u, a, omega, wind=None, scale=None, t=0.0):
+        """
+        Same as forces, for stacked positions, velocities and attitudes
+        of shape (3, N), and times t of shape (N,). The transforms are
+        written out, so that the Wind axes are available as unit vectors
+        in Earth axes. The reference wind of each disc may be given as
+        wind, with shape (3, N), and factors for its drag, lift and
+        moment coefficients as scale, with shape (3, N).
+
+        :return: alpha, beta, Fd, Fl, M, each of shape (N,), and the
+                 Zero side slip x-axis and the Wind axes, each of shape (3, N)
+        :rtype: tuple
+        """
+        env = environment.current()
+        if wind is None:
+            urel = u - env.wind(x, t)
+        else:
+            urel = u - wind*env.wind_profile(env.height(x))
+        # Rows of T_12 are the Body axes in Earth axes
+        b = T_12(a)
+        u2 = (b*urel).sum(axis=1)
+        beta = -arctan2(u2[1], u2[0])
+        cb, sb = cos(beta), sin(beta)
+        # Rotate to the Zero side slip axes, where the y-velocity vanishes
+        e3x = cb*b[0] - sb*b[1]
+        e3y = sb*b[0] + cb*b[1]
+        u3 = cb*u2[0] - sb*u2[1]
+        alpha = -arctan2(u2[2], u3)
+        ca, sa = cos(alpha), sin(alpha)
+        # and further to the Wind axes
+        e4x = ca*e3x - sa*b[2]
+        e4z = sa*e3x + ca*b[2]
+        u4 = ca*u3 - sa*u2[2]
+        
+        q = 0.5*env.rho*u4**2
+        S = self.area
+        D = self.diameter
+        
+        Cd, Cl, Cm = self.coefficients(alpha)
+        if scale is not None:
+            Cd, Cl, Cm = Cd*scale[0], Cl*scale[1], Cm*scale[2]
+        Fd = q*S*Cd
+        Fl = q*S*Cl
+        M  = q*S*D*Cm
+        
+        return alpha, beta, Fd, Fl, M, e3x, (e4x, e3y, e4z)
+    
+    def advance_many(self, t, vec, omega, wind=None, scale=None):
+        """
+        Right hand side for many discs at once, with vec of shape (9, N),
+        omega of shape (N,) and optionally the reference wind and the
+        coefficient factors, both of shape (3, N).
+        """
+        x = vec[0:3]
+        u = vec[3:6]
+        a = vec[6:9]
+        
+        alpha, beta, Fd, Fl, M, e3x, (e4x, e4y, e4z) = self.forces_many(x, u, a, omega, wind, scale, t)
+        
+        # Gravity only has a z-component in Earth axes
+        mg = self.mass*environment.current().g
+        
+        m = self.mass
+        dudt = (-Fd + mg*e4x[2])/m
+        dvdt =        mg*e4y[2]/m
+        dwdt = ( Fl + mg*e4z[2])/m
+        acc1 = dudt*e4x + dvdt*e4y + dwdt*e4z
+        dphidt = -M/(omega*(self.I_xy - self.I_z))
+        angvel1 = dphidt*e3x
+        
+        return concatenate((u,acc1,angvel1))
 
     
     
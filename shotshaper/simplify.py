@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Simplification of trajectories.
+
+Uniform sampling in time spends most of the points of a shot on the
+nearly straight start of the flight, and few on the fade at the end.
+The Ramer-Douglas-Peucker algorithm below keeps only the samples needed
+to stay within a distance tolerance of the sampled path, so that every
+sample lies within the tolerance of the segment between the kept
+samples around it. Instead of recursing on one segment at a time, all
+segments are split together at each pass, so that a pass is a few
+array operations over the samples and the number of passes grows with
+the depth of the splitting, about log2 of the number of kept points.
+
+The apex, the lateral turning points and the landing of a shot are
+always kept. With the dense output of the integration, the exact
+event times of the summary are added to the samples first, so that the
+simplified shot passes through the extrema located by the integrator.
+"""
+
+import numpy as np
+
+
+def rdp_indices(points, tolerance, keep=None):
+    """
+    Indices of the points kept by the Ramer-Douglas-Peucker algorithm.
+    The first and last points are always kept.
+
+    :param array points: Points, shape (N, d)
+    :param float tolerance: Largest distance of a dropped point from the
+                            segment between the kept points around it
+    :param array keep: Indices or boolean mask of points to keep, optional
+    :return: Sorted indices of the kept points
+    :rtype: array
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    if n <= 2:
+        return np.arange(n)
+    kept = np.zeros(n, dtype=bool)
+    kept[[0, -1]] = True
+    if keep is not None:
+        kept[keep] = True
+
+    index = np.arange(n)
+    while True:
+        # Segment of each point, between the kept points before and after
+        start = np.flatnonzero(kept)
+        segment = np.cumsum(kept) - 1
+        segment[-1] = len(start) - 2
+        a = start[segment]
+        b = start[segment + 1]
+
+        chord = points[b] - points[a]
+        offset = points - points[a]
+        length2 = np.einsum('ij,ij->i', chord, chord)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            s = np.clip(np.einsum('ij,ij->i', offset, chord)/length2, 0, 1)
+        s[length2 == 0] = 0
+        distance = np.linalg.norm(offset - s[:, None]*chord, axis=1)
+        distance[kept] = 0
+
+        # Split each segment at its farthest point, if beyond the tolerance
+        worst = np.maximum.reduceat(distance, start[:-1])
+        split = (distance > tolerance) & (distance == worst[segment])
+        if not split.any():
+            return start
+        # Only the first of equally distant points splits its segment
+        _, first = np.unique(segment[split], return_index=True)
+        kept[index[split][first]] = True
+
+
+def _turns(x):
+    # Interior samples where x changes direction
+    dx = np.diff(x)
+    return np.flatnonzero(dx[:-1]*dx[1:] < 0) + 1
+
+
+def simplify(shot, tolerance=0.01):
+    """
+    Shot with the fewest samples that stay within a distance of its
+    sampled path, keeping the release, apex, lateral turning points and
+    landing.
+
+    :param Shot shot: Shot to simplify
+    :param float tolerance: Largest distance in m of a dropped sample from
+                            the simplified path
+    :return: Shot with a subset of the samples, plus the exact event
+             times when the shot has dense output and a summary
+    :rtype: Shot
+    """
+    t = shot.time
+    x, v = shot.position, shot.velocity
+    try:
+        att = shot.attitude
+    except AttributeError:
+        att = None
+
+    summary = shot.summary
+    if summary is not None and shot.solution is not None:
+        events = np.append(summary.apex_time, summary.turns['t'])
+        events = np.sort(events[(events > t[0]) & (events < t[-1])])
+        if len(events):
+            state = shot.solution(events)
+            k = np.searchsorted(t, events)
+            t = np.insert(t, k, events)
+            x = np.insert(x, k, state[0:3], axis=1)
+            v = np.insert(v, k, state[3:6], axis=1)
+            if att is not None:
+                att = np.insert(att, k, state[6:9], axis=1)
+            keep = k + np.arange(len(k))
+        else:
+            keep = []
+    else:
+        # Extrema from the samples
+        keep = np.append(np.argmax(x[2]), _turns(x[1]))
+
+    i = rdp_indices(x.T, tolerance, keep)
+    reduced = shot.__class__(t[i], x[:, i], v[:, i], None if att is None else att[:, i])
+    reduced.solution = shot.solution
+    reduced.t_end = shot.t_end
+    reduced.summary = summary
+    return reduced
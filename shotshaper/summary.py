@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Flight events and summaries.
+
+The events below are tracked during the integration of a shot, so that
+the apex, the lateral turning points and the landing are located by the
+root finding of the integrator instead of being read off the samples.
+"""
+
+import numpy as np
+
+# Keys of FlightSummary.as_dict, also the summary quantities of lookup tables
+SUMMARY = ('flight_time', 'distance', 'drift', 'max_height', 'min_drift', 'max_drift')
+
+# Events up to this time are attributed to the release
+RELEASE_TIME = 1e-9
+
+TURN_DTYPE = np.dtype([('t', float), ('position', float, 3), ('kind', np.int8)])
+
+
+def apex(t, y, *args):
+    # Vertical velocity changing from up to down
+    return y[5]
+
+def lateral_max(t, y, *args):
+    # Lateral velocity changing from positive to negative y
+    return y[4]
+
+def lateral_min(t, y, *args):
+    # Lateral velocity changing from negative to positive y
+    return y[4]
+
+apex.terminal = False
+apex.direction = -1
+lateral_max.terminal = False
+lateral_max.direction = -1
+lateral_min.terminal = False
+lateral_min.direction = 1
+
+
+def target_crossing(distance):
+    """
+    Event for the shot passing a horizontal distance from the origin
+
+    :param float distance: Distance to the target
+    :return: Event function
+    :rtype: callable
+    """
+    def target(t, y, *args):
+        return np.hypot(y[0], y[1]) - distance
+    target.terminal = False
+    target.direction = 1
+    return target
+
+
+class FlightSummary:
+    """
+    Exact flight metrics of a shot. Positions are (x, y, z) arrays, and
+    quantities of events that did not occur are NaN.
+
+    :ivar array release: Initial position
+    :ivar array landing: Final position
+    :ivar float flight_time: Final time
+    :ivar bool landed: Whether the shot ended on the ground
+    :ivar float apex_time: Time of the highest point
+    :ivar array apex: Highest point, NaN if the shot never rises
+    :ivar array turns: Lateral turning points, with fields t, position and
+                       kind, which is 1 at a maximum and -1 at a minimum of y
+    :ivar float target_time: Time the target distance was passed
+    :ivar array target: Position where the target distance was passed
+    :ivar int obstacle: Identifier of the obstacle that ended the shot, -1 if none
+    """
+    def __init__(self, release, landing, flight_time, landed=False,
+                 apex_time=np.nan, apex=None, turns=None,
+                 target_time=np.nan, target=None, obstacle=-1):
+        nan3 = np.full(3, np.nan)
+        self.release = np.asarray(release, dtype=float)
+        self.landing = np.asarray(landing, dtype=float)
+        self.flight_time = float(flight_time)
+        self.landed = bool(landed)
+        self.apex_time = float(apex_time)
+        self.apex = nan3 if apex is None else np.asarray(apex, dtype=float)
+        self.turns = np.zeros(0, dtype=TURN_DTYPE) if turns is None else turns
+        self.target_time = float(target_time)
+        self.target = nan3 if target is None else np.asarray(target, dtype=float)
+        self.obstacle = int(obstacle)
+
+    @classmethod
+    def from_events(cls, y0, t_end, y_end, t_events, y_events, landed,
+                    t_steps=None, y_steps=None):
+        """
+        Summary from the events of flight_events, as returned by solve_ivp.
+
+        :param array y0: Initial state
+        :param float t_end: Final time
+        :param array y_end: Final state
+        :param list t_events: Times of each event
+        :param list y_events: States at each event
+        :param bool landed: Whether the ground was hit
+        :param array t_steps: Times of the integration steps, optional
+        :param array y_steps: States at the steps, shape (n, len(t_steps)), optional
+        :rtype: FlightSummary
+        """
+        summary = cls(y0[0:3], y_end[0:3], t_end, landed)
+
+        t, y = t_events[0], y_events[0]
+        if len(t):
+            k = np.argmax(y[:,2])
+            summary.apex_time = float(t[k])
+            summary.apex = np.array(y[k,0:3])
+
+        turns = [np.zeros(len(t_events[i]), dtype=TURN_DTYPE) for i in (1, 2)]
+        for turn, i, kind in zip(turns, (1, 2), (1, -1)):
+            turn['t'] = t_events[i]
+            turn['position'] = np.reshape(y_events[i], (-1, len(y0)))[:,0:3]
+            turn['kind'] = kind
+        turns = np.concatenate(turns)
+        # The lateral velocity usually starts at zero, which is not a turn
+        turns = turns[turns['t'] > RELEASE_TIME]
+        if t_steps is not None and len(turns):
+            # solve_ivp reports a root of a lateral velocity that stays at
+            # zero, e.g. without sidespin, at every step. Such turns have
+            # no lateral speed at the steps on either side.
+            before = np.maximum(np.searchsorted(t_steps, turns['t'], 'left') - 1, 0)
+            after = np.minimum(np.searchsorted(t_steps, turns['t'], 'right'), len(t_steps) - 1)
+            turns = turns[(y_steps[4, before] != 0) | (y_steps[4, after] != 0)]
+        summary.turns = turns[np.argsort(turns['t'], kind='stable')]
+
+        if len(t_events) > 3 and len(t_events[3]):
+            summary.target_time = float(t_events[3][0])
+            summary.target = np.array(y_events[3][0][0:3])
+
+        return summary
+
+    @property
+    def distance(self):
+        return self.landing[0]
+
+    @property
+    def drift(self):
+        return self.landing[1]
+
+    @property
+    def max_height(self):
+        return np.nanmax((self.release[2], self.landing[2], self.apex[2]))
+
+    @property
+    def min_drift(self):
+        return min(self.release[1], self.landing[1], *self.turns['position'][:,1])
+
+    @property
+    def max_drift(self):
+        return max(self.release[1], self.landing[1], *self.turns['position'][:,1])
+
+    def as_dict(self):
+        """
+        Summary quantities, see SUMMARY
+
+        :rtype: dict
+        """
+        return {k: float(getattr(self, k)) for k in SUMMARY}
+
+    def to_arrays(self):
+        """
+        Arrays describing the summary, e.g. for np.savez
+
+        :rtype: dict
+        """
+        scalars = np.array((self.flight_time, self.landed, self.apex_time, self.target_time,
+                            self.obstacle))
+        return dict(summary_scalars=scalars,
+                    summary_points=np.array((self.release, self.landing, self.apex, self.target)),
+                    summary_turns=self.turns)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Inverse of to_arrays
+
+        :rtype: FlightSummary
+        """
+        flight_time, landed, apex_time, target_time, obstacle = arrays['summary_scalars']
+        release, landing, apex, target = arrays['summary_points']
+        return cls(release, landing, flight_time, landed, apex_time, apex,
+                   np.asarray(arrays['summary_turns'], dtype=TURN_DTYPE),
+                   target_time, target, obstacle)
+
+    def __repr__(self):
+        return 'FlightSummary(%s)' % ', '.join('%s=%.2f' % kv for kv in self.as_dict().items())
+
+
+def flight_events(target=None):
+    """
+    Events tracked for a FlightSummary, in the order expected by
+    FlightSummary.from_events.
+
+    :param float target: Distance for a target crossing event, optional
+    :rtype: tuple
+    """
+    events = (apex, lateral_max, lateral_min)
+    if target is not None:
+        events += (target_crossing(target),)
+    return events
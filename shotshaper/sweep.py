@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Parameter sweeps over the keywords of shoot.
+
+A design is a structured array with one field per varied keyword, made
+with cartesian or latin_hypercube. run_sweep simulates it in chunks with
+shoot_many on a process pool. The workers write their results directly
+into memory mapped .npy files in the sweep directory, so that only chunk
+indices travel between processes. Completed chunks are recorded, and
+running the same sweep again resumes with the chunks that are missing.
+
+The directory holds
+
+- design.npy: the design
+- summary.npy: flight summaries estimated from the samples, see summary.SUMMARY
+- status.npy: integration status of each throw, see integrate.BatchSolution,
+  NOT_RUN for throws of chunks not completed yet
+- shots.npy: trajectories, if requested, readable with ShotBatch.load
+- chunks.npy: completion flag of each chunk
+- meta.npz: settings the results depend on
+"""
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import os
+import numpy as np
+
+from .batch import ShotBatch
+from .cache import ShotCache
+from .environment import resolve as resolve_environment
+from .integrate import Solver
+from .projectile import _as_kwargs
+from .summary import SUMMARY
+
+CHUNK = 1024
+
+# Status of throws not simulated yet, apart from the -1 of failed throws
+NOT_RUN = -2
+
+
+def cartesian(**axes):
+    """
+    Design with all combinations of the given values, e.g.
+    cartesian(speed=np.linspace(15, 30, 16), pitch=(5, 10, 15))
+
+    :return: Design, one row per throw
+    :rtype: structured array
+    """
+    names = list(axes)
+    grids = np.meshgrid(*[np.asarray(axes[k], dtype=float) for k in names], indexing='ij')
+    design = np.empty(grids[0].size, dtype=[(k, float) for k in names])
+    for k, g in zip(names, grids):
+        design[k] = g.ravel()
+    return design
+
+
+def latin_hypercube(n, seed=0, **bounds):
+    """
+    Latin hypercube design, with each keyword stratified in n intervals
+    of its bounds, e.g. latin_hypercube(1000, speed=(15, 30), pitch=(0, 20))
+
+    :param int n: Number of throws
+    :param int seed: Seed of the random design
+    :return: Design, one row per throw
+    :rtype: structured array
+    """
+    rng = np.random.default_rng(seed)
+    design = np.empty(n, dtype=[(k, float) for k in bounds])
+    for k, (lo, hi) in bounds.items():
+        u = (rng.permutation(n) + rng.uniform(size=n))/n
+        design[k] = lo + u*(hi - lo)
+    return design
+
+
+class Sweep:
+    """
+    Results of run_sweep, memory mapped from the sweep directory.
+
+    :param string directory: Sweep directory
+    :param string mmap_mode: Mode of the memory maps
+    """
+    def __init__(self, directory, mmap_mode='r'):
+        self.directory = directory
+        path = lambda name: os.path.join(directory, name)
+        self.design = np.load(path('design.npy'), mmap_mode=mmap_mode)
+        self.summary = np.load(path('summary.npy'), mmap_mode=mmap_mode)
+        self.status = np.load(path('status.npy'), mmap_mode=mmap_mode)
+        self.chunks = np.load(path('chunks.npy'), mmap_mode=mmap_mode)
+        self.shots = None
+        if os.path.exists(path('shots.npy')):
+            self.shots = ShotBatch.load(path('shots.npy'), mmap_mode=mmap_mode)
+            self.shots.status = self.status
+
+    @property
+    def complete(self):
+        return bool(self.chunks.all())
+
+    def __len__(self):
+        return len(self.design)
+
+
+def _meta(projectile, fixed, env, chunk, solver, trajectories, dtype):
+    # Settings that must match when resuming, with the projectile, the
+    # environment and the fixed keywords identified by their cache key
+    meta = dict(key=ShotCache().key(projectile, environment=env, **fixed), chunk=chunk,
+                trajectories=trajectories, dtype=np.dtype(dtype).str)
+    # Every field of the solver, as the repr leaves some out. None is
+    # stored as a string, since np.savez would need to pickle it.
+    for k, v in vars(solver).items():
+        meta['solver_' + k] = 'None' if v is None else v
+    return meta
+
+
+def _create(directory, design, meta, attitude, n_samples):
+    path = lambda name: os.path.join(directory, name)
+    n_chunks = -(-len(design)//meta['chunk'])
+    np.save(path('design.npy'), design)
+    summary = np.lib.format.open_memmap(path('summary.npy'), 'w+', float, (len(design), len(SUMMARY)))
+    summary[:] = np.nan
+    np.save(path('status.npy'), np.full(len(design), NOT_RUN, dtype=np.int8))
+    if meta['trajectories']:
+        shots = np.lib.format.open_memmap(path('shots.npy'), 'w+', meta['dtype'],
+                                          (len(design), 10 if attitude else 7, n_samples))
+        shots[:] = np.nan
+        shots.flush()
+        del shots
+    summary.flush()
+    del summary
+    np.savez(path('meta.npz'), **meta)
+    # Written last, a directory without it is recreated
+    np.save(path('chunks.npy'), np.zeros(n_chunks, dtype=np.uint8))
+
+
+def _resume(directory, design, meta):
+    path = lambda name: os.path.join(directory, name)
+    try:
+        with np.load(path('meta.npz')) as f:
+            old = {k: f[k].item() for k in f.files}
+        old_design = np.load(path('design.npy'), mmap_mode='r')
+        np.load(path('chunks.npy'), mmap_mode='r')
+    except (OSError, ValueError):
+        return False
+    if old != meta or old_design.dtype != design.dtype or not np.array_equal(old_design, design):
+        raise ValueError("The sweep in %s has another design or other settings, "
+                         "use a new directory" % directory)
+    return True
+
+
+def _run_chunk(projectile, directory, start, stop, fixed, env, solver, trajectories):
+    path = lambda name: os.path.join(directory, name)
+    design = np.load(path('design.npy'), mmap_mode='r')
+    params = [dict(fixed, **p) for p in _as_kwargs(design[start:stop])]
+    shots = projectile.shoot_many(params, solver=solver, environment=env)
+
+    summary = np.load(path('summary.npy'), mmap_mode='r+')
+    summary[start:stop] = shots.summary()
+    summary.flush()
+    status = np.load(path('status.npy'), mmap_mode='r+')
+    status[start:stop] = shots.status
+    status.flush()
+    if trajectories:
+        data = np.load(path('shots.npy'), mmap_mode='r+')
+        data[start:stop] = shots.data
+        data.flush()
+
+
+def run_sweep(projectile, design, directory, fixed=None, chunk=CHUNK, workers=None,
+              solver=None, trajectories=False, dtype=np.float32, environment=None):
+    """
+    Simulate a design, resuming an interrupted sweep in the same directory.
+
+    :param projectile: Projectile with a shoot_many method, e.g. DiscGolfDisc
+    :param design: Structured array with one field per varied keyword
+    :param string directory: Directory of the results
+    :param dict fixed: Keywords shared by all throws, e.g. position
+    :param int chunk: Throws per task
+    :param int workers: Number of processes, all cores if None. With one
+                        worker the chunks run in this process.
+    :param Solver solver: Integration settings, as for shoot_many
+    :param bool trajectories: Whether to store the sampled trajectories
+    :param dtype: Storage type of the trajectories
+    :param Environment environment: Conditions of all throws, the current if None
+    :return: Results
+    :rtype: Sweep
+    """
+    fixed = dict(fixed or {})
+    solver = solver or Solver()
+    workers = workers or os.cpu_count()
+    env = resolve_environment(environment)
+    meta = _meta(projectile, fixed, env, chunk, solver, trajectories, dtype)
+    os.makedirs(directory, exist_ok=True)
+
+    if not _resume(directory, design, meta):
+        y0 = projectile.initialize_shot(**dict(fixed, **_as_kwargs(design[:1])[0]))
+        if isinstance(y0, tuple):
+            y0 = y0[0]
+        _create(directory, design, meta, len(y0) > 6, solver.n_step)
+
+    chunks = np.load(os.path.join(directory, 'chunks.npy'), mmap_mode='r+')
+    todo = np.flatnonzero(chunks == 0)
+    jobs = ((k, (projectile, directory, k*chunk, min((k + 1)*chunk, len(design)),
+                 fixed, env, solver, trajectories)) for k in todo)
+
+    def finished(k):
+        chunks[k] = 1
+        chunks.flush()
+
+    if workers == 1:
+        for k, job in jobs:
+            _run_chunk(*job)
+            finished(k)
+    else:
+        # Keep a bounded number of chunks in flight
+        with ProcessPoolExecutor(workers) as pool:
+            pending = {}
+            for k, job in jobs:
+                pending[pool.submit(_run_chunk, *job)] = k
+                if len(pending) >= 2*workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        f.result()
+                        finished(pending.pop(f))
+            for f in list(pending):
+                f.result()
+                finished(pending.pop(f))
+
+    del chunks
+    return Sweep(directory)
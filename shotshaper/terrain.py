@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Terrain of a course, as a heightmap.
+
+A Terrain holds the ground height on a regular grid in x and y, e.g. a
+raster from a survey of the hole, and is used for a shot by giving it
+to an Environment, Environment(terrain=terrain). The shot then lands
+where its height reaches the ground, z = h(x, y), located exactly by
+the root finding of the integrator, and the wind profile follows the
+height above the ground. Heights are interpolated bilinearly, with
+the grid indices following from the uniform spacing, so that a lookup
+costs the same whatever the size of the raster. Saved heightmaps are
+memory mapped when loaded.
+
+Release positions stay in the coordinates of the terrain, so a throw
+from a tee 20 m above the origin of the raster starts at a height of
+20 m plus the release height. Outside the raster, the height at the
+nearest edge is used.
+"""
+
+import hashlib
+import os
+import numpy as np
+
+from .windfield import _uniform
+
+
+class Terrain:
+    """
+    Ground height on a regular grid.
+
+    :param array x: Grid points along x, uniformly spaced
+    :param array y: Grid points along y, uniformly spaced
+    :param array height: Heights, shape (nx, ny)
+    """
+    def __init__(self, x, y, height):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if np.ndim(height) != 2 or np.shape(height) != (len(x), len(y)):
+            raise ValueError("The heights must have shape (nx, ny) matching the grid, "
+                             "got %s" % (np.shape(height),))
+        if min(np.shape(height)) < 2:
+            raise ValueError("The grid must have at least two points along x and y")
+        self.height = height
+        self.x = x
+        self.y = y
+        (self.x0, self.dx), (self.y0, self.dy) = _uniform(x, 'x'), _uniform(y, 'y')
+        self.shape = np.shape(height)
+        self.directory = None
+        self._mmap_mode = None
+        self._key = None
+
+    @classmethod
+    def flat(cls, height=0.0, extent=1e6):
+        """
+        Level ground at the given height, e.g. for comparisons
+
+        :rtype: Terrain
+        """
+        v = np.array((-extent, extent))
+        return cls(v, v, np.full((2, 2), float(height)))
+
+    def save(self, directory):
+        """
+        Save the terrain to a directory, as height.npy with the heights
+        and grid.npz with the grid
+
+        :param string directory: Directory, created if missing
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'height.npy'), self.height)
+        np.savez(os.path.join(directory, 'grid.npz'), x=self.x, y=self.y)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        Load a terrain saved with save. By default the heights are
+        memory mapped and read from disk as they are needed.
+
+        :param string directory: Directory
+        :param string mmap_mode: Passed to numpy.load, None to read into memory
+        :rtype: Terrain
+        """
+        height = np.load(os.path.join(directory, 'height.npy'), mmap_mode=mmap_mode)
+        with np.load(os.path.join(directory, 'grid.npz')) as f:
+            terrain = cls(f['x'], f['y'], height)
+        terrain.directory = directory
+        terrain._mmap_mode = mmap_mode
+        return terrain
+
+    def __reduce__(self):
+        # Processes receiving a saved terrain map the file themselves
+        if self.directory is not None:
+            return (Terrain.load, (self.directory, self._mmap_mode))
+        return (Terrain, (self.x, self.y, np.asarray(self.height)))
+
+    @property
+    def key(self):
+        """
+        Content hash of the grid and the heights, computed once
+        """
+        if self._key is None:
+            h = hashlib.sha1()
+            h.update(self.x.tobytes())
+            h.update(self.y.tobytes())
+            for row in self.height:
+                h.update(np.ascontiguousarray(row, dtype=float).tobytes())
+            self._key = h.hexdigest()
+        return self._key
+
+    def __repr__(self):
+        return 'Terrain(shape=%s, x=(%g, %g), y=(%g, %g))' % (
+            self.shape, self.x[0], self.x[-1], self.y[0], self.y[-1])
+
+    def _cells(self, x, y):
+        # Lower corner of the cell containing each point, and the
+        # weights of the upper corners, clamped to the grid
+        nx, ny = self.shape
+        sx = np.clip((x - self.x0)/self.dx, 0, nx - 1)
+        sy = np.clip((y - self.y0)/self.dy, 0, ny - 1)
+        i = np.minimum(sx.astype(np.intp), nx - 2)
+        j = np.minimum(sy.astype(np.intp), ny - 2)
+        return i, j, sx - i, sy - j
+
+    def _cell(self, x, y):
+        # Same as _cells for a single point, without array overhead
+        nx, ny = self.shape
+        sx = min(max((x - self.x0)/self.dx, 0.0), nx - 1)
+        sy = min(max((y - self.y0)/self.dy, 0.0), ny - 1)
+        i = min(int(sx), nx - 2)
+        j = min(int(sy), ny - 2)
+        return i, j, sx - i, sy - j
+
+    def __call__(self, x, y):
+        """
+        Ground height at (x, y)
+
+        :param x: Position along x, scalar or array
+        :param y: Position along y, scalar or array
+        :return: Height, of the same shape as x and y
+        """
+        if np.ndim(x) == 0 and np.ndim(y) == 0:
+            i, j, wx, wy = self._cell(float(x), float(y))
+            (h00, h01), (h10, h11) = self.height[i:i+2, j:j+2].tolist()
+            h0 = h00 + wx*(h10 - h00)
+            h1 = h01 + wx*(h11 - h01)
+            return h0 + wy*(h1 - h0)
+
+        i, j, wx, wy = self._cells(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        h = self.height
+        h0 = h[i, j] + wx*(h[i+1, j] - h[i, j])
+        h1 = h[i, j+1] + wx*(h[i+1, j+1] - h[i, j+1])
+        return h0 + wy*(h1 - h0)
+
+    def gradient(self, x, y):
+        """
+        Slope of the ground at a single point, zero along axes where
+        the point is outside the grid
+
+        :return: Derivatives of the height with respect to x and y
+        :rtype: tuple
+        """
+        i, j, wx, wy = self._cell(float(x), float(y))
+        (h00, h01), (h10, h11) = self.height[i:i+2, j:j+2].tolist()
+        dhdx = dhdy = 0.0
+        if self.x[0] < x < self.x[-1]:
+            dhdx = ((h10 - h00) + wy*((h11 - h01) - (h10 - h00)))/self.dx
+        if self.y[0] < y < self.y[-1]:
+            dhdy = ((h01 - h00) + wx*((h11 - h10) - (h01 - h00)))/self.dy
+        return dhdx, dhdy
+
+    def normal(self, x, y):
+        """
+        Upward unit normal of the ground at a single point
+
+        :rtype: array
+        """
+        dhdx, dhdy = self.gradient(x, y)
+        n = np.array((-dhdx, -dhdy, 1.0))
+        return n/np.linalg.norm(n)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Gridded wind fields, e.g. measured over a course or computed by CFD.
+
+A WindField holds wind vectors on a regular grid in x, y and z, and
+optionally in time, and is used for a shot by giving it to an
+Environment, Environment(wind_field=field), in place of the logarithmic
+wind profile. The field is interpolated trilinearly in space and
+linearly in time. Grid indices follow from the uniform spacing, so a
+lookup costs the same whatever the size of the field, and only the
+grid cells around the projectile are read. Saved fields are memory
+mapped when loaded, so that fields larger than memory can be used, and
+worker processes share the pages of the file.
+
+Outside the grid, the wind at the nearest point of the grid is used,
+and outside the time range the first or last snapshot.
+"""
+
+import hashlib
+import os
+import numpy as np
+
+
+def _uniform(v, name):
+    # Start and spacing of a uniform grid axis
+    v = np.asarray(v, dtype=float)
+    if v.ndim != 1 or len(v) == 0:
+        raise ValueError("The %s axis must be a non-empty 1-D array" % name)
+    if len(v) == 1:
+        return float(v[0]), 1.0
+    step = (v[-1] - v[0])/(len(v) - 1)
+    if step <= 0 or not np.allclose(np.diff(v), step, rtol=1e-6, atol=0):
+        raise ValueError("The %s axis must be increasing with a uniform spacing" % name)
+    return float(v[0]), float(step)
+
+
+class WindField:
+    """
+    Wind vectors on a regular grid.
+
+    :param array x: Grid points along x, uniformly spaced
+    :param array y: Grid points along y, uniformly spaced
+    :param array z: Grid points along z, uniformly spaced
+    :param array wind: Wind vectors, shape (nx, ny, nz, 3) for a steady
+                       field or (nt, nx, ny, nz, 3) with times t
+    :param array t: Times of the snapshots, uniformly spaced, None for a steady field
+    """
+    def __init__(self, x, y, z, wind, t=None):
+        if t is None:
+            wind = wind[None]
+            t = (0.0,)
+        axes = (t, x, y, z)
+        if wind.ndim != 5 or wind.shape[-1] != 3 or \
+                wind.shape[:4] != tuple(len(a) for a in axes):
+            raise ValueError("The wind must have shape (nt, nx, ny, nz, 3) "
+                             "matching the grid, got %s" % (wind.shape,))
+        self.wind = wind
+        self.axes = tuple(np.asarray(a, dtype=float) for a in axes)
+        start, step = zip(*(_uniform(a, name) for a, name in zip(axes, 'txyz')))
+        self.start = start
+        self.step = step
+        self.shape = wind.shape[:4]
+        self.directory = None
+        self._mmap_mode = None
+        self._key = None
+
+    @property
+    def steady(self):
+        return self.shape[0] == 1
+
+    def save(self, directory):
+        """
+        Save the field to a directory, as wind.npy with the vectors and
+        grid.npz with the grid
+
+        :param string directory: Directory, created if missing
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'wind.npy'), self.wind)
+        t, x, y, z = self.axes
+        np.savez(os.path.join(directory, 'grid.npz'), t=t, x=x, y=y, z=z)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """
+        Load a field saved with save. By default the vectors are memory
+        mapped and read from disk as they are needed.
+
+        :param string directory: Directory
+        :param string mmap_mode: Passed to numpy.load, None to read into memory
+        :rtype: WindField
+        """
+        wind = np.load(os.path.join(directory, 'wind.npy'), mmap_mode=mmap_mode)
+        with np.load(os.path.join(directory, 'grid.npz')) as f:
+            field = cls(f['x'], f['y'], f['z'], wind, f['t'])
+        field.directory = directory
+        field._mmap_mode = mmap_mode
+        return field
+
+    def __reduce__(self):
+        # Processes receiving a saved field map the file themselves
+        # instead of receiving a copy of the vectors
+        if self.directory is not None:
+            return (WindField.load, (self.directory, self._mmap_mode))
+        t, x, y, z = self.axes
+        return (WindField, (x, y, z, np.asarray(self.wind), t))
+
+    @property
+    def key(self):
+        """
+        Content hash of the grid and the vectors, computed once
+        """
+        if self._key is None:
+            h = hashlib.sha1()
+            for a in self.axes:
+                h.update(a.tobytes())
+            for snapshot in self.wind:
+                h.update(np.ascontiguousarray(snapshot, dtype=float).tobytes())
+            self._key = h.hexdigest()
+        return self._key
+
+    def __repr__(self):
+        return 'WindField(shape=%s, x=(%g, %g), y=(%g, %g), z=(%g, %g))' % (
+            (self.shape,) + tuple(v for a in self.axes[1:] for v in (a[0], a[-1])))
+
+    def _cell(self, k, v):
+        # Index of the cell containing v along axis k, and the weight
+        # of its upper end, for a single value
+        n = self.shape[k]
+        if n == 1:
+            return 0, 0.0
+        s = (v - self.start[k])/self.step[k]
+        if s <= 0.0:
+            return 0, 0.0
+        if s >= n - 1:
+            return n - 2, 1.0
+        i = int(s)
+        return i, s - i
+
+    def _cells(self, k, v):
+        # Same as _cell, for arrays
+        n = self.shape[k]
+        if n == 1:
+            return np.zeros(np.shape(v), dtype=np.intp), np.zeros(np.shape(v))
+        s = np.clip((v - self.start[k])/self.step[k], 0, n - 1)
+        i = np.minimum(s.astype(np.intp), n - 2)
+        return i, s - i
+
+    def _block(self, x, t):
+        # Vectors at the corners of the cell around a single position,
+        # interpolated in time, shape (2, 2, 2, 3), and the weights
+        it, wt = self._cell(0, t)
+        cells = [self._cell(k, v) for k, v in zip((1, 2, 3), x)]
+        (ix, wx), (iy, wy), (iz, wz) = cells
+        block = self.wind[it:it+2, ix:ix+2, iy:iy+2, iz:iz+2]
+        # Repeat axes with a single grid point, e.g. the time of a steady field
+        if block.shape[:4] != (2, 2, 2, 2):
+            block = np.broadcast_to(block, (2, 2, 2, 2, 3))
+        b = block[0] if wt == 0.0 else block[0] + wt*(block[1] - block[0])
+        return b, wx, wy, wz
+
+    def __call__(self, x, t=0.0):
+        """
+        Wind at the position(s) x at the time(s) t
+
+        :param array x: Position (3,), or stacked positions (3, N)
+        :param t: Time, scalar or array of shape (N,)
+        :return: Wind, shape (3,) or (3, N)
+        :rtype: array
+        """
+        if np.ndim(x) == 1:
+            b, wx, wy, wz = self._block(x, t)
+            b = b[0] + wx*(b[1] - b[0])
+            b = b[0] + wy*(b[1] - b[0])
+            return b[0] + wz*(b[1] - b[0])
+
+        (it, wt), (ix, wx), (iy, wy), (iz, wz) = (
+            self._cells(k, v) for k, v in zip(range(4), (t, x[0], x[1], x[2])))
+        it, wt = np.broadcast_to(it, ix.shape), np.broadcast_to(wt, ix.shape)
+        n = self.shape
+        i = (np.minimum(it[:, None] + (0, 1), n[0] - 1), np.minimum(ix[:, None] + (0, 1), n[1] - 1),
+             np.minimum(iy[:, None] + (0, 1), n[2] - 1), np.minimum(iz[:, None] + (0, 1), n[3] - 1))
+        # Gather the 16 corners of each point, shape (N, 2, 2, 2, 2, 3)
+        c = self.wind[i[0][:, :, None, None, None], i[1][:, None, :, None, None],
+                      i[2][:, None, None, :, None], i[3][:, None, None, None, :]]
+        for w in (wt, wx, wy, wz):
+            w = w.reshape((-1,) + (1,)*(c.ndim - 2))
+            c = c[:, 0] + w*(c[:, 1] - c[:, 0])
+        return c.T
+
+    def gradient(self, x, t=0.0):
+        """
+        Derivatives of the wind with respect to x, y and z at a single
+        position, zero along axes where the position is outside the grid
+
+        :return: Matrix with the derivative along x, y and z in its columns
+        :rtype: array
+        """
+        b, wx, wy, wz = self._block(x, t)
+        G = np.zeros((3, 3))
+        for k, (w, n, step) in enumerate(zip((wx, wy, wz), self.shape[1:], self.step[1:])):
+            v = x[k]
+            if n == 1 or not self.axes[k+1][0] < v < self.axes[k+1][-1]:
+                continue
+            # Move axis k first, and interpolate the others
+            c = np.moveaxis(b, k, 0)
+            others = [u for j, u in enumerate((wx, wy, wz)) if j != k]
+            d = c[1] - c[0]
+            d = d[0] + others[0]*(d[1] - d[0])
+            d = d[0] + others[1]*(d[1] - d[0])
+            G[:, k] = d/step
+        return G
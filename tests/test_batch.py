@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import os
+import numpy as np
+
+from shotshaper.batch import ShotBatch, TIME
+
+
+def _batch(status=None, obstacle=None):
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(3, 10, 6))
+    data[:, TIME] = np.arange(6)*0.1
+    # The second shot is shorter, padded with NaN
+    data[1, :, 4:] = np.nan
+    return ShotBatch(data, (6, 4, 6), status, obstacle)
+
+
+def test_round_trip(tmp_path):
+    batch = _batch(np.array((1, 0, -1)), np.array((-1, 2, -1)))
+    batch.save(tmp_path / 'shots')
+    loaded = ShotBatch.load(tmp_path / 'shots')
+
+    np.testing.assert_array_equal(loaded.data, batch.data)
+    np.testing.assert_array_equal(loaded.lengths, batch.lengths)
+    np.testing.assert_array_equal(loaded.status, batch.status)
+    np.testing.assert_array_equal(loaded.obstacle, batch.obstacle)
+    np.testing.assert_array_equal(loaded[1].position, batch[1].position)
+    assert loaded[1].position.shape == (3, 4)
+
+
+def test_round_trip_in_memory(tmp_path):
+    batch = _batch()
+    batch.save(tmp_path / 'shots.npy')
+    loaded = ShotBatch.load(tmp_path / 'shots.npy', mmap_mode=None)
+
+    assert not isinstance(loaded.data, np.memmap)
+    np.testing.assert_array_equal(loaded.data, batch.data)
+    assert loaded.status is None and loaded.obstacle is None
+
+
+def test_stale_meta_is_removed(tmp_path):
+    path = tmp_path / 'shots'
+    _batch(np.array((1, 0, -1))).save(path)
+    assert os.path.exists(tmp_path / 'shots.meta.npz')
+
+    _batch().save(path)
+    assert not os.path.exists(tmp_path / 'shots.meta.npz')
+    assert ShotBatch.load(path).status is None
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from shotshaper.cache import ShotCache
+from shotshaper.environment import Environment
+from shotshaper.projectile import DiscGolfDisc
+
+THROW = dict(speed=24.2, omega=116.8, pitch=15.5, position=(0, 0, 1.3),
+             nose_angle=0.0, roll_angle=14.7)
+
+
+@pytest.fixture
+def cache():
+    return ShotCache()
+
+
+def test_same_throw_same_key(cache):
+    assert cache.key(DiscGolfDisc('dd2'), **THROW) == cache.key(DiscGolfDisc('dd2'), **THROW)
+
+
+def test_coefficient_kind_changes_key(cache):
+    linear = cache.key(DiscGolfDisc('dd2'), **THROW)
+    cubic = cache.key(DiscGolfDisc('dd2', kind='cubic'), **THROW)
+    assert linear != cubic
+
+
+def test_disc_and_mass_change_key(cache):
+    keys = {cache.key(DiscGolfDisc('dd2'), **THROW),
+            cache.key(DiscGolfDisc('cd1'), **THROW),
+            cache.key(DiscGolfDisc('dd2', mass=0.170), **THROW)}
+    assert len(keys) == 3
+
+
+def test_environment_changes_key(cache):
+    d = DiscGolfDisc('dd2')
+    calm = cache.key(d, environment=Environment(Uref=0.0), **THROW)
+    windy = cache.key(d, environment=Environment(Uref=4.8), **THROW)
+    assert calm != windy
+
+
+def test_arguments_are_quantized(cache):
+    d = DiscGolfDisc('dd2')
+    assert cache.key(d, **dict(THROW, speed=24.2 + 1e-9)) == cache.key(d, **THROW)
+    assert cache.key(d, **dict(THROW, speed=24.2 + 1e-3)) != cache.key(d, **THROW)
+
+
+def test_shoot_counts_hits_and_misses(cache):
+    d = DiscGolfDisc('dd2')
+    first = cache.shoot(d, **THROW)
+    assert cache.shoot(d, **THROW) is first
+    assert cache.shoot(DiscGolfDisc('dd2', kind='cubic'), **THROW) is not first
+    assert cache.stats() == dict(hits=1, disk_hits=0, misses=2, size=2)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from shotshaper import environment
+from shotshaper.environment import Environment
+from shotshaper.lookup import build_table, TrajectoryTable
+
+# A small grid around one throw, three points per axis at least
+GRID = dict(speed=np.linspace(22, 26, 3), omega=np.linspace(110, 120, 3),
+            pitch=np.linspace(14, 16, 3), nose_angle=np.linspace(0, 1, 3),
+            roll_angle=np.linspace(13, 16, 3))
+
+THROW = dict(speed=24.2, omega=116.8, pitch=15.5, nose_angle=0.5, roll_angle=14.7,
+             position=(0, 0, 1.3))
+
+
+@pytest.fixture(scope='module')
+def table():
+    return build_table('dd2', grid=GRID, n_validate=20, workers=1,
+                       environment=Environment(Uref=0.0))
+
+
+def test_contains(table):
+    assert table.contains(**THROW)
+    assert not table.contains(**dict(THROW, speed=30))
+    assert not table.contains(**dict(THROW, position=(0, 0, 1.5)))
+
+
+def test_answers_from_table(table):
+    summary, error = table.summary_at(tol=np.inf, **THROW)
+    exact = table._fallback().summarize(**THROW).as_dict()
+    assert error['distance'] > 0
+    assert abs(summary['distance'] - exact['distance']) < 1.0
+
+
+def test_other_environment_is_simulated(table, monkeypatch):
+    monkeypatch.setattr(environment, 'Uref', 5.0)
+    assert not table.contains(**THROW)
+
+    summary, error = table.summary_at(tol=np.inf, **THROW)
+    assert all(e == 0 for e in error.values())
+    exact = table._fallback().summarize(**THROW).as_dict()
+    assert summary['distance'] == exact['distance']
+
+
+def test_environment_keyword(table):
+    assert table.contains(environment=Environment(Uref=0.0), **THROW)
+    assert not table.contains(environment=Environment(Uref=5.0), **THROW)
+
+
+def test_save_keeps_environment(table, tmp_path):
+    table.save(tmp_path / 'dd2.npz')
+    loaded = TrajectoryTable.load(tmp_path / 'dd2.npz')
+    assert loaded.environment_key == table.environment_key
+    assert loaded.contains(**THROW)
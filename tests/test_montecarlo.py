@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from shotshaper.montecarlo import LandingStatistics
+
+EXTENT = ((40, 100), (-30, 30))
+
+
+def _points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.normal((70, 5), (8, 6), size=(n, 2))
+    # Failed throws, and throws beyond the extent
+    points[::50] = np.nan
+    points[1::97, 0] = 120
+    return points
+
+
+def test_merge_equals_single_update():
+    points = _points(1000)
+    whole = LandingStatistics(EXTENT)
+    whole.update(points)
+
+    merged = LandingStatistics(EXTENT)
+    for part in np.array_split(points, [10, 250, 600]):
+        chunk = LandingStatistics(EXTENT)
+        chunk.update(part)
+        merged.merge(chunk)
+
+    assert merged.count == whole.count
+    assert merged.failed == whole.failed
+    assert merged.outside == whole.outside
+    np.testing.assert_allclose(merged.mean, whole.mean, rtol=1e-12)
+    np.testing.assert_allclose(merged.covariance, whole.covariance, rtol=1e-10)
+    np.testing.assert_array_equal(merged.histogram, whole.histogram)
+    np.testing.assert_array_equal(merged.quantiles((0.1, 0.5, 0.9)),
+                                  whole.quantiles((0.1, 0.5, 0.9)))
+
+
+def test_update_matches_numpy():
+    points = _points(1000)
+    stats = LandingStatistics(EXTENT)
+    stats.update(points)
+
+    ok = points[~np.isnan(points).any(axis=1)]
+    assert stats.count == len(ok)
+    np.testing.assert_allclose(stats.mean, ok.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(stats.covariance, np.cov(ok.T), rtol=1e-10)
+
+
+def test_merge_empty():
+    stats = LandingStatistics(EXTENT)
+    stats.update(_points(100))
+    mean, covariance = stats.mean.copy(), stats.covariance.copy()
+    stats.merge(LandingStatistics(EXTENT))
+    np.testing.assert_array_equal(stats.mean, mean)
+    np.testing.assert_array_equal(stats.covariance, covariance)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Precompute trajectory tables for the discs in shotshaper/discs, for
+use with shotshaper.lookup.TrajectoryTable.
+
+Usage: python build_lookup_tables.py [output directory] [disc names]
+"""
+
+import glob
+import os
+import sys
+import time
+import numpy as np
+from shotshaper.lookup import build_table, TOL
+
+if __name__ == '__main__':
+    path = os.path.dirname(os.path.realpath(__file__))
+    out = sys.argv[1] if len(sys.argv) > 1 else 'tables'
+    names = sys.argv[2:]
+    if not names:
+        files = glob.glob(os.path.join(path, '..', 'shotshaper', 'discs', '*.yaml'))
+        names = sorted(os.path.splitext(os.path.basename(f))[0] for f in files)
+
+    os.makedirs(out, exist_ok=True)
+    for name in names:
+        t0 = time.perf_counter()
+        table = build_table(name)
+        table.save(os.path.join(out, name + '.npz'))
+        print('%s: %d throws in %.1f s' % (name, table.summary[..., 0].size,
+                                           time.perf_counter() - t0))
+        for k, e in table.error.items():
+            print('    max validation error %-12s %.2f' % (k, e))
+        answered = np.mean(table.scale['landing']*table.cell_error['landing'] <= TOL)
+        print('    cells answered within %g m: %.0f%%' % (TOL, 100*answered))